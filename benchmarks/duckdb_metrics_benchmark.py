@@ -0,0 +1,188 @@
+"""
+Benchmark the dashboard metric workloads on Postgres against DuckDB.
+
+Builds synthetic products, contacts, sales orders, invoices and their line
+item mapping tables, then runs both metric workloads:
+
+- postgres (queries.py): salesorder_product_metrics_query and
+  invoice_product_mapping_query as they ran before the rollup tables
+- postgres (rollup select): the metric rollup's select over every record,
+  i.e. a full rollup rebuild
+- duckdb: the same select in DuckDB over Parquet snapshots (see
+  server.reports.metric_rollups.fetch_metric_duckdb), whole and filtered
+  to one customer type and quarter as the dashboards ask for it
+
+DuckDB and Postgres results are checked to agree (rows and revenue).
+Snapshot export time is reported separately; the dashboards pay it only
+after a sync.
+
+The tables use the real zakya_* names, so run it against a scratch
+database; it stops if any of them already exist:
+    python -m benchmarks.duckdb_metrics_benchmark --rows 200000 --uri postgresql+psycopg2://...
+
+--uri defaults to POSTGRES_SESSION_POOL_URI. The tables and snapshots are
+removed afterwards.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+
+from queries.zakya import queries
+from utils.postgres_connector import PostgresCRUD
+from utils.parquet_snapshot_store import ParquetSnapshotStore
+from utils.duckdb_engine import DuckDBEngine
+from server.reports.metric_rollups import METRIC_ROLLUPS, fetch_metric_duckdb
+
+# Rollup -> (revenue column checked for agreement, the query it replaced)
+WORKLOADS = {
+    'salesorders': ('total_item_revenue', queries.salesorder_product_metrics_query),
+    'invoices': ('total_revenue', queries.invoice_product_mapping_query),
+}
+
+
+def build_tables(rows, seed=0):
+    """Synthetic Zakya tables with rows line items each for sales orders and invoices."""
+    rng = np.random.default_rng(seed)
+    orders, products, contacts = max(rows // 4, 1), 5000, max(rows // 200, 10)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730, size=orders), unit="D")
+    contact_ids = np.arange(1923531000030000000, 1923531000030000000 + contacts).astype(str)
+    item_ids = np.arange(1923531000010000000, 1923531000010000000 + products).astype(str)
+    order_customers = rng.integers(0, contacts, size=orders)
+
+    zakya_contacts = pd.DataFrame({
+        'contact_id': contact_ids,
+        'contact_name': [f"Customer {i}" for i in range(contacts)],
+        'company_name': [f"Company {i}" for i in range(contacts)],
+        'customer_sub_type': rng.choice(['business', 'individual'], size=contacts),
+        'gst_treatment': rng.choice(['business_gst', 'consumer'], size=contacts, p=[0.8, 0.2]),
+    })
+    zakya_products = pd.DataFrame({
+        'item_id': item_ids,
+        'item_name': [f"MINAKI Kundan Necklace Set {i}" for i in range(products)],
+        'name': [f"MINAKI Kundan Necklace Set {i}" for i in range(products)],
+        'sku': [f"MNK{i:05d}" for i in range(products)],
+        'category_name': rng.choice(['Necklace', 'Earrings', 'Bangles', 'Rings'], size=products),
+        'cf_collection': rng.choice(['Bridal', 'Festive', 'Everyday'], size=products),
+    })
+    zakya_sales_order = pd.DataFrame({
+        'salesorder_id': np.arange(1923531000000000000, 1923531000000000000 + orders).astype(str),
+        'salesorder_number': [f"SO-{i:07d}" for i in range(orders)],
+        'date': dates.strftime("%Y-%m-%d"),
+        'customer_id': contact_ids[order_customers],
+        'customer_name': zakya_contacts['contact_name'].to_numpy()[order_customers],
+        'total': rng.uniform(500, 250000, size=orders).round(2),
+    })
+    zakya_invoices = pd.DataFrame({
+        'invoice_id': np.arange(1923531000040000000, 1923531000040000000 + orders).astype(str),
+        'date': dates.strftime("%Y-%m-%d"),
+        'customer_id': contact_ids[order_customers],
+        'status': rng.choice(['paid', 'sent', 'overdue', 'void', 'draft'], size=orders),
+    })
+    line_orders = np.arange(rows) % orders
+    zakya_salesorder_line_item_mapping = pd.DataFrame({
+        'salesorder_id': zakya_sales_order['salesorder_id'].to_numpy()[line_orders],
+        'item_id': rng.choice(item_ids, size=rows),
+        'quantity': rng.integers(1, 5, size=rows),
+        'rate': rng.uniform(500, 25000, size=rows).round(2),
+        'amount': rng.uniform(500, 100000, size=rows).round(2),
+    })
+    zakya_invoice_line_item_mapping = pd.DataFrame({
+        'invoice_id': zakya_invoices['invoice_id'].to_numpy()[line_orders],
+        'item_id': rng.choice(item_ids, size=rows),
+        'quantity': rng.integers(1, 5, size=rows),
+        'amount': rng.uniform(500, 100000, size=rows).round(2),
+    })
+    return {
+        'zakya_contacts': zakya_contacts,
+        'zakya_products': zakya_products,
+        'zakya_sales_order': zakya_sales_order,
+        'zakya_invoices': zakya_invoices,
+        'zakya_salesorder_line_item_mapping': zakya_salesorder_line_item_mapping,
+        'zakya_invoice_line_item_mapping': zakya_invoice_line_item_mapping,
+    }
+
+
+def best_of(repeat, fn, *args, **kwargs):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def read_postgres(crud, query):
+    with crud.engine.connect() as connection:
+        return pd.read_sql(text(query), connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--uri", default=None)
+    args = parser.parse_args()
+
+    crud = PostgresCRUD(args.uri)
+    tables = build_tables(args.rows)
+    existing = [name for name in tables if inspect(crud.engine).has_table(name, schema="public")]
+    if existing:
+        raise SystemExit(f"{', '.join(existing)} already exist; run against a scratch database")
+
+    snapshot_dir = tempfile.mkdtemp(prefix="duckdb_benchmark_")
+    store = ParquetSnapshotStore(crud, root=snapshot_dir, tables={name: None for name in tables})
+    engine = DuckDBEngine(store)
+
+    results = []
+    try:
+        for name, frame in tables.items():
+            result = crud.create_table(name, frame)
+            if result.startswith("Error"):
+                raise RuntimeError(result)
+
+        export_seconds, _ = best_of(1, lambda: [store.write_snapshot(name) for name in tables])
+
+        for rollup, (revenue_column, original_query) in WORKLOADS.items():
+            spec = METRIC_ROLLUPS[rollup]
+            date_column = spec['date_column']
+            quarter = {
+                'customer_type': {'op': 'eq', 'value': 'business'},
+                date_column: {'op': 'between', 'value': [pd.Timestamp("2025-04-01").date(), pd.Timestamp("2025-06-30").date()]},
+            }
+
+            original_seconds, _ = best_of(args.repeat, read_postgres, crud, original_query)
+            rollup_seconds, postgres_rows = best_of(
+                args.repeat, read_postgres, crud, spec['select'].format(scope_filter="")
+            )
+            duckdb_seconds, duckdb_rows = best_of(args.repeat, fetch_metric_duckdb, rollup, None, engine)
+            filtered_seconds, filtered_rows = best_of(args.repeat, fetch_metric_duckdb, rollup, quarter, engine)
+
+            if len(postgres_rows) != len(duckdb_rows) or not np.isclose(
+                    postgres_rows[revenue_column].astype(float).sum(), duckdb_rows[revenue_column].sum()):
+                raise RuntimeError(f"{rollup}: Postgres and DuckDB results differ")
+
+            results.append((rollup, len(duckdb_rows), len(filtered_rows),
+                            original_seconds, rollup_seconds, duckdb_seconds, filtered_seconds))
+    finally:
+        with crud.engine.begin() as connection:
+            for name in tables:
+                connection.execute(text(f"DROP TABLE IF EXISTS public.{name}"))
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    print(f"line items per workload : {args.rows}")
+    print(f"snapshot export (all)   : {export_seconds:8.2f} s")
+    print(f"{'workload':12}  {'rows':>8}  {'queries.py':>10}  {'rollup sql':>10}  {'duckdb':>8}  "
+          f"{'speedup':>7}  {'filtered':>8}  {'rows':>6}")
+    for rollup, rows, filtered, original, rollup_sql, duck, duck_filtered in results:
+        print(f"{rollup:12}  {rows:8d}  {original:9.3f}s  {rollup_sql:9.3f}s  {duck:7.3f}s  "
+              f"{rollup_sql / duck:6.1f}x  {duck_filtered:7.3f}s  {filtered:6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark the per-row check_if_invoiced loop against resolve_invoice_status.
+
+Builds synthetic sales order lines plus salesorder-invoice and invoice
+line item mappings (50k lines by default), checks that both versions give
+identical statuses and mapped sales order ids, and times them. No database
+is needed. The row loop is quadratic, so by default it only runs on a
+sample of --legacy-rows lines and the full-size time is extrapolated;
+pass --legacy-rows 0 to run it on every line.
+
+Run from the repository root:
+    python -m benchmarks.invoice_status_benchmark --lines 50000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from server.invoice.invoice_status import resolve_invoice_status
+
+
+def build_frames(lines, seed=0):
+    rng = np.random.default_rng(seed)
+    orders = lines // 4 + 1
+    salesorder_ids = np.array([f"19235310{i:011d}" for i in range(orders)], dtype=object)
+    item_ids = np.array([f"19235311{i:011d}" for i in range(5000)], dtype=object)
+
+    line_salesorders = salesorder_ids[np.arange(lines) // 4]
+    line_items = rng.choice(item_ids, size=lines)
+    sales_lines = pd.DataFrame({
+        'salesorder_id': line_salesorders,
+        'item_id': line_items,
+        'extracted_po': [f"PO{i % 20000:06d}" if i % 5 == 0 else None for i in range(lines)],
+    })
+    sales_lines.loc[sales_lines.sample(frac=0.02, random_state=seed).index, 'item_id'] = None
+
+    # Roughly 60% of orders are invoiced, some of them across two invoices
+    invoiced_orders = salesorder_ids[rng.random(orders) < 0.6]
+    invoice_salesorders = np.concatenate([invoiced_orders, invoiced_orders[::7]])
+    invoice_ids = np.array([f"19235312{i:011d}" for i in range(len(invoice_salesorders))], dtype=object)
+    salesorder_invoice_mapping = pd.DataFrame({
+        'salesorder_id': invoice_salesorders,
+        'invoice_id': invoice_ids,
+        'invoice_number': [f"INV-{i:06d}" for i in range(len(invoice_ids))],
+    })
+
+    # Each invoice carries most of its order's items
+    order_lines = pd.DataFrame({'salesorder_id': line_salesorders, 'item_id': line_items}).dropna()
+    invoice_lines = salesorder_invoice_mapping.merge(order_lines, on='salesorder_id')
+    invoice_lines = invoice_lines[rng.random(len(invoice_lines)) < 0.8]
+    invoice_item_mapping = pd.DataFrame({
+        'invoice_id': invoice_lines['invoice_id'].to_numpy(),
+        'item_id': invoice_lines['item_id'].to_numpy(),
+        'line_item_id': np.arange(len(invoice_lines)).astype(str),
+    })
+
+    po_numbers = pd.Series([f"PO{i:06d}" for i in range(0, 20000, 3)])
+    return sales_lines, salesorder_invoice_mapping, invoice_item_mapping, po_numbers
+
+
+def resolve_row_by_row(df, salesorder_invoice_mapping_df, invoice_item_mapping_df, po_numbers):
+    """The check_if_invoiced loop the Pernia and Aza services used before."""
+    mapped_salesorder_dict = {}
+    po_frame = pd.DataFrame({'PO Number': po_numbers})
+
+    def check_if_invoiced(row):
+        row_id = row.name
+        if 'extracted_po' in row and not pd.isna(row['extracted_po']):
+            extracted_po = row['extracted_po']
+            if not po_frame[po_frame['PO Number'] == extracted_po].empty:
+                mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
+                return f"Invoiced (PO: {extracted_po})"
+
+        if not salesorder_invoice_mapping_df.empty and not invoice_item_mapping_df.empty and not pd.isna(row['item_id']) and not pd.isna(row['salesorder_id']):
+            sales_order_id = row.get('salesorder_id')
+            item_id = row.get('item_id')
+            so_invoices = salesorder_invoice_mapping_df[salesorder_invoice_mapping_df['salesorder_id'] == sales_order_id]
+            for _, invoice_row in so_invoices.iterrows():
+                matching_items = invoice_item_mapping_df[
+                    (invoice_item_mapping_df['invoice_id'] == invoice_row['invoice_id']) &
+                    (invoice_item_mapping_df['item_id'] == item_id)
+                ]
+                if not matching_items.empty:
+                    mapped_salesorder_dict[row_id] = sales_order_id
+                    return f"Invoiced (INV : {invoice_row['invoice_number']})"
+
+        if not pd.isna(row['item_id']) and not pd.isna(row['salesorder_id']):
+            mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
+        return "Not Invoiced"
+
+    status = pd.Series([check_if_invoiced(row) for _, row in df.iterrows()], index=df.index, dtype=object)
+    mapped = pd.Series([mapped_salesorder_dict.get(idx, '') for idx in df.index], index=df.index, dtype=object)
+    return status, mapped
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--legacy-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    sales_lines, salesorder_invoice_mapping, invoice_item_mapping, po_numbers = build_frames(args.lines)
+    mappings = (salesorder_invoice_mapping, invoice_item_mapping)
+
+    vectorised_seconds, (status, mapped) = timed(resolve_invoice_status, sales_lines, *mappings, po_numbers)
+
+    sample = sales_lines if args.legacy_rows <= 0 else sales_lines.iloc[:args.legacy_rows]
+    legacy_seconds, (legacy_status, legacy_mapped) = timed(resolve_row_by_row, sample, *mappings, po_numbers)
+    legacy_full_seconds = legacy_seconds * len(sales_lines) / len(sample)
+
+    status_match = status.loc[sample.index].equals(legacy_status)
+    mapped_match = mapped.loc[sample.index].equals(legacy_mapped)
+
+    print(f"sales order lines      : {len(sales_lines)}")
+    print(f"salesorder invoices    : {len(salesorder_invoice_mapping)}")
+    print(f"invoice line items     : {len(invoice_item_mapping)}")
+    print(f"status counts          : {status.str.split(' ').str[0].value_counts().to_dict()}")
+    print(f"row loop ({len(sample)} rows) : {legacy_seconds:8.2f} s")
+    print(f"row loop (extrapolated): {legacy_full_seconds:8.2f} s")
+    print(f"vectorised             : {vectorised_seconds:8.3f} s")
+    print(f"speedup                : {legacy_full_seconds / vectorised_seconds:8.0f}x")
+    print(f"results identical      : status={status_match} mapped={mapped_match}")
+
+
+if __name__ == "__main__":
+    main()
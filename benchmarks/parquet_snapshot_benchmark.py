@@ -0,0 +1,116 @@
+"""
+Benchmark ParquetSnapshotStore reads against crud.read_table.
+
+Builds a synthetic sales order table shaped like zakya_sales_order (wide,
+mostly text, dates spread over two years), writes it to Postgres, snapshots
+it to Parquet partitioned by month and reads it back both ways:
+
+- the whole table
+- the projection reconciliation code uses (salesorder_id, reference_number)
+- that projection filtered to one quarter by date
+
+Reads are repeated and the best time is reported. Snapshot writes (full and
+a single-month rewrite, as after an incremental sync) are timed as well.
+
+Run from the repository root against a scratch database:
+    python -m benchmarks.parquet_snapshot_benchmark --rows 200000 --uri postgresql+psycopg2://...
+
+--uri defaults to POSTGRES_SESSION_POOL_URI. The benchmark table and the
+snapshot directory are removed afterwards.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+from utils.postgres_connector import PostgresCRUD
+from utils.parquet_snapshot_store import ParquetSnapshotStore
+
+TABLE = "benchmark_sales_order_snapshot"
+
+
+def build_sales_order_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730, size=rows), unit="D")
+    customers = [f"Customer {i}" for i in range(300)]
+    frame = pd.DataFrame({
+        'salesorder_id': np.arange(1923531000000000000, 1923531000000000000 + rows).astype(str),
+        'salesorder_number': [f"SO-{i:07d}" for i in range(rows)],
+        'date': dates.strftime("%Y-%m-%d"),
+        'reference_number': [f"PO: {i % 90000:05d}" for i in range(rows)],
+        'customer_id': rng.integers(1923531000010000000, 1923531000010000300, size=rows).astype(str),
+        'customer_name': rng.choice(customers, size=rows),
+        'status': rng.choice(['open', 'invoiced', 'partially_invoiced', 'void'], size=rows),
+        'total': rng.uniform(500, 250000, size=rows).round(2),
+        'sub_total': rng.uniform(500, 250000, size=rows).round(2),
+        'quantity': rng.integers(1, 40, size=rows),
+        'last_modified_time': (dates + pd.Timedelta(hours=10)).strftime("%Y-%m-%dT%H:%M:%S+0530"),
+    })
+    # Pad to the width of a real Zakya list record
+    for i in range(15):
+        frame[f"cf_field_{i}"] = rng.choice([f"value {j}" for j in range(50)], size=rows)
+    return frame
+
+
+def best_of(repeat, fn, *args, **kwargs):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--uri", default=None)
+    args = parser.parse_args()
+
+    crud = PostgresCRUD(args.uri)
+    snapshot_dir = tempfile.mkdtemp(prefix="snapshot_benchmark_")
+    store = ParquetSnapshotStore(crud, root=snapshot_dir, tables={TABLE: 'date'})
+
+    columns = ['salesorder_id', 'reference_number']
+    quarter = {'date': {'op': 'between', 'value': ['2025-04-01', '2025-06-30']}}
+
+    try:
+        result = crud.create_table(TABLE, build_sales_order_frame(args.rows))
+        if result.startswith("Error"):
+            raise RuntimeError(result)
+
+        write_full, _ = best_of(1, store.write_snapshot, TABLE)
+        write_month, _ = best_of(1, store.write_snapshot, TABLE, months=['2025-05'])
+
+        timings = []
+        for label, kwargs in (
+            ("whole table", {}),
+            ("2 columns", {'columns': columns}),
+            ("2 columns, 1 quarter", {'columns': columns, 'filters': quarter}),
+        ):
+            postgres_seconds, postgres_rows = best_of(args.repeat, crud.read_table, TABLE, **kwargs)
+            parquet_seconds, parquet_rows = best_of(args.repeat, store.read, TABLE, **kwargs)
+            if len(postgres_rows) != len(parquet_rows):
+                raise RuntimeError(f"{label}: {len(postgres_rows)} rows from Postgres, {len(parquet_rows)} from Parquet")
+            timings.append((label, len(parquet_rows), postgres_seconds, parquet_seconds))
+    finally:
+        with crud.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS public.{TABLE}"))
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    print(f"rows                  : {args.rows}")
+    print(f"snapshot write (full) : {write_full:8.2f} s")
+    print(f"snapshot write (month): {write_month:8.2f} s")
+    print(f"{'read':22}  {'rows':>8}  {'read_table':>10}  {'parquet':>8}  {'speedup':>7}")
+    for label, rows, postgres_seconds, parquet_seconds in timings:
+        print(f"{label:22}  {rows:8d}  {postgres_seconds:9.3f}s  {parquet_seconds:7.3f}s  "
+              f"{postgres_seconds / parquet_seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
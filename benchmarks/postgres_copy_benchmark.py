@@ -0,0 +1,108 @@
+"""
+Benchmark pandas to_sql against the COPY path used by PostgresCRUD.create_table.
+
+Builds a synthetic sales order line item mapping table (the shape written by
+the mapping sync jobs, including a JSON custom_fields column) and writes it
+both ways. The old path is reproduced as it was: per-cell apply(json.dumps)
+followed by to_sql(if_exists='replace').
+
+Run from the repository root against a scratch database:
+    python -m benchmarks.postgres_copy_benchmark --rows 100000 --uri postgresql+psycopg2://...
+
+--uri defaults to POSTGRES_SESSION_POOL_URI. The benchmark tables are
+dropped afterwards.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+
+from utils.postgres_connector import PostgresCRUD
+
+
+def build_mapping_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    order_ids = rng.integers(1923531000000000000, 1923531000009999999, size=rows // 4 + 1)
+    item_ids = rng.integers(1923531000010000000, 1923531000019999999, size=5000)
+    return pd.DataFrame({
+        'salesorder_id': order_ids[np.arange(rows) // 4].astype(str),
+        'salesorder_number': [f"SO-{i // 4:06d}" for i in range(rows)],
+        'line_item_id': np.arange(1923531000020000000, 1923531000020000000 + rows).astype(str),
+        'item_id': rng.choice(item_ids, size=rows).astype(str),
+        'item_name': [f"MINAKI Kundan Necklace Set {i % 5000}" for i in range(rows)],
+        'quantity': rng.integers(1, 5, size=rows),
+        'rate': rng.uniform(500, 25000, size=rows).round(2),
+        'amount': rng.uniform(500, 100000, size=rows).round(2),
+        'custom_fields': [
+            [{'api_name': 'cf_sku', 'value': f"MNK{i % 5000:05d}"}, {'api_name': 'cf_partner', 'value': 'Taj'}]
+            if i % 3 else None
+            for i in range(rows)
+        ],
+    })
+
+
+def serialize_with_apply(dataframe):
+    """The serialisation create_table used before: detect with apply, then dump every cell."""
+    dataframe = dataframe.copy()
+    for col in dataframe.columns:
+        if dataframe[col].apply(lambda x: isinstance(x, (dict, list))).any():
+            dataframe[col] = dataframe[col].apply(json.dumps)
+    return dataframe
+
+
+def to_sql_path(crud, table_name, dataframe):
+    dataframe = serialize_with_apply(dataframe)
+    dataframe.to_sql(table_name, con=crud.engine, schema="public", if_exists='replace', index=False)
+
+
+def copy_path(crud, table_name, dataframe):
+    result = crud.create_table(table_name, dataframe)
+    if result.startswith("Error"):
+        raise RuntimeError(result)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--uri", default=None)
+    args = parser.parse_args()
+
+    crud = PostgresCRUD(args.uri)
+    dataframe = build_mapping_frame(args.rows)
+
+    try:
+        to_sql_seconds = timed(to_sql_path, crud, "benchmark_mapping_to_sql", dataframe)
+        copy_seconds = timed(copy_path, crud, "benchmark_mapping_copy", dataframe)
+
+        with crud.engine.connect() as connection:
+            counts = [
+                connection.execute(text(f"SELECT count(*) FROM public.{table}")).scalar()
+                for table in ("benchmark_mapping_to_sql", "benchmark_mapping_copy")
+            ]
+    finally:
+        with crud.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS public.benchmark_mapping_to_sql"))
+            connection.execute(text("DROP TABLE IF EXISTS public.benchmark_mapping_copy"))
+
+    serialize_old = timed(serialize_with_apply, dataframe)
+    serialize_new = timed(PostgresCRUD.serialize_json_columns, dataframe)
+
+    print(f"rows written          : {counts[0]} (to_sql), {counts[1]} (COPY)")
+    print(f"to_sql                : {to_sql_seconds:8.2f} s")
+    print(f"COPY (create_table)   : {copy_seconds:8.2f} s")
+    print(f"speedup               : {to_sql_seconds / copy_seconds:8.2f}x")
+    print(f"JSON serialise (apply): {serialize_old:8.3f} s")
+    print(f"JSON serialise (new)  : {serialize_new:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
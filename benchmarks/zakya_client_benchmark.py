@@ -0,0 +1,99 @@
+"""
+Benchmark per-call requests.get against the pooled ZakyaClient.
+
+Starts a local keep-alive stub of the Zakya detail endpoint and fires the same
+number of GETs through both paths, the way fetch_missing_salesorder_details
+does (asyncio.to_thread workers behind a semaphore).
+
+Run from the repository root:
+    python -m benchmarks.zakya_client_benchmark --requests 2000 --concurrency 20
+
+The stub is plain HTTP, so the gain here is only the saved TCP handshake;
+against api.zakya.in the saved TLS handshake makes the difference larger.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.zakya_api import ZakyaClient
+
+
+class StubZakyaHandler(BaseHTTPRequestHandler):
+    """Answers every GET with a small sales order payload over HTTP/1.1."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, keep-alive
+    # connections stall on delayed ACKs and the stub measures Nagle, not pooling.
+    disable_nagle_algorithm = True
+    body = json.dumps({
+        "code": 0,
+        "salesorder": {
+            "salesorder_id": "1",
+            "salesorder_number": "SO-00001",
+            "line_items": [{"line_item_id": "1", "item_id": "1", "quantity": 1}]
+        }
+    }).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubZakyaHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+async def run_requests(get, url, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one():
+        async with semaphore:
+            response = await asyncio.to_thread(get, url, params={"organization_id": "1"})
+            response.raise_for_status()
+            return response.json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch_one() for _ in range(total)])
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/inventory/v1/salesorders/1"
+
+    try:
+        baseline = asyncio.run(run_requests(requests.get, url, args.requests, args.concurrency))
+
+        client = ZakyaClient(pool_maxsize=args.concurrency)
+        pooled = asyncio.run(run_requests(client.get, url, args.requests, args.concurrency))
+        client.close()
+    finally:
+        server.shutdown()
+
+    print(f"requests.get per call : {baseline:8.1f} req/s")
+    print(f"ZakyaClient (pooled)  : {pooled:8.1f} req/s")
+    print(f"speedup               : {pooled / baseline:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
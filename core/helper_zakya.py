@@ -1,23 +1,41 @@
 import streamlit as st
 from config.logger import logger
 import pandas as pd
-from utils.zakya_api import (fetch_records_from_zakya)
+from utils.zakya_api import iter_zakya_records
 
 from utils.postgres_connector import crud
 
+# Rows per DataFrame chunk when streaming Zakya list endpoints
+ZAKYA_RECORD_CHUNK_SIZE = 1000
+
 def extract_record_list(input_data,key):
     records = []
     for record in input_data:
         records.extend(record[f'{key}'])
     return records
 
-def fetch_records_from_zakya_in_df_format(endpoint):
-    object_data = fetch_records_from_zakya(
+def zakya_config_from_session():
+    """Zakya credentials from the Streamlit session, in the config dict shape the sync jobs take."""
+    return {
+        'api_domain': st.session_state['api_domain'],
+        'access_token': st.session_state['access_token'],
+        'organization_id': st.session_state['organization_id'],
+    }
+
+def concat_record_chunks(chunks):
+    """Build one DataFrame from the chunks yielded by iter_zakya_records."""
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def fetch_records_from_zakya_in_df_format(endpoint, key=None):
+    object_data = iter_zakya_records(
         st.session_state['api_domain'],
         st.session_state['access_token'],
         st.session_state['organization_id'],
-        f'/{endpoint}'                  
+        f'/{endpoint}',
+        key or endpoint,
+        chunk_size=ZAKYA_RECORD_CHUNK_SIZE
 )
-    object_data = extract_record_list(object_data,f"{endpoint}")
-    object_data = pd.DataFrame.from_records(object_data)
-    return object_data
+    return concat_record_chunks(object_data)
@@ -4,6 +4,7 @@ from datetime import datetime
 from frontend_components.pernia.utils.state_manager import get_zakya_connection
 from server.invoice.route import process_aza_sales
 from frontend_components.invoice.create_salesorder_in_zakya import create_missing_salesorder_component
+from frontend_components.pipeline_stage_report_component import stage_report_widget
 
 def aza_invoice_tab():
     """Display the invoice tab content for Aza."""
@@ -73,7 +74,7 @@ def generate_aza_invoices(df, invoice_date, customer_name):
         zakya_connection = get_zakya_connection()
         
         # Process the sales data and generate invoice
-        result_df = process_aza_sales(
+        result_df, stage_report = process_aza_sales(
             df, 
             invoice_date,
             customer_name,
@@ -81,4 +82,5 @@ def generate_aza_invoices(df, invoice_date, customer_name):
         )
 
         # Store the invoice results
-        st.session_state['aza_invoices'] = result_df
\ No newline at end of file
+        st.session_state['aza_invoices'] = result_df
+    stage_report_widget(stage_report)
\ No newline at end of file
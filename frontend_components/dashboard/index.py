@@ -2,6 +2,27 @@ import streamlit as st
 from frontend_components.dashboard.sales_order_analysis import product_metrics_subpage
 from frontend_components.dashboard.invoice_analysis import invoice_sub_dashboard_subpage
 from frontend_components.sync_invoice_item_id_mapping_button_component import sync_widget
+from utils.query_result_cache import query_cache
+from utils.duckdb_engine import use_duckdb
+
+
+def dashboard_cache_widget():
+    """
+    Hit rate of the dashboard result cache shared by all sessions, and the metrics engine in use.
+    """
+    cache_stats = query_cache.stats()
+    with st.expander("Dashboard cache"):
+        st.caption(f"Metrics engine: {'duckdb' if use_duckdb() else 'postgres'} (METRICS_ENGINE)")
+        if cache_stats.empty:
+            st.caption("No dashboard queries cached yet")
+            return
+        hits, misses = int(cache_stats['hits'].sum()), int(cache_stats['misses'].sum())
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Hit rate", f"{hits / (hits + misses):.0%}" if hits + misses else "-")
+        col2.metric("Hits", hits)
+        col3.metric("Misses", misses)
+        st.dataframe(cache_stats, hide_index=True)
+
 
 def index():
 
@@ -16,6 +37,8 @@ def index():
         
         with tab2:
             sync_widget()
-            invoice_sub_dashboard_subpage()          
+            invoice_sub_dashboard_subpage()
+
+        dashboard_cache_widget()
 
 
@@ -1,49 +1,38 @@
 import streamlit as st
-from server.sales_order_serivce import fetch_product_metrics_for_sales_order_by_customer
+import pandas as pd
+import datetime
+from server.sales_order_serivce import (
+    fetch_product_metrics_for_sales_order_by_customer,
+    fetch_salesorder_metric_filter_options
+)
 
 def product_metrics_subpage():
     with st.container():
 
         st.subheader("Product Metrics Dashboard - All Products Part of Sales Order to Aza, Taj etc")
         
-        # Get data
-        df = fetch_product_metrics_for_sales_order_by_customer()
-        
+        # Filter choices come from the sales order metric rollup; only the
+        # rows matching the selection are read below
+        options = fetch_salesorder_metric_filter_options()
+
         # Create filters in a sidebar
         filter_col1, filter_col2 = st.columns(2)
 
         with filter_col1:
-            # Get unique categories for filter
-            df["category_name"].fillna('',inplace=True)
-            categories = ["All Categories"] + sorted(df["category_name"].unique().tolist())
+            categories = ["All Categories"] + options["category_name"]
             selected_category = st.selectbox("Select Category", categories)
         
         with filter_col2:
-            # Get unique customers for filter
-            df["customer_name"].fillna('',inplace=True)
-            customers = ["All Customers"] + sorted(df["customer_name"].unique().tolist())
+            customers = ["All Customers"] + options["customer_name"]
             selected_customer = st.selectbox("Select Customer", customers)
 
 
         # Add date range filter
         date_col1, date_col2 = st.columns(2)
         
-        # Get min and max dates from the dataframe - with safer handling of date types
-        if 'order_date' in df.columns and len(df) > 0:
-            # Handle both datetime and date objects
-            min_date = df['order_date'].min()
-            max_date = df['order_date'].max()
-            
-            # Check if we need to convert to date
-            if hasattr(min_date, 'date'):
-                min_date = min_date.date()
-            if hasattr(max_date, 'date'):
-                max_date = max_date.date()
-        else:
-            # Fallback dates if data is empty or date column missing
-            import datetime
-            min_date = datetime.date.today() - datetime.timedelta(days=365)
-            max_date = datetime.date.today()
+        # Date bounds of the rollup, falling back to the last year when it is empty
+        min_date = options["min_date"] or datetime.date.today() - datetime.timedelta(days=365)
+        max_date = options["max_date"] or datetime.date.today()
         
         with date_col1:
             start_date = st.date_input("Start Date", value=min_date, min_value=min_date, max_value=max_date)
@@ -51,22 +40,18 @@ def product_metrics_subpage():
         with date_col2:
             end_date = st.date_input("End Date", value=max_date, min_value=min_date, max_value=max_date)
         
-        # Apply filters
-        filtered_df = df.copy()
+        # Apply filters in Postgres
+        filters = {'order_date': {'op': 'between', 'value': [start_date, end_date]}}
         
         if selected_category != "All Categories":
-            filtered_df = filtered_df[filtered_df["category_name"] == selected_category]
+            filters['category_name'] = {'op': 'eq', 'value': selected_category}
             
         if selected_customer != "All Customers":
-            filtered_df = filtered_df[filtered_df["customer_name"] == selected_customer]
+            filters['customer_name'] = {'op': 'eq', 'value': selected_customer}
 
-        # Apply date filter
-        if 'order_date' in filtered_df.columns:
-            # Convert date_input objects to datetime for comparison
-            filtered_df = filtered_df[
-                (filtered_df['order_date'] >= start_date) & 
-                (filtered_df['order_date'] <= end_date)
-            ]
+        filtered_df = fetch_product_metrics_for_sales_order_by_customer(filters)
+        if filtered_df is None:
+            filtered_df = pd.DataFrame(columns=['total_item_revenue', 'total_quantity', 'total_order_value'])
         
         # Show filter status
         st.write(f"Showing data for: {'All Categories' if selected_category == 'All Categories' else selected_category} | "
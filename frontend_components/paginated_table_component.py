@@ -0,0 +1,189 @@
+import os
+import tempfile
+import streamlit as st
+from config.logger import logger
+from utils.postgres_connector import crud
+from utils.query_result_cache import query_cache
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def reset_pages(key):
+    st.session_state[f"{key}_cursors"] = [None]
+
+
+def next_page(key):
+    if st.session_state.get(f"{key}_next") is not None:
+        st.session_state[f"{key}_cursors"].append(st.session_state[f"{key}_next"])
+
+
+def previous_page(key):
+    if len(st.session_state[f"{key}_cursors"]) > 1:
+        st.session_state[f"{key}_cursors"].pop()
+
+
+def table_columns(table_name):
+    """Column names of table_name, in table order."""
+    schema, _, name = table_name.rpartition(".")
+    rows = crud.fetch_rows(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = :schema AND table_name = :name ORDER BY ordinal_position",
+        {"schema": schema or "public", "name": name}
+    )
+    return [row['column_name'] for row in rows]
+
+
+def paginated_table(table_name, key, default_sort=None, descending=False, key_column="ctid",
+                    filters=None, cache_sources=None, export_file_name=None):
+    """
+    Show a Postgres table one page at a time, with sort, search and CSV export.
+
+    Only the visible page is read and sent to the browser. Paging uses
+    crud.read_page (keyset pagination) and the sort column, direction and
+    search are pushed down to Postgres along with filters.
+
+    Args:
+        table_name (str): Table to show
+        key (str): Unique widget key prefix for this table
+        default_sort (str): Initial sort column (default: the first column)
+        descending (bool): Initial sort direction
+        key_column (str): Unique column breaking sort ties (ctid when the table has none)
+        filters (dict): {column: {'op', 'value'}} applied before paging
+        cache_sources (list): Tables whose data version (see
+            utils.query_result_cache) covers this table; pages and counts
+            are then served from query_cache. Leave None for tables whose
+            writers do not bump a data version.
+        export_file_name (str): Offer a CSV export of all matching rows under this name
+
+    Returns:
+        int: Number of matching rows
+    """
+    try:
+        columns = table_columns(table_name)
+    except Exception as e:
+        st.error(f"Could not read {table_name}: {e}")
+        return 0
+    if not columns:
+        st.info(f"{table_name} has no data yet.")
+        return 0
+
+    sort_col, direction_col, search_col, search_text_col, size_col = st.columns([2, 1, 2, 2, 1])
+    with sort_col:
+        sort_column = st.selectbox(
+            "Sort by", columns,
+            index=columns.index(default_sort) if default_sort in columns else 0,
+            key=f"{key}_sort", on_change=reset_pages, args=(key,)
+        )
+    with direction_col:
+        descending = st.checkbox("Descending", value=descending, key=f"{key}_descending",
+                                 on_change=reset_pages, args=(key,))
+    with search_col:
+        search_column = st.selectbox("Search in", columns, key=f"{key}_search_column",
+                                     on_change=reset_pages, args=(key,))
+    with search_text_col:
+        search_text = st.text_input("Contains", key=f"{key}_search_text", on_change=reset_pages, args=(key,))
+    with size_col:
+        page_size = st.selectbox("Rows", PAGE_SIZES, index=1, key=f"{key}_page_size",
+                                 on_change=reset_pages, args=(key,))
+    search = (search_column, search_text) if search_text else None
+
+    # Filters set by the caller (e.g. dashboard selectboxes) also restart at page 1
+    query_signature = (table_name, repr(sorted((filters or {}).items())))
+    if st.session_state.get(f"{key}_signature") != query_signature or f"{key}_cursors" not in st.session_state:
+        st.session_state[f"{key}_signature"] = query_signature
+        reset_pages(key)
+    cursors = st.session_state[f"{key}_cursors"]
+
+    def load_page():
+        return crud.read_page(table_name, sort_column, cursors[-1], descending, key_column,
+                              filters, search, page_size)
+
+    def load_count():
+        return crud.count_rows(table_name, filters, search)
+
+    try:
+        if cache_sources:
+            page_key = {
+                **(filters or {}),
+                '_page': {'op': 'page', 'value': (sort_column, descending, cursors[-1], search, page_size)}
+            }
+            search_key = {**(filters or {}), '_search': {'op': 'search', 'value': search}}
+            page, next_cursor = query_cache.get(f"{table_name}_page", page_key, cache_sources, load_page)
+            total_rows = query_cache.get(f"{table_name}_count", search_key, cache_sources, load_count)
+        else:
+            page, next_cursor = load_page()
+            total_rows = load_count()
+    except Exception as e:
+        logger.error(f"Error reading page of {table_name}: {e}")
+        st.error(f"Could not read {table_name}: {e}")
+        return 0
+
+    st.session_state[f"{key}_next"] = next_cursor
+    page_number = len(cursors)
+    page_count = max(1, -(-total_rows // page_size))
+
+    st.dataframe(page, use_container_width=True, hide_index=True)
+
+    nav_prev, nav_label, nav_next = st.columns([1, 3, 1])
+    nav_prev.button("◀ Previous", key=f"{key}_previous", disabled=page_number == 1,
+                    on_click=previous_page, args=(key,))
+    nav_label.caption(f"Page {page_number} of {page_count} · {total_rows:,} rows")
+    nav_next.button("Next ▶", key=f"{key}_next_button", disabled=next_cursor is None,
+                    on_click=next_page, args=(key,))
+
+    if export_file_name:
+        csv_export_button(table_name, key, export_file_name, sort_column, descending, filters, search)
+
+    return total_rows
+
+
+def csv_export_button(table_name, key, file_name, sort_column=None, descending=False, filters=None, search=None):
+    """
+    Two-step CSV export of every matching row: prepare, then download.
+
+    The export is only built when asked for. Postgres streams it into a
+    temporary file (crud.copy_csv), so no DataFrame or CSV string of the
+    whole table is built here. The browser download itself is not
+    streamed: st.download_button reads the file into memory once and
+    serves it from there.
+    """
+    if not st.button("Prepare CSV export", key=f"{key}_export"):
+        return
+    export_path = None
+    try:
+        with st.spinner("Exporting..."):
+            with tempfile.NamedTemporaryFile(mode="wb", suffix=".csv", delete=False) as export_file:
+                export_path = export_file.name
+                crud.copy_csv(table_name, export_file, sort_column, descending, filters, search)
+        with open(export_path, "rb") as export_data:
+            st.download_button(
+                label="Download data as CSV",
+                data=export_data,
+                file_name=file_name,
+                mime="text/csv",
+                key=f"{key}_download"
+            )
+    except Exception as e:
+        logger.error(f"Error exporting {table_name}: {e}")
+        st.error(f"Export failed: {e}")
+    finally:
+        if export_path:
+            os.remove(export_path)
+
+
+def paginated_dataframe(dataframe, key, page_size=100):
+    """
+    Show an in-memory DataFrame one page at a time.
+
+    For results that only exist in memory (e.g. fetched from an API); the
+    browser still receives just the visible page.
+    """
+    page_count = max(1, -(-len(dataframe) // page_size))
+    page_number = 1
+    if page_count > 1:
+        page_number = st.number_input(
+            f"Page (of {page_count}, {len(dataframe):,} rows)",
+            min_value=1, max_value=page_count, value=1, key=f"{key}_page"
+        )
+    start = (page_number - 1) * page_size
+    st.dataframe(dataframe.iloc[start:start + page_size], use_container_width=True)
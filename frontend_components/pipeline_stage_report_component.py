@@ -0,0 +1,27 @@
+import streamlit as st
+
+
+def stage_report_widget(stage_report):
+    """
+    Show where an invoice run spent its time, one row per pipeline stage.
+
+    stage_report is the PipelineProfiler report an invoice run returns
+    alongside its result (see InvoiceProcessor.process).
+    """
+    if stage_report is None or stage_report.empty:
+        return
+
+    top_level = stage_report[stage_report['parent'].isna()]
+    with st.expander(f"⏱️ Run profile ({top_level['wall_seconds'].sum():.1f}s)"):
+        cols = st.columns(4)
+        cols[0].metric("Wall time", f"{top_level['wall_seconds'].sum():.1f}s")
+        cols[1].metric("DB queries", int(stage_report['db_queries'].sum()))
+        cols[2].metric("Zakya calls", int(stage_report['http_calls'].sum()))
+        cols[3].metric("Zakya MB", f"{stage_report['http_bytes'].sum() / 1e6:.2f}")
+
+        st.bar_chart(top_level.set_index('stage')['wall_seconds'])
+        st.dataframe(
+            stage_report.drop(columns=['run_id', 'pipeline']),
+            use_container_width=True,
+            hide_index=True
+        )
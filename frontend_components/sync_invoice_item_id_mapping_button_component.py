@@ -1,36 +1,69 @@
 import streamlit as st
+import pandas as pd
 from config.logger import logger
-from server.reports.update_invoice_item_ids_mapping_table import sync_invoice_mappings_sync
+from core.helper_zakya import zakya_config_from_session
+from server.reports.mapping_sync import (
+    mapping_sync_status,
+    start_background_mapping_sync,
+    background_mapping_sync_running,
+    MAPPING_SYNC_MAX_AGE_MINUTES
+)
 
 def sync_widget():
     """
-    Creates a simple widget with just a refresh button to synchronize invoices and mappings.
+    Shows when the sales order and invoice mappings were last synced, with a
+    button that refreshes them in the background.
     """
     with st.container():
-        col1, col2 = st.columns([3, 1])
-        
+        col1, col2, col3 = st.columns([3, 1, 1])
+
         with col1:
             st.subheader("Invoice Database Sync")
-        
+
         with col2:
             sync_button = st.button("🔄 Sync Now", type="primary")
-        
+
+        with col3:
+            st.button("Refresh status")
+
         # Status message placeholder
         status_message = st.empty()
-        
+
         if sync_button:
             try:
-                # Display syncing message
-                status_message.info("Syncing database and mappings...")
-                results = sync_invoice_mappings_sync()
-                
-                # Show success message with count
-                if results is not None and not results.empty:
-                    invoice_count = len(results['invoice_id'].unique()) if 'invoice_id' in results.columns else 0
-                    status_message.success(f"✅ Sync complete! {invoice_count} invoices synchronized.")
+                if start_background_mapping_sync(zakya_config_from_session(), force=True):
+                    status_message.info("Sync started in the background. Refresh status to follow it.")
                 else:
-                    status_message.warning("Sync completed, but no data was returned.")
-                    
+                    status_message.info("A sync is already running.")
             except Exception as e:
-                status_message.error(f"❌ Sync failed: {str(e)}")
+                status_message.error(f"❌ Sync failed to start: {str(e)}")
                 logger.error(f"Sync error: {str(e)}")
+        elif background_mapping_sync_running():
+            status_message.info("Sync running in the background...")
+
+        try:
+            status = mapping_sync_status()
+        except Exception as e:
+            st.error(f"Could not read sync status: {str(e)}")
+            return
+
+        cols = st.columns(len(status))
+        for col, (_, job) in zip(cols, status.iterrows()):
+            label = job['job'].replace('_', ' ').capitalize()
+            if job['status'] == 'never run':
+                col.metric(label, "never synced")
+                continue
+            minutes = job['minutes_since_success']
+            col.metric(
+                label,
+                f"{minutes:.0f} min ago" if pd.notna(minutes) else "never succeeded",
+                job['status'],
+                delta_color="off"
+            )
+            if job['status'] == 'failed':
+                col.caption(f"Last error: {job['error']}")
+
+        st.caption(
+            f"Readiness checks reuse mappings synced within the last {MAPPING_SYNC_MAX_AGE_MINUTES} minutes "
+            f"and otherwise sync only what changed."
+        )
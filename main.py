@@ -10,6 +10,7 @@ import math
 from io import BytesIO
 
 from utils.postgres_connector import crud
+from utils.reference_data_cache import reference_cache
 from config.logger import logger
 from schema.zakya_schemas.schema import ZakyaContacts, ZakyaSalesOrder, ZakyaProducts
 from utils.zakya_api import fetch_object_for_each_id, post_record_to_zakya
@@ -583,7 +584,7 @@ def load_customer_data(is_aza=False):
     try:
         required_columns = ["contact_id","contact_name", "gst_no", "place_of_contact"]
 
-        customer_data_df = crud.read_table("zakya_contacts")
+        customer_data_df = reference_cache.read_table("zakya_contacts")
         customer_data_df = customer_data_df[customer_data_df['gst_treatment'] == 'business_gst']
         if is_aza:
             aza_filter = customer_data_df['contact_name'].str.match('^AZA', case=False)
@@ -609,12 +610,7 @@ def fetch_customer_data(pydantic_model, filter_dict):
     """
     try:
         # Filter customer data for the given branch name
-        whereClause=crud.build_where_clause(pydantic_model,filter_dict)
-        query = queries.fetch_customer_records.format(whereClause=whereClause)
-        print(f"query is {query}")
-        data = crud.execute_query(query=query,return_data=True)
-        print(f"data is {data}")
-        return data.to_dict('records')
+        return crud.fetch_where(pydantic_model, filter_dict, queries.fetch_customer_records)
     except Exception as e:
         return {"error": f"Error fetching row: {e}"}
 
@@ -633,11 +629,7 @@ def create_whereclause_fetch_data(pydantic_model, filter_dict, query):
     """
     try:
         # Filter customer data for the given branch name
-        whereClause=crud.build_where_clause(pydantic_model,filter_dict)
-        formatted_query = query.format(whereClause=whereClause)
-        data = crud.execute_query(query=formatted_query,return_data=True)
-        #logger.debug(f"query is {formatted_query} and data is {data}")
-        return data.to_dict('records')
+        return crud.fetch_where(pydantic_model, filter_dict, query)
     except Exception as e:
         return {"error": f"Error fetching row: {e}"}
 
@@ -60,7 +60,7 @@ def container_for_sales_order_mapping():
             with st.spinner("Syncing sales order data..."):
                 updated_mappings = sync_salesorder_mappings_sync()
                 if not updated_mappings.empty:
-                    st.success(f"Sync complete! {len(updated_mappings)} total mappings available.")
+                    st.success(f"Sync complete! {len(updated_mappings)} new mappings added.")
                 
                 # Show the results in an expander
                     with st.expander("View Results"):
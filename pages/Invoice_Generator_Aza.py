@@ -2,6 +2,8 @@ import streamlit as st
 import io
 import pandas as pd
 from server.invoice.route import process_aza_sales
+from frontend_components.pipeline_stage_report_component import stage_report_widget
+from frontend_components.sync_invoice_item_id_mapping_button_component import sync_widget
 from main import fetch_customer_name_list
 
 DEBUG = False
@@ -202,6 +204,10 @@ def process_aza_upload(uploaded_file):
 
 st.title("Aza Sales Invoice Generator")
 
+# Mapping freshness; invoice runs skip the sync when it is recent
+with st.expander("Sales order / invoice mapping sync"):
+    sync_widget()
+
 # Date picker for invoice date
 invoice_date = st.date_input("Select Invoice Date")
 customer_list = fetch_customer_name_list(is_aza=True)
@@ -234,7 +240,7 @@ if uploaded_file:
             # Process the DataFrame
             if st.button("Generate Invoice"):
                 with st.spinner("Generating invoice..."):
-                    invoice_template = process_aza_sales(
+                    invoice_template, stage_report = process_aza_sales(
                         aza_sales_df,
                         invoice_date,
                         selected_customer,
@@ -248,6 +254,7 @@ if uploaded_file:
                     # Display processed DataFrame
                     st.subheader("Invoice Status")
                     st.dataframe(invoice_template)
+                    stage_report_widget(stage_report)
 
                     # Download Button
                     if not invoice_template.empty:
@@ -2,6 +2,7 @@ import streamlit as st
 import io
 import pandas as pd
 from server.taj_without_sales_order import process_taj_sales
+from frontend_components.pipeline_stage_report_component import stage_report_widget
 
 st.title("Taj Sales Invoice Generator")
 
@@ -24,15 +25,25 @@ if uploaded_file:
     # Process the DataFrame
     if st.button("Generate Invoice"):
         try:
-            invoice_template = process_taj_sales(taj_sales_df, invoice_date, {
+            # Show each branch's invoice as soon as it is posted
+            st.subheader("Branch Invoices")
+            progress_table = st.empty()
+            branch_results = []
+
+            def show_branch_result(summary):
+                branch_results.append(summary)
+                progress_table.dataframe(pd.DataFrame(branch_results))
+
+            invoice_template, stage_report = process_taj_sales(taj_sales_df, invoice_date, {
                 'base_url': st.session_state['api_domain'],
                 'access_token': st.session_state['access_token'],
                 'organization_id': st.session_state['organization_id']
-            })
+            }, on_result=show_branch_result)
             
             # Display processed DataFrame
             st.subheader("Processed Invoice Template")
             st.dataframe(invoice_template)
+            stage_report_widget(stage_report)
             
             # Download Button
             if not invoice_template.empty:
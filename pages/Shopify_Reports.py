@@ -8,6 +8,7 @@ from config.logger import logger
 from utils.shopify.shopify_connector import ShopifyConnector
 from utils.shopify.product_class import ProductResource
 from utils.shopify.collection_resource import CollectionResource
+from frontend_components.paginated_table_component import paginated_dataframe
 
 load_dotenv()
 
@@ -27,7 +28,7 @@ def shopify_product_controller(connector):
         show_preview = st.checkbox(key=1,label="Show/Hide Products",value=True)
         if show_preview:                
             products_df = product_resource.to_dataframe(products_list)
-            st.dataframe(products_df)
+            paginated_dataframe(products_df, key="shopify_products")
             if st.button(key=2,label="Save to Database",on_click=crud.create_table,args=('shopify_product_master',products_df)):
                 st.success("shopify_product_master saved to database successfully!")
 
@@ -87,7 +88,7 @@ def shopify_collection_controller(connector):
         show_preview = st.checkbox(key=3,label="Show/Hide Custom Collection",value=True)
         if show_preview:                
             custom_collection_df = custom_collection_resource.to_dataframe(custom_collection_list)
-            st.dataframe(custom_collection_df)
+            paginated_dataframe(custom_collection_df, key="shopify_custom_collections")
             if st.button(key=4,label="Save to Database",on_click=crud.create_table,args=('shopify_custom_collection_master',custom_collection_df)):
                 st.success("shopify_product_master saved to database successfully!")
 
@@ -2,12 +2,23 @@ import streamlit as st
 import pandas as pd
 from utils.zakya_api import (get_authorization_url
     ,fetch_object_for_each_id
-    ,fetch_records_from_zakya, retrieve_record_from_zakya)
-
+    ,retrieve_record_from_zakya)
+from core.helper_zakya import (fetch_records_from_zakya_in_df_format
+    ,zakya_config_from_session)
 from utils.postgres_connector import crud
-
-
-def handle_on_click_button(df,table_name):
+from server.reports.zakya_incremental_sync import (sync_zakya_endpoint
+    ,sync_zakya_records
+    ,fetch_sync_status
+    ,INCREMENTAL
+    ,FULL
+    ,ZAKYA_SYNC_ENDPOINTS)
+from utils.reference_data_cache import reference_cache
+from frontend_components.paginated_table_component import paginated_table
+
+
+def handle_on_click_button(df, table_name):
+    # Saves the frame already on screen; fetching the endpoint again would
+    # double the Zakya API calls
     crud.create_table(table_name, df)
     return 
 
@@ -16,130 +27,107 @@ def fetch_zakya_code():
     st.markdown(f"[Login with Zakya]({auth_url})")
 
 
+def handle_sync_endpoint(endpoint):
+    sync_zakya_endpoint(zakya_config_from_session(), endpoint)
+    return 
+
+def synced_table_section(title, endpoint, default_sort=None):
+    """
+    Browse a synced Zakya table page by page, with a button to sync it first.
+    """
+    spec = ZAKYA_SYNC_ENDPOINTS[endpoint]
+    with st.container():
+        st.header(title)
+        if st.button(f"Sync {title} to Database", on_click=handle_sync_endpoint, args=(endpoint,)):
+            st.success(f"{spec['table']} synced successfully!")
+        paginated_table(
+            spec['table'],
+            key=spec['table'],
+            default_sort=default_sort,
+            descending=default_sort == 'date',
+            key_column=spec['id_column'],
+            export_file_name=f"{spec['table']}.csv"
+        )
+
+
+def zakya_sync_section():
+    st.header("Sync Zakya Data")
+    mode = st.radio(
+        "Sync mode",
+        [INCREMENTAL, FULL],
+        format_func=lambda value: "Incremental (changed records only)" if value == INCREMENTAL else "Full reconcile",
+        horizontal=True
+    )
+    if st.button("Sync Sales Orders, Invoices, Items and Contacts"):
+        with st.spinner("Syncing..."):
+            results = sync_zakya_records(zakya_config_from_session(), mode=mode)
+        st.dataframe(pd.DataFrame(results))
+
+    sync_status = fetch_sync_status()
+    if not sync_status.empty:
+        st.caption("Last sync per endpoint")
+        st.dataframe(sync_status)
+
+    with st.expander("Reference data cache"):
+        cache_stats = reference_cache.stats()
+        if cache_stats.empty:
+            st.caption("No tables cached yet")
+        else:
+            st.dataframe(cache_stats)
+        if st.button("Clear cache"):
+            reference_cache.invalidate()
+
+    with st.expander("Database connection pool"):
+        pool_status = crud.pool_status()
+        st.caption(pool_status.pop("pool"))
+        st.dataframe(pd.DataFrame([pool_status]), hide_index=True)
+
+
 def zakya_integration_function():
     st.title("MINAKI Intell")
+    zakya_sync_section()
     # Check if authorization code is present in the URL
-    if st.button("Show Contacts"):
-        with st.container():
-            st.header("Contacts")
-            contact_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/contacts'
-                )
-            contacts_record = extract_record_list(contact_data,"contacts")
-            show_preview = st.checkbox("Show/Hide Contacts",value=True)
-            if show_preview:
-                contacts_df = pd.DataFrame.from_records(contacts_record)
-                st.dataframe(contacts_df)
-                if st.button("Save to Database",on_click=handle_on_click_button, args=(contacts_df,'zakya_contacts')):
-                    st.success("Contacts saved to database successfully!")
+    if st.toggle("Show Contacts"):
+        synced_table_section("Contacts", 'contacts', default_sort='contact_name')
 
 
     if st.button("Show Item Groups"):
         with st.container():
             st.header("Item Groups")
-            item_groups_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/itemgroups'
-            )
-            item_groups_record = extract_record_list(item_groups_data,"itemgroups")
+            itemgroups_df = fetch_records_from_zakya_in_df_format('itemgroups')
             show_preview = st.checkbox("Show/Hide Item Groups",value=True)
             if show_preview:                
-                itemgroups_df = pd.DataFrame.from_records(item_groups_record)
                 st.dataframe(itemgroups_df)
                 if st.button("Save to Database",on_click=handle_on_click_button, args=(itemgroups_df,'zakya_item_groups')):
                     st.success("Item groups saved to database successfully!")
 
-    if st.button("Show Items"):
-        with st.container():
-            st.header("Items")
-            items_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/items'                
-            )
-            items_record = extract_record_list(items_data,"items")
-            show_preview = st.checkbox("Show/Hide Products",value=True)
-            if show_preview:                 
-                product_df = pd.DataFrame.from_records(items_record)                    
-                st.dataframe(product_df)
-                if st.button("Save to Database",on_click=handle_on_click_button, args=(product_df,'zakya_products')):
-                    st.success("Items saved to database successfully!")
+    if st.toggle("Show Items"):
+        synced_table_section("Items", 'items', default_sort='name')
 
-    if st.button("Show Sales Order"):
-        with st.container():
-            st.header("Sales Order")
-            sales_order_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/salesorders'                  
-            )
-            sales_order_record = extract_record_list(sales_order_data,"salesorders")
-            show_preview = st.checkbox("Show/Hide Sales Order",value=True)
-            if show_preview:                 
-                sales_order_df = pd.DataFrame.from_records(sales_order_record)
-                st.dataframe(sales_order_df)
-                if st.button("Save to Database",on_click=handle_on_click_button, args=(sales_order_df,'zakya_sales_order')):
-                    crud.create_table('zakya_sales_order',sales_order_df)    
-                    st.success("zakya_sales_order saved to database successfully!") 
+    if st.toggle("Show Sales Order"):
+        synced_table_section("Sales Order", 'salesorders', default_sort='date')
 
 
     if st.button("Show Transfer Order"):
         with st.container():
             st.header("Transfer Order")
-            transfer_order_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/transferorders'                  
-            )
-            print(f"Output is : {transfer_order_data}")
-            transfer_order_records = extract_record_list(transfer_order_data,"transfer_orders")
+            transfer_order_data = fetch_records_from_zakya_in_df_format('transferorders',key="transfer_orders")
             show_preview = st.checkbox("Show/Hide Transfer Order",value=True)
             if show_preview:                 
-                transfer_order_data = pd.DataFrame.from_records(transfer_order_records)
                 st.dataframe(transfer_order_data)
                 if st.button("Save to Database",on_click=handle_on_click_button, args=(transfer_order_data,'zakya_transfer_orders')):
-                    crud.create_table('zakya_transfer_orders',transfer_order_data)    
                     st.success("zakya_transfer_orders saved to database successfully!") 
 
-    if st.button("Show Invoices"):
-        with st.container():
-            st.header("Invoices")
-            invoices_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/invoices'                  
-            )
-            invoices_record = extract_record_list(invoices_data,"invoices")
-            show_preview = st.checkbox("Show/Hide Invoices",value=True)
-            if show_preview:                 
-                invoices_data = pd.DataFrame.from_records(invoices_record)
-                st.dataframe(invoices_data)                   
-                if st.button("Save to Database",on_click=handle_on_click_button, args=(invoices_data,'zakya_invoices')): 
-                    st.success("zakya_invoices saved to database successfully!") 
+    if st.toggle("Show Invoices"):
+        synced_table_section("Invoices", 'invoices', default_sort='date')
 
     if st.button("Show Bills"):
         with st.container():
             st.header("Bills")
-            bills_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/bills'                  
-            )
-            bills_record = extract_record_list(bills_data,"bills")
+            bills_data = fetch_records_from_zakya_in_df_format('bills')
            
             show_preview = st.checkbox("Show/Hide Bills",value=True)
             if show_preview:                 
-                bills_data = pd.DataFrame.from_records(bills_record)
                 st.dataframe(bills_data)                   
                 if st.button("Save to Database",on_click=handle_on_click_button, args=(bills_data,'zakya_bills')): 
                     st.success("zakya_bills saved to database successfully!") 
@@ -147,16 +135,9 @@ def zakya_integration_function():
     if st.button("Show Price Books"):
         with st.container():
             st.header("Price Books")
-            price_books_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/pricebooks'                  
-            )
-            pricebook_record = extract_record_list(price_books_data,"pricebooks")
+            price_books_data = fetch_records_from_zakya_in_df_format('pricebooks')
             show_preview = st.checkbox("Show/Hide Price Books",value=True)
             if show_preview:                 
-                price_books_data = pd.DataFrame.from_records(pricebook_record)
                 st.dataframe(price_books_data)
                 if st.button("Save to Database",on_click=handle_on_click_button, args=(price_books_data,'zakya_pricebooks')):
                     st.success("zakya_pricebooks saved to database successfully!") 
@@ -164,18 +145,11 @@ def zakya_integration_function():
     if st.button("Show Tax Codes"):
         with st.container():
             st.header("Tax Codes")
-            tax_data = fetch_records_from_zakya(
-                    st.session_state['api_domain'],
-                    st.session_state['access_token'],
-                    st.session_state['organization_id'],
-                    '/settings/taxes'                  
-            )
-            tax_record = extract_record_list(tax_data,"taxes")
+            tax_data = fetch_records_from_zakya_in_df_format('settings/taxes',key="taxes")
             show_preview = st.checkbox("Show/Hide Price Books",value=True)
             if show_preview:                 
-                tax_data = pd.DataFrame.from_records(tax_record)
                 st.dataframe(tax_data)
-                if st.button("Save to Database",on_click=handle_on_click_button,args=(tax_data,'zakya_taxes')):
+                if st.button("Save to Database",on_click=handle_on_click_button, args=(tax_data,'zakya_taxes')):
                     st.success("zakya_taxes saved to database successfully!") 
 
 
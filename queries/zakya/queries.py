@@ -10,6 +10,12 @@ from zakya_sales_order
 {whereClause}
 """
 
+fetch_salesorder_number_id_records = """
+select salesorder_number, salesorder_id
+from zakya_sales_order
+{whereClause}
+"""
+
 fetch_prodouct_records = """
 select *
 from zakya_products
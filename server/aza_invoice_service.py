@@ -4,7 +4,7 @@ from datetime import datetime
 import re
 import streamlit as st
 from config.logger import logger
-from utils.postgres_connector import crud
+from utils.common_filtering_database_function import fetch_inventory_rows
 from server.invoice.route import AzaInvoiceProcessor
 
 def analyze_aza_products(aza_orders_df, sku_field="SKU"):
@@ -225,8 +225,8 @@ def fetch_aza_inventory_data(zakya_connection, product_mapping):
         if not item_ids:
             return {}
             
-        # Fetch product data from zakya_products table
-        zakya_products_df = crud.read_table('zakya_products')
+        # Fetch inventory columns of the listed products only
+        zakya_products_df = fetch_inventory_rows(item_ids)
         
         # Create inventory lookup dictionary
         inventory_lookup = {}
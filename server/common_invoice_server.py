@@ -6,9 +6,8 @@ from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
-from utils.postgres_connector import crud
 from config.logger import logger
-from utils.common_filtering_database_function import find_product
+from utils.common_filtering_database_function import find_product, fetch_inventory_rows
 from utils.zakya_api import fetch_records_from_zakya, post_record_to_zakya, fetch_object_for_each_id
 from core.helper_zakya import extract_record_list
 from server.invoice.route import AzaInvoiceProcessor
@@ -33,8 +32,8 @@ def fetch_inventory_data(zakya_connection, product_mapping):
         if not item_ids:
             return {}
             
-        # Fetch product data from zakya_products table
-        zakya_products_df = crud.read_table('zakya_products')
+        # Fetch inventory columns of the listed products only
+        zakya_products_df = fetch_inventory_rows(item_ids)
         
         # Create inventory lookup dictionary
         inventory_lookup = {}
@@ -3,10 +3,14 @@ import pandas as pd
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 from config.logger import logger
-from utils.postgres_connector import crud
+from utils.reference_data_cache import reference_cache
+from utils.parquet_snapshot_store import snapshot_store
+from utils.common_filtering_database_function import fetch_inventory_rows
 from utils.zakya_api import fetch_records_from_zakya, post_record_to_zakya, fetch_object_for_each_id
 from core.helper_zakya import extract_record_list
 from server.invoice.main import InvoiceProcessor
+from server.invoice.invoice_status import add_invoice_status_columns
+from server.invoice.inventory_adjustments import post_inventory_adjustments
 
 
 class AzaInvoiceProcessor(InvoiceProcessor):
@@ -36,56 +40,9 @@ class AzaInvoiceProcessor(InvoiceProcessor):
         """No additional async preprocessing needed for Aza."""
         pass
     
-    def update_inventory(self, inventory_adjustments_needed):
-    # Process inventory adjustments if needed
-        adjustment_results = []
-        for adjustment in inventory_adjustments_needed:
-            try:
-                inv_payload = {
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "reason": "Stock Retally",
-                    "adjustment_type": "quantity",
-                    "line_items": [
-                        {
-                            "item_id": adjustment["item_id"],
-                            "quantity_adjusted": adjustment["quantity_adjusted"]
-                        }
-                    ]
-                }
-                
-                inventory_correction_response = post_record_to_zakya(
-                    self.zakya_connection_object['base_url'],
-                    self.zakya_connection_object['access_token'],
-                    self.zakya_connection_object['organization_id'],
-                    'inventoryadjustments',
-                    inv_payload   
-                )
-                
-                if "inventory_adjustment" in inventory_correction_response:
-                    adjustment_id = inventory_correction_response["inventory_adjustment"].get("inventory_adjustment_id")
-                    adjustment_results.append({
-                        "item_name": adjustment["item_name"],
-                        "adjustment_id": adjustment_id,
-                        "quantity_adjusted": adjustment["quantity_adjusted"],
-                        "status": "Success"
-                    })
-                else:
-                    adjustment_results.append({
-                        "item_name": adjustment["item_name"],
-                        "status": "Failed",
-                        "error": str(inventory_correction_response)
-                    })
-
-                return adjustment_results
-                    
-            except Exception as e:
-                logger.error(f"Error creating inventory adjustment for {adjustment['item_name']}: {e}")
-                adjustment_results.append({
-                    "item_name": adjustment["item_name"],
-                    "status": "Failed",
-                    "error": str(e)
-                })    
-                return adjustment_results
+    async def update_inventory(self, inventory_adjustments_needed):
+        """Apply all stock corrections for this run as batched multi-line adjustments."""
+        return await post_inventory_adjustments(self.zakya_connection_object, inventory_adjustments_needed)
 
 
     async def create_invoices(self, invoice_object):
@@ -225,7 +182,7 @@ class AzaInvoiceProcessor(InvoiceProcessor):
         
         
 
-        adjustments_result = self.update_inventory(inventory_adjustments_needed)
+        adjustments_result = await self.update_inventory(inventory_adjustments_needed)
         # Create invoice payload
         invoice_payload = {
             "customer_id": customer_id,
@@ -425,7 +382,7 @@ class AzaInvoiceProcessor(InvoiceProcessor):
             )
             
             # Get sales order line item mapping from the database
-            salesorder_item_mapping_df = crud.read_table('salesorder_line_item_mapping')
+            salesorder_item_mapping_df = reference_cache.read_table('salesorder_line_item_mapping')
             
             # Extract sales orders from the response
             all_orders = extract_record_list(sales_orders_data, "salesorders")
@@ -511,116 +468,16 @@ class AzaInvoiceProcessor(InvoiceProcessor):
             
             # Add invoice information - check if each sales order item has been invoiced
             if not mapped_sales_order_with_product_df.empty:
-                # Load necessary data from database tables
-                #logger.debug("Loading data from database tables")
-                
-                # Load invoice mappings
-                try:
-                    salesorder_invoice_mapping_df = crud.read_table('zakya_salesorder_invoice_mapping')
-                    #logger.debug(f"Loaded {len(salesorder_invoice_mapping_df)} sales order-invoice mappings")
-                except Exception as e:
-                    logger.error(f"Error loading sales order invoice mappings: {str(e)}")
-                    salesorder_invoice_mapping_df = pd.DataFrame()
-                
-                # Load sales order line item mappings
-                try:
-                    salesorder_line_item_mapping_df = crud.read_table('salesorder_line_item_mapping')
-                    #logger.debug(f"Loaded {len(salesorder_line_item_mapping_df)} sales order line items")
-                except Exception as e:
-                    logger.error(f"Error loading sales order line item mappings: {str(e)}")
-                    salesorder_line_item_mapping_df = pd.DataFrame()
-                
-                # Load invoice line item mappings
-                try:
-                    invoice_item_mapping_df = crud.read_table('zakya_invoice_line_item_mapping')
-                    #logger.debug(f"Loaded {len(invoice_item_mapping_df)} invoice line items")
-                except Exception as e:
-                    logger.error(f"Error loading invoice line item mappings: {str(e)}")
-                    invoice_item_mapping_df = pd.DataFrame()
-                                
-                # Create a dictionary to store invoice status and mapped salesorder_id for each row
-                invoice_status_dict = {}
-                mapped_salesorder_dict = {}
-                
-                # Function to check if an item is invoiced using reference numbers and database tables
-                def check_if_invoiced(row):
-                    row_id = row.name  # Use DataFrame index as unique identifier
-                    
-                    # Method 1: Check reference number against PO Number in pernia_orders
-                    if 'extracted_po' in row and not pd.isna(row['extracted_po']) and self.sales_df is not None:
-                        extracted_po = row['extracted_po']
-                        
-                        # Check if this extracted PO number matches any PO Number in pernia_orders
-                        if 'PO No.' in self.sales_df.columns:
-                            matching_po = self.sales_df[
-                                self.sales_df['PO No.'] == extracted_po
-                            ]
-                            
-                            if not matching_po.empty:
-                                # Found a matching PO Number
-                                mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
-                                return f"Invoiced (PO: {extracted_po})"                    
-                                        
-                    # Method 2: Check using database tables
-                    if not salesorder_invoice_mapping_df.empty and not invoice_item_mapping_df.empty and 'item_id' in row and not pd.isna(row['item_id']) and 'salesorder_id' in row and not pd.isna(row['salesorder_id']):
-                        sales_order_id = row.get('salesorder_id')
-                        item_id = row.get('item_id')
-                        
-                        # Filter for invoices associated with this sales order
-                        so_invoices = salesorder_invoice_mapping_df[
-                            salesorder_invoice_mapping_df['salesorder_id'] == sales_order_id
-                        ]
-                        
-                        if not so_invoices.empty:
-                            # For each invoice, check if the item is included
-                            for _, invoice_row in so_invoices.iterrows():
-                                invoice_id = invoice_row['invoice_id']
-                                invoice_number = invoice_row['invoice_number']
-                                
-                                # Find matching invoice items
-                                matching_items = invoice_item_mapping_df[
-                                    (invoice_item_mapping_df['invoice_id'] == invoice_id) &
-                                    (invoice_item_mapping_df['item_id'] == item_id)
-                                ]
-                                
-                                if not matching_items.empty:
-                                    # If there are multiple matches, sort by line_item_id and take the first
-                                    if len(matching_items) > 1 and 'line_item_id' in matching_items.columns:
-                                        matching_items = matching_items.sort_values('line_item_id').head(1)
-                                    
-                                    mapped_salesorder_dict[row_id] = sales_order_id
-                                    return f"Invoiced (INV : {invoice_number})"
-                    
-                    # No invoice found through either method
-                    if 'item_id' in row and not pd.isna(row['item_id']) and 'salesorder_id' in row and not pd.isna(row['salesorder_id']):
-                        # Still store the salesorder_id for non-invoiced items
-                        mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
-                    
-                    return "Not Invoiced"
-                
-                #logger.debug("Starting invoice status check")
-                
-                # Apply the check to each row in the DataFrame
-                results = []
-                for idx, row in mapped_sales_order_with_product_df.iterrows():
-                    invoice_status = check_if_invoiced(row)
-                    results.append(invoice_status)
-                    invoice_status_dict[idx] = invoice_status
-                
-                # Add results back to DataFrame
-                mapped_sales_order_with_product_df['Invoice Status'] = results
-                
-                # Add the mapped salesorder_id
-                mapped_sales_order_with_product_df['Mapped Salesorder ID'] = mapped_sales_order_with_product_df.index.map(
-                    lambda x: mapped_salesorder_dict.get(x, '')
-                )
+                # Resolve invoice status for all rows at once
+                po_numbers = self.sales_df['PO No.'] if self.sales_df is not None and 'PO No.' in self.sales_df.columns else None
+                mapped_sales_order_with_product_df = add_invoice_status_columns(mapped_sales_order_with_product_df, po_numbers)
                 
                 #logger.debug(f"Invoice status check completed, status counts: {pd.Series(results).value_counts().to_dict()}")
                 
             # Add inventory data if requested
             if include_inventory and not mapped_sales_order_with_product_df.empty:
-                # Fetch product data from database
-                zakya_products_df = crud.read_table('zakya_products')
+                # Fetch inventory columns of the listed products only
+                zakya_products_df = fetch_inventory_rows(mapped_sales_order_with_product_df['item_id'].dropna().unique())
                 
                 # Add inventory data
                 for idx, row in mapped_sales_order_with_product_df.iterrows():
@@ -809,8 +666,8 @@ class AzaInvoiceProcessor(InvoiceProcessor):
             item_ids = mapped_items['item_id'].dropna().unique().tolist()
             
             if item_ids:
-                # Fetch product data
-                zakya_products_df = crud.read_table('zakya_products')
+                # Fetch inventory columns of the listed products only
+                zakya_products_df = fetch_inventory_rows(item_ids)
                 
                 # Add inventory data
                 for idx, row in df.iterrows():
@@ -858,8 +715,8 @@ class AzaInvoiceProcessor(InvoiceProcessor):
         
         try:
             # Load product mappings
-            mapping_product = crud.read_table("zakya_products")
-            mapping_order = crud.read_table("zakya_sales_order")
+            mapping_product = reference_cache.read_table("zakya_products")
+            mapping_order = snapshot_store.read("zakya_sales_order", columns=["salesorder_id", "reference_number"])
             
             # Group orders by reference number or item#
             # If Item# doesn't exist, use designer name or create a batch ID
@@ -2,6 +2,7 @@ import pandas as pd
 from datetime import datetime
 import re
 from server.invoice.main import InvoiceProcessor
+from server.reports.open_salesorder_lines import take_open_line
 from utils.zakya_api import post_record_to_zakya
 from utils.postgres_connector import crud
 from config.logger import logger
@@ -116,7 +117,7 @@ class PerniaInvoiceProcessor(InvoiceProcessor):
         line_items = []
         self.processed_po_numbers = []  # Reset the list
         sku_field_name =self.get_sku_field_name()
-        salesorder_product_mapping_dict = super().fetch_item_id_sales_order_mapping()
+        open_salesorder_lines = self.fetch_item_id_sales_order_mapping()
         
         for _, row in self.sales_df.iterrows():
             try:
@@ -148,9 +149,10 @@ class PerniaInvoiceProcessor(InvoiceProcessor):
                 if sku in invoice_object.get('existing_sku_item_id_mapping', {}):
                     line_item["item_id"] = invoice_object['existing_sku_item_id_mapping'][sku]
                     
-                    if line_item["item_id"] in salesorder_product_mapping_dict:
-                        #logger.debug(f"Salesorder item id is : {salesorder_product_mapping_dict[line_item["item_id"]]}")
-                        line_item["salesorder_item_id"] = salesorder_product_mapping_dict[line_item["item_id"]]                    
+                    # Reserve the oldest open sales order line for this item
+                    salesorder_item_id = take_open_line(open_salesorder_lines, line_item["item_id"], 1)
+                    if salesorder_item_id:
+                        line_item["salesorder_item_id"] = salesorder_item_id
                 
                 line_items.append(line_item)
                 self.processed_po_numbers.append(po_number)  # Add to tracking list
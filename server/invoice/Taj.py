@@ -3,16 +3,26 @@ import math
 import pandas as pd
 from collections import defaultdict
 from server.invoice.main import InvoiceProcessor
-from utils.zakya_api import post_record_to_zakya
+from server.reports.open_salesorder_lines import take_open_line
+from server.invoice.branch_invoices import post_branch_invoices
 from config.logger import logger
 
 class TajInvoiceProcessor(InvoiceProcessor):
     """Invoice processor for Taj vendor."""
     
+    def __init__(self, sales_df, invoice_date, zakya_connection_object, on_result=None):
+        """Initialize with an optional callback that receives each branch's result as it finishes."""
+        super().__init__(sales_df, invoice_date, zakya_connection_object)
+        self.on_result = on_result
+    
     def get_sku_field_name(self):
         """Return the field name for SKU in Taj dataframe."""
         return "Style"
     
+    def get_vendor_field_name(self):
+        """Taj reports carry no separate vendor code, so report the style."""
+        return "Style"
+    
     def preprocess_data_sync(self):
         """Preprocess Taj sales data."""
         self.sales_df["Style"] = self.sales_df["Style"].astype(str) 
@@ -29,7 +39,7 @@ class TajInvoiceProcessor(InvoiceProcessor):
         # Group by branch name
         branch_to_customer_map = {}
         branch_to_invoice_payload = defaultdict(lambda: {"line_items": []})
-        salesorder_product_mapping_dict = super().fetch_item_id_sales_order_mapping()
+        open_salesorder_lines = self.fetch_item_id_sales_order_mapping()
         
         for _, row in self.sales_df.iterrows():
             try:
@@ -71,9 +81,10 @@ class TajInvoiceProcessor(InvoiceProcessor):
                 if sku in invoice_object.get('existing_sku_item_id_mapping', {}):
                     line_item["item_id"] = invoice_object['existing_sku_item_id_mapping'][sku]
 
-                    if line_item["item_id"] in salesorder_product_mapping_dict:
-                        #logger.debug(f"Salesorder item id is : {salesorder_product_mapping_dict[line_item["item_id"]]}")
-                        line_item["salesorder_item_id"] = salesorder_product_mapping_dict[line_item["item_id"]]
+                    # Reserve the oldest open sales order line for this item
+                    salesorder_item_id = take_open_line(open_salesorder_lines, line_item["item_id"], quantity)
+                    if salesorder_item_id:
+                        line_item["salesorder_item_id"] = salesorder_item_id
                 
                 # Add line item to the invoice for this branch
                 branch_to_invoice_payload[branch_name]["line_items"].append(line_item)
@@ -82,8 +93,8 @@ class TajInvoiceProcessor(InvoiceProcessor):
                 logger.error(f"Error processing row: {e}")
                 continue
         
-        # Create invoices (one per branch)
-        invoice_summary = []
+        # Build one invoice payload per branch
+        branch_invoice_payloads = {}
         
         for branch_name, data in branch_to_invoice_payload.items():
             if not data["line_items"]:
@@ -107,45 +118,13 @@ class TajInvoiceProcessor(InvoiceProcessor):
             if customer_data.get("gst"):
                 invoice_payload["gst_no"] = customer_data["gst"]
             
-            try:
-                #logger.debug(f"Creating invoice for {branch_name} with {len(invoice_payload['line_items'])} items")
-                invoice_response = post_record_to_zakya(
-                    self.zakya_connection_object['base_url'],
-                    self.zakya_connection_object['access_token'],
-                    self.zakya_connection_object['organization_id'],
-                    'invoices',
-                    invoice_payload
-                )
-                
-                if isinstance(invoice_response, dict) and "invoice" in invoice_response:
-                    invoice_data = invoice_response["invoice"]
-                    total_amount = sum(item["rate"] * item["quantity"] for item in data["line_items"])
-                    
-                    invoice_summary.append({
-                        "invoice_id": invoice_data.get("invoice_id"),
-                        "invoice_number": invoice_data.get("invoice_number"),
-                        "customer_name": branch_name,
-                        "date": invoice_payload["date"],
-                        "due_date": invoice_data.get("due_date"),
-                        "amount": total_amount,
-                        "status": "Success"
-                    })
-                    logger.info(f"Successfully created invoice for {branch_name}: {invoice_data.get('invoice_number')}")
-                else:
-                    logger.error(f"Invalid invoice response for {branch_name}: {invoice_response}")
-                    invoice_summary.append({
-                        "customer_name": branch_name,
-                        "date": invoice_payload["date"],
-                        "status": "Failed",
-                        "error": str(invoice_response)
-                    })
-            except Exception as e:
-                logger.error(f"Error creating invoice for {branch_name}: {e}")
-                invoice_summary.append({
-                    "customer_name": branch_name,
-                    "date": invoice_payload["date"],
-                    "status": "Failed",
-                    "error": str(e)
-                })
+            branch_invoice_payloads[branch_name] = invoice_payload
+        
+        # Post all branches concurrently; a branch already invoiced by an earlier run is not posted again
+        invoice_summary = await post_branch_invoices(
+            self.zakya_connection_object,
+            branch_invoice_payloads,
+            on_result=self.on_result
+        )
         
-        return pd.DataFrame(invoice_summary) if invoice_summary else pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame(invoice_summary) if invoice_summary else pd.DataFrame()
@@ -0,0 +1,240 @@
+import os
+import json
+import asyncio
+import hashlib
+import aiohttp
+from dotenv import load_dotenv
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+from utils.zakya_async_api import zakya_client
+
+# Load environment variables from .env
+load_dotenv()
+
+INVOICE_IDEMPOTENCY_TABLE = 'zakya_invoice_idempotency_keys'
+
+# Branch invoices posted at the same time; the client's token bucket still
+# keeps the overall request rate inside the Zakya quota
+ZAKYA_INVOICE_POST_CONCURRENCY = int(os.getenv("ZAKYA_INVOICE_POST_CONCURRENCY", 5))
+
+# Seconds after which a key left 'pending' (the run died mid-POST, or the POST
+# timed out without an answer) may be claimed again
+INVOICE_IDEMPOTENCY_PENDING_TIMEOUT = int(os.getenv("INVOICE_IDEMPOTENCY_PENDING_TIMEOUT", 900))
+
+
+def invoice_idempotency_key(branch_name, invoice_date, line_items):
+    """
+    Stable key for one branch invoice: branch, invoice date and a hash of its line items.
+
+    Only the business fields of a line are hashed: the item (item_id, or the
+    description when the SKU has no item), quantity and rate. Fields filled
+    from live state, like the salesorder_item_id reserved from the open
+    sales order lines, differ once the first post has been synced back and
+    would give a re-run of the same report a new key. Lines are hashed
+    order-independently, so re-sorted rows map to the same key as well.
+    """
+    lines = sorted(
+        json.dumps([
+            str(line_item.get("item_id") or line_item.get("description") or line_item.get("name") or ""),
+            float(line_item.get("quantity") or 0),
+            float(line_item.get("rate") or 0),
+        ])
+        for line_item in line_items
+    )
+    lines_hash = hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+    return f"{branch_name}|{invoice_date}|{lines_hash}"
+
+
+def ensure_invoice_idempotency_table():
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS public.{INVOICE_IDEMPOTENCY_TABLE} (
+                idempotency_key TEXT PRIMARY KEY,
+                branch_name TEXT,
+                invoice_date TEXT,
+                status TEXT NOT NULL,
+                invoice_id TEXT,
+                invoice_number TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """))
+
+
+def claim_invoice_key(idempotency_key, branch_name, invoice_date):
+    """
+    Atomically claim a key before posting its invoice.
+
+    A new key, a 'failed' key or a 'pending' key older than
+    INVOICE_IDEMPOTENCY_PENDING_TIMEOUT is claimed (set to 'pending').
+    A 'created' key or a key another run is still posting is not.
+
+    Returns:
+        tuple: (claimed, row) where row is the stored key record
+    """
+    with crud.engine.begin() as connection:
+        claimed = connection.execute(text(f"""
+            INSERT INTO public.{INVOICE_IDEMPOTENCY_TABLE} AS k
+                (idempotency_key, branch_name, invoice_date, status)
+            VALUES (:key, :branch_name, :invoice_date, 'pending')
+            ON CONFLICT (idempotency_key) DO UPDATE
+                SET status = 'pending', error = NULL, attempts = k.attempts + 1, updated_at = now()
+                WHERE k.status = 'failed'
+                   OR (k.status = 'pending' AND k.updated_at < now() - make_interval(secs => :timeout))
+            RETURNING k.*
+        """), {
+            "key": idempotency_key,
+            "branch_name": branch_name,
+            "invoice_date": str(invoice_date),
+            "timeout": INVOICE_IDEMPOTENCY_PENDING_TIMEOUT
+        }).mappings().first()
+        if claimed is not None:
+            return True, dict(claimed)
+
+        existing = connection.execute(
+            text(f"SELECT * FROM public.{INVOICE_IDEMPOTENCY_TABLE} WHERE idempotency_key = :key"),
+            {"key": idempotency_key}
+        ).mappings().first()
+        return False, dict(existing)
+
+
+def complete_invoice_key(idempotency_key, invoice_id, invoice_number):
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            UPDATE public.{INVOICE_IDEMPOTENCY_TABLE}
+            SET status = 'created', invoice_id = :invoice_id, invoice_number = :invoice_number,
+                error = NULL, updated_at = now()
+            WHERE idempotency_key = :key
+        """), {"key": idempotency_key, "invoice_id": str(invoice_id), "invoice_number": invoice_number})
+
+
+def fail_invoice_key(idempotency_key, error):
+    """Mark a key 'failed' so the next run retries it."""
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            UPDATE public.{INVOICE_IDEMPOTENCY_TABLE}
+            SET status = 'failed', error = :error, updated_at = now()
+            WHERE idempotency_key = :key
+        """), {"key": idempotency_key, "error": error})
+
+
+def is_definite_rejection(error):
+    """
+    True when Zakya answered and refused the invoice (4xx other than 429).
+
+    Anything else - timeouts, dropped connections, 5xx - may have created
+    the invoice anyway, so those keys stay 'pending' instead of becoming
+    immediately retryable.
+    """
+    return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500 and error.status != 429
+
+
+async def post_branch_invoice(client, semaphore, branch_name, invoice_payload):
+    """
+    Post one branch invoice under its idempotency key.
+
+    Returns:
+        dict: Invoice summary row for the branch
+    """
+    line_items = invoice_payload["line_items"]
+    key = invoice_idempotency_key(branch_name, invoice_payload["date"], line_items)
+    summary = {
+        "customer_name": branch_name,
+        "date": invoice_payload["date"],
+        "idempotency_key": key
+    }
+
+    try:
+        claimed, key_record = await asyncio.to_thread(claim_invoice_key, key, branch_name, invoice_payload["date"])
+    except Exception as e:
+        logger.error(f"Error claiming idempotency key for {branch_name}: {e}")
+        return {**summary, "status": "Failed", "error": f"Could not claim idempotency key: {e}"}
+
+    if not claimed:
+        if key_record["status"] == "created":
+            logger.info(f"Invoice for {branch_name} already created: {key_record['invoice_number']}")
+            return {
+                **summary,
+                "invoice_id": key_record["invoice_id"],
+                "invoice_number": key_record["invoice_number"],
+                "status": "Already created"
+            }
+        logger.warning(f"Invoice for {branch_name} is being created by another run, skipping")
+        return {**summary, "status": "In progress", "error": "Another run holds this invoice's idempotency key"}
+
+    try:
+        async with semaphore:
+            invoice_response = await client.post('invoices', invoice_payload)
+    except Exception as e:
+        logger.error(f"Error creating invoice for {branch_name}: {e}")
+        if is_definite_rejection(e):
+            await asyncio.to_thread(fail_invoice_key, key, str(e))
+        return {**summary, "status": "Failed", "error": str(e)}
+
+    if not (isinstance(invoice_response, dict) and "invoice" in invoice_response):
+        logger.error(f"Invalid invoice response for {branch_name}: {invoice_response}")
+        await asyncio.to_thread(fail_invoice_key, key, str(invoice_response))
+        return {**summary, "status": "Failed", "error": str(invoice_response)}
+
+    invoice_data = invoice_response["invoice"]
+    try:
+        await asyncio.to_thread(complete_invoice_key, key, invoice_data.get("invoice_id"), invoice_data.get("invoice_number"))
+    except Exception as e:
+        # The invoice exists; the key stays 'pending' so no run re-posts it before the timeout
+        logger.error(f"Invoice {invoice_data.get('invoice_number')} created but its key was not recorded: {e}")
+
+    logger.info(f"Successfully created invoice for {branch_name}: {invoice_data.get('invoice_number')}")
+    return {
+        **summary,
+        "invoice_id": invoice_data.get("invoice_id"),
+        "invoice_number": invoice_data.get("invoice_number"),
+        "due_date": invoice_data.get("due_date"),
+        "amount": sum(item["rate"] * item["quantity"] for item in line_items),
+        "status": "Success"
+    }
+
+
+async def post_branch_invoices(zakya_connection_object, branch_invoice_payloads, on_result=None,
+                               concurrency=ZAKYA_INVOICE_POST_CONCURRENCY):
+    """
+    Post one invoice per branch concurrently, at most once per idempotency key.
+
+    Args:
+        zakya_connection_object (dict): base_url, access_token and organization_id
+        branch_invoice_payloads (dict): branch name -> Zakya invoice payload
+        on_result (callable): Called with each branch's summary row as soon
+            as that branch finishes, e.g. to update the Streamlit page
+        concurrency (int): Invoices posted at the same time
+
+    Returns:
+        list: Summary rows in completion order
+    """
+    if not branch_invoice_payloads:
+        return []
+
+    await asyncio.to_thread(ensure_invoice_idempotency_table)
+
+    invoice_summary = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with zakya_client(
+        zakya_connection_object['base_url'],
+        zakya_connection_object['access_token'],
+        zakya_connection_object['organization_id']
+    ) as client:
+        tasks = [
+            post_branch_invoice(client, semaphore, branch_name, invoice_payload)
+            for branch_name, invoice_payload in branch_invoice_payloads.items()
+        ]
+        for finished in asyncio.as_completed(tasks):
+            summary = await finished
+            invoice_summary.append(summary)
+            if on_result is not None:
+                try:
+                    on_result(summary)
+                except Exception as e:
+                    logger.error(f"Error reporting invoice result for {summary['customer_name']}: {e}")
+
+    return invoice_summary
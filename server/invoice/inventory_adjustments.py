@@ -0,0 +1,118 @@
+import os
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+from config.logger import logger
+from utils.zakya_async_api import zakya_client
+
+# Load environment variables from .env
+load_dotenv()
+
+# Line items per inventoryadjustments POST, and how many of those POSTs run at once
+ZAKYA_ADJUSTMENT_MAX_LINES = int(os.getenv("ZAKYA_ADJUSTMENT_MAX_LINES", 100))
+ZAKYA_ADJUSTMENT_CONCURRENCY = int(os.getenv("ZAKYA_ADJUSTMENT_CONCURRENCY", 4))
+
+
+def merge_adjustments(inventory_adjustments_needed):
+    """
+    Collapse adjustments for the same item_id into one line, summing quantity_adjusted.
+
+    Returns:
+        list: Adjustment dicts (item_id, item_name, quantity_adjusted) in first-seen order
+    """
+    merged = {}
+    for adjustment in inventory_adjustments_needed:
+        item_id = adjustment["item_id"]
+        if item_id in merged:
+            merged[item_id]["quantity_adjusted"] += adjustment["quantity_adjusted"]
+        else:
+            merged[item_id] = dict(adjustment)
+    return list(merged.values())
+
+
+def adjustment_payload(adjustments):
+    return {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "reason": "Stock Retally",
+        "adjustment_type": "quantity",
+        "line_items": [
+            {
+                "item_id": adjustment["item_id"],
+                "quantity_adjusted": adjustment["quantity_adjusted"]
+            }
+            for adjustment in adjustments
+        ]
+    }
+
+
+async def post_adjustment_chunk(client, semaphore, adjustments):
+    """
+    Post one multi-line inventory adjustment.
+
+    Returns:
+        list: One result row per item in the chunk
+    """
+    try:
+        async with semaphore:
+            inventory_correction_response = await client.post('inventoryadjustments', adjustment_payload(adjustments))
+    except Exception as e:
+        logger.error(f"Error creating inventory adjustment for {len(adjustments)} items: {e}")
+        return [{"item_name": adjustment["item_name"], "status": "Failed", "error": str(e)} for adjustment in adjustments]
+
+    if isinstance(inventory_correction_response, dict) and "inventory_adjustment" in inventory_correction_response:
+        adjustment_id = inventory_correction_response["inventory_adjustment"].get("inventory_adjustment_id")
+        return [
+            {
+                "item_name": adjustment["item_name"],
+                "adjustment_id": adjustment_id,
+                "quantity_adjusted": adjustment["quantity_adjusted"],
+                "status": "Success"
+            }
+            for adjustment in adjustments
+        ]
+
+    logger.error(f"Invalid inventory adjustment response: {inventory_correction_response}")
+    return [
+        {"item_name": adjustment["item_name"], "status": "Failed", "error": str(inventory_correction_response)}
+        for adjustment in adjustments
+    ]
+
+
+async def post_inventory_adjustments(zakya_connection_object, inventory_adjustments_needed,
+                                     max_lines=ZAKYA_ADJUSTMENT_MAX_LINES,
+                                     concurrency=ZAKYA_ADJUSTMENT_CONCURRENCY):
+    """
+    Apply stock corrections as a few multi-line inventory adjustments.
+
+    Items are merged per item_id and split into chunks of at most max_lines
+    line items; the chunks are posted concurrently, so a drop with hundreds
+    of short items costs a handful of requests instead of one per item.
+
+    Args:
+        zakya_connection_object (dict): base_url, access_token and organization_id
+        inventory_adjustments_needed (list): Dicts with item_id, item_name and quantity_adjusted
+        max_lines (int): Line items per adjustment
+        concurrency (int): Adjustments posted at the same time
+
+    Returns:
+        list: One result row per adjusted item (Success with adjustment_id, or Failed with error)
+    """
+    adjustments = merge_adjustments(inventory_adjustments_needed)
+    if not adjustments:
+        return []
+
+    chunks = [adjustments[start:start + max_lines] for start in range(0, len(adjustments), max_lines)]
+    semaphore = asyncio.Semaphore(concurrency)
+    async with zakya_client(
+        zakya_connection_object['base_url'],
+        zakya_connection_object['access_token'],
+        zakya_connection_object['organization_id']
+    ) as client:
+        chunk_results = await asyncio.gather(*[post_adjustment_chunk(client, semaphore, chunk) for chunk in chunks])
+
+    adjustment_results = [result for results in chunk_results for result in results]
+    logger.info(
+        f"Inventory adjustments: {sum(1 for result in adjustment_results if result['status'] == 'Success')}"
+        f"/{len(adjustment_results)} items adjusted in {len(chunks)} requests"
+    )
+    return adjustment_results
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_float_dtype
+from config.logger import logger
+from utils.reference_data_cache import reference_cache
+
+NOT_INVOICED = "Not Invoiced"
+
+
+def as_id_key(series):
+    """
+    Normalise an id column to strings so ids read back as text, int or
+    float (after a merge introduced NaN) compare equal.
+    """
+    if is_float_dtype(series):
+        series = series.astype('Int64')
+    return series.astype(str)
+
+
+def load_invoice_status_mappings():
+    """
+    Read the two mapping tables resolve_invoice_status needs.
+
+    Kept on reference_cache rather than the Parquet snapshots: this runs on
+    every readiness check, and the cache is dropped on every local write
+    with a short mapping TTL, where a stale snapshot would first be
+    re-exported in full.
+
+    Returns:
+        tuple: (salesorder_invoice_mapping_df, invoice_item_mapping_df);
+        a table that cannot be read comes back as an empty DataFrame.
+    """
+    mappings = []
+    for table in ('zakya_salesorder_invoice_mapping', 'zakya_invoice_line_item_mapping'):
+        try:
+            mapping_df = reference_cache.read_table(table)
+        except Exception as e:
+            logger.error(f"Error loading {table}: {str(e)}")
+            mapping_df = None
+        mappings.append(mapping_df if isinstance(mapping_df, pd.DataFrame) else pd.DataFrame())
+    return tuple(mappings)
+
+
+def first_invoice_per_salesorder_item(salesorder_invoice_mapping_df, invoice_item_mapping_df):
+    """
+    For every (salesorder_id, item_id) that appears on an invoice of that
+    sales order, the invoice_number of the first such invoice in
+    salesorder_invoice_mapping_df order.
+
+    Returns:
+        DataFrame: salesorder_id, item_id (both as string keys), invoice_number
+    """
+    salesorder_invoices = salesorder_invoice_mapping_df[['salesorder_id', 'invoice_id', 'invoice_number']]
+    salesorder_invoices = salesorder_invoices.dropna(subset=['salesorder_id', 'invoice_id'])
+    salesorder_invoices = salesorder_invoices.assign(
+        salesorder_id=as_id_key(salesorder_invoices['salesorder_id']),
+        invoice_id=as_id_key(salesorder_invoices['invoice_id']),
+        _order=np.arange(len(salesorder_invoices))
+    )
+
+    invoice_items = invoice_item_mapping_df[['invoice_id', 'item_id']].dropna()
+    invoice_items = pd.DataFrame({
+        'invoice_id': as_id_key(invoice_items['invoice_id']),
+        'item_id': as_id_key(invoice_items['item_id']),
+    }).drop_duplicates()
+
+    invoiced = salesorder_invoices.merge(invoice_items, on='invoice_id')
+    invoiced = invoiced.sort_values('_order', kind='stable').drop_duplicates(['salesorder_id', 'item_id'])
+    return invoiced[['salesorder_id', 'item_id', 'invoice_number']]
+
+
+def resolve_invoice_status(df, salesorder_invoice_mapping_df, invoice_item_mapping_df, po_numbers=None):
+    """
+    Invoice status and mapped sales order for every sales order line in one pass.
+
+    Per row, in order of precedence:
+      - "Invoiced (PO: <po>)" when extracted_po is one of po_numbers
+      - "Invoiced (INV : <number>)" for the first invoice of the row's sales
+        order that contains the row's item_id
+      - "Not Invoiced" otherwise
+    Mapped Salesorder ID is the row's salesorder_id for PO matches and for
+    rows that have both salesorder_id and item_id, '' otherwise.
+
+    Args:
+        df (DataFrame): Sales order lines with salesorder_id, item_id and optionally extracted_po
+        salesorder_invoice_mapping_df (DataFrame): salesorder_id, invoice_id, invoice_number
+        invoice_item_mapping_df (DataFrame): invoice_id, item_id
+        po_numbers (iterable): Partner PO numbers that count as invoiced, or None
+
+    Returns:
+        tuple: (status Series, mapped salesorder id Series), both indexed like df
+    """
+    status = np.full(len(df), NOT_INVOICED, dtype=object)
+    mapped = np.full(len(df), '', dtype=object)
+
+    if 'salesorder_id' in df.columns and 'item_id' in df.columns:
+        salesorder_ids = df['salesorder_id']
+        has_ids = (salesorder_ids.notna() & df['item_id'].notna()).to_numpy()
+        mapped[has_ids] = salesorder_ids.to_numpy()[has_ids]
+
+        if has_ids.any() and not salesorder_invoice_mapping_df.empty and not invoice_item_mapping_df.empty:
+            invoiced = first_invoice_per_salesorder_item(salesorder_invoice_mapping_df, invoice_item_mapping_df)
+            invoice_numbers = pd.Series(
+                invoiced['invoice_number'].to_numpy(),
+                index=pd.MultiIndex.from_frame(invoiced[['salesorder_id', 'item_id']])
+            )
+            row_keys = pd.MultiIndex.from_arrays([
+                as_id_key(salesorder_ids[has_ids]),
+                as_id_key(df['item_id'][has_ids])
+            ])
+            found = row_keys.isin(invoice_numbers.index)
+            numbers = invoice_numbers.reindex(row_keys[found]).astype(str)
+            invoiced_rows = np.flatnonzero(has_ids)[found]
+            status[invoiced_rows] = ("Invoiced (INV : " + numbers + ")").to_numpy()
+
+    if po_numbers is not None and 'extracted_po' in df.columns:
+        po_numbers = pd.Series(po_numbers).dropna().unique()
+        po_hit = (df['extracted_po'].notna() & df['extracted_po'].isin(po_numbers)).to_numpy()
+        status[po_hit] = ("Invoiced (PO: " + df['extracted_po'][po_hit].astype(str) + ")").to_numpy()
+        mapped[po_hit] = df['salesorder_id'].to_numpy()[po_hit] if 'salesorder_id' in df.columns else ''
+
+    status = pd.Series(status, index=df.index, dtype=object)
+    mapped = pd.Series(mapped, index=df.index, dtype=object)
+    return status, mapped
+
+
+def add_invoice_status_columns(df, po_numbers=None):
+    """
+    Load the invoice mappings and add 'Invoice Status' and 'Mapped Salesorder ID' to df.
+
+    Returns:
+        DataFrame: df with the two columns set
+    """
+    salesorder_invoice_mapping_df, invoice_item_mapping_df = load_invoice_status_mappings()
+    status, mapped = resolve_invoice_status(df, salesorder_invoice_mapping_df, invoice_item_mapping_df, po_numbers)
+    df['Invoice Status'] = status
+    df['Mapped Salesorder ID'] = mapped
+    return df
@@ -1,13 +1,18 @@
 import asyncio
 import pandas as pd
-from collections import defaultdict
 from abc import ABC, abstractmethod
 from utils.postgres_connector import crud
+from utils.common_filtering_database_function import find_products_by_skus, fetch_inventory_rows
 from config.logger import logger
+from utils.pipeline_metrics import PipelineProfiler, save_stage_report
 from schema.zakya_schemas.schema import ZakyaContacts, ZakyaProducts
-from server.reports.update_salesorder_items_id_mapping_table import sync_salesorder_mappings_sync
-from server.reports.update_invoice_item_ids_mapping_table import sync_invoice_mappings_sync
+from server.reports.mapping_sync import sync_mappings_if_stale
+from utils.zakya_async_api import shared_zakya_clients
 from queries.zakya import queries
+from server.reports.open_salesorder_lines import (
+    fetch_open_salesorder_lines,
+    fetch_item_ids_with_salesorder_lines
+)
 from config.constants import (
     customer_mapping_zakya_contacts,
     products_mapping_zakya_products
@@ -23,14 +28,12 @@ class InvoiceProcessor(ABC):
         self.zakya_connection_object = zakya_connection_object
         self.product_config = None
         self.salesorder_config = None
+        self.mapping_sync_results = []
     
     async def create_whereclause_fetch_data(self, pydantic_model, filter_dict, query):
         """Fetch data using where clause asynchronously."""
         try:
-            whereClause = crud.build_where_clause(pydantic_model, filter_dict)
-            formatted_query = query.format(whereClause=whereClause)
-            data = await asyncio.to_thread(crud.execute_query, query=formatted_query, return_data=True)
-            return data.to_dict('records')
+            return await crud.fetch_where_async(pydantic_model, filter_dict, query)
         except Exception as e:
             logger.error(f"Error fetching data: {e}")
             return {"error": f"Error fetching data: {e}"}
@@ -78,19 +81,20 @@ class InvoiceProcessor(ABC):
         """Preprocess the sales data. To be implemented by subclasses."""
         pass
     
-    def fetch_item_id_sales_order_mapping(self):
-        """Preprocess the sales data. To be implemented by subclasses."""
-        zakya_salesorder_line_item_mapping_df = crud.read_table('zakya_salesorder_line_item_mapping')
-        item_line_item_map = defaultdict(list)
-        for item_id, line_item_id in zip(zakya_salesorder_line_item_mapping_df['item_id'], zakya_salesorder_line_item_mapping_df['line_item_id']):
-            item_line_item_map[item_id].append(line_item_id)        
-        return item_line_item_map
+    def fetch_item_id_sales_order_mapping(self, item_ids=None):
+        """
+        Open (not fully invoiced) sales order lines per item_id.
 
+        Reads the maintained zakya_open_salesorder_lines table for item_ids,
+        by default the items mapped in find_existing_products.
+
+        Returns:
+            dict: item_id (str) -> list of open line dicts, oldest sales order first
+        """
+        if item_ids is None:
+            item_ids = (self.product_config or {}).get('existing_sku_item_id_mapping', {}).values()
+        return fetch_open_salesorder_lines(item_ids)
 
-    def fetch_item_id_invoice_mapping_df(self):
-        
-        zakya_invoice_line_item_mapping_df = crud.read_table('zakya_invoice_line_item_mapping')
-        return zakya_invoice_line_item_mapping_df
 
     @abstractmethod
     async def create_invoices(self):
@@ -98,19 +102,48 @@ class InvoiceProcessor(ABC):
         pass
 
     def process(self):
-        """Main processing method."""
+        """
+        Main processing method.
+
+        Every stage is profiled (wall time, DB queries and rows, Zakya HTTP
+        calls and bytes). The report is also kept as self.stage_report.
+
+        Returns:
+            tuple: (result, stage_report DataFrame)
+        """
+        profiler = PipelineProfiler(type(self).__name__)
+        self.stage_report = None
         try:
+            # One event loop for the whole run, so the Zakya client (and
+            # anything else bound to the loop) is reused by every stage
+            result = asyncio.run(self.run_stages(profiler))
+        except Exception as e:
+            logger.error(f"Error in processing: {e}")
+            result = pd.DataFrame([{"status": "Failed", "error": str(e)}])
+
+        self.stage_report = profiler.report()
+        logger.info(f"{profiler.pipeline} stage report:\n{self.stage_report.to_string(index=False)}")
+        logger.info(f"Postgres pool after {profiler.pipeline}: {crud.pool_status()}")
+        save_stage_report(profiler, crud)
+        return result, self.stage_report
+
+    async def run_stages(self, profiler):
+        """Run the pipeline stages, each under its own profiler stage, sharing one Zakya client."""
+        async with shared_zakya_clients():
             # Preprocess the data
-            self.preprocess_data_sync()
+            with profiler.stage('preprocess_data'):
+                self.preprocess_data_sync()
             
             # Find existing products
-            self.product_config = asyncio.run(self.find_existing_products())
+            with profiler.stage('find_existing_products'):
+                self.product_config = await self.find_existing_products()
 
             # if len(self.product_config['missing_products'])>0:
             #     return self.product_config
 
             # check missing products and then subsequently check for missing salesorder as well okay
-            self.salesorder_config = asyncio.run(self.find_existing_salesorders())
+            with profiler.stage('find_existing_salesorders'):
+                self.salesorder_config = await self.find_existing_salesorders()
 
             if len(self.salesorder_config['missing_items_without_salesorder']) > 0 or len(self.product_config['missing_products'])>0:
                 return {'salesorder' : self.salesorder_config,'product':self.product_config}
@@ -121,11 +154,9 @@ class InvoiceProcessor(ABC):
                 'existing_sku_item_id_mapping': self.product_config['existing_sku_item_id_mapping']
             }
             
-            invoice_df = asyncio.run(self.create_invoices(invoice_object))
+            with profiler.stage('create_invoices'):
+                invoice_df = await self.create_invoices(invoice_object)
             return invoice_df
-        except Exception as e:
-            logger.error(f"Error in processing: {e}")
-            return pd.DataFrame([{"status": "Failed", "error": str(e)}])
     
     @abstractmethod
     def preprocess_data_sync(self):
@@ -139,8 +170,6 @@ class InvoiceProcessor(ABC):
         existing_sku_item_id_mapping = {}
         existing_products_data_dict = {}
         
-        # Prepare product lookup tasks
-        product_tasks = []
         product_skus = []
         
         # Get SKU field name based on child class
@@ -154,15 +183,19 @@ class InvoiceProcessor(ABC):
                 missing_products.append(vendor_sku)
                 continue
                 
-            product_tasks.append(self.find_product(sku))
             product_skus.append(sku)
         
-        # Run product lookup tasks with concurrency limit
-        product_results = await self.run_limited_tasks(product_tasks, limit=1)
+        # Resolve every SKU in the report with one query
+        try:
+            products_by_sku = await asyncio.to_thread(find_products_by_skus, product_skus)
+        except Exception as e:
+            logger.error(f"Error resolving SKUs: {e}")
+            products_by_sku = {}
         
         # Process product results
-        for sku, items_data in zip(product_skus, product_results):
-            if items_data and not isinstance(items_data, dict) and "error" not in items_data and len(items_data) > 0:
+        for sku in product_skus:
+            items_data = products_by_sku.get(sku)
+            if items_data:
                 existing_sku_item_id_mapping[sku] = items_data[0]["item_id"]
                 existing_products.append(sku)
                 existing_products_data_dict[items_data[0]["item_id"]]=items_data
@@ -180,6 +213,14 @@ class InvoiceProcessor(ABC):
             "existing_products_data_dict" : existing_products_data_dict
         }
     
+    def zakya_sync_config(self):
+        """Zakya credentials in the config shape the sync jobs take."""
+        return {
+            'api_domain': self.zakya_connection_object['base_url'],
+            'access_token': self.zakya_connection_object['access_token'],
+            'organization_id': self.zakya_connection_object['organization_id'],
+        }
+
     @abstractmethod
     def get_sku_field_name(self):
         """Return the field name for SKU in the dataframe."""
@@ -195,12 +236,8 @@ class InvoiceProcessor(ABC):
         Find existing sales orders and check if they are already invoiced for specific items.
         Returns information about mapped and unmapped items with their sales order status.
         """
-        # Synchronize salesorder and invoice mappings
-        sync_salesorder_mappings_sync()
-        sync_invoice_mappings_sync()
-        
-        # Get mapping for all salesorder and item id
-        salesorder_item_mapping_dict = self.fetch_item_id_sales_order_mapping()
+        # Bring salesorder and invoice mappings up to date, unless a recent sync already did
+        self.mapping_sync_results = await sync_mappings_if_stale(self.zakya_sync_config())
         
         # Initialize results containers
         missing_items_without_salesorder = []
@@ -213,30 +250,30 @@ class InvoiceProcessor(ABC):
             mapped_item_ids = list(self.product_config['existing_sku_item_id_mapping'].values())
             inventory_data = await self.fetch_inventory_data(mapped_item_ids)
             
+            # Open sales order lines per item, and which items have any line at all
+            open_salesorder_lines, item_ids_with_salesorder_lines = await asyncio.gather(
+                asyncio.to_thread(self.fetch_item_id_sales_order_mapping, mapped_item_ids),
+                asyncio.to_thread(fetch_item_ids_with_salesorder_lines, mapped_item_ids)
+            )
+            
             # Process each mapped product
             for sku, item_id in self.product_config['existing_sku_item_id_mapping'].items():
                 # Store inventory data for this item
                 if item_id in inventory_data:
                     mapped_items_with_inventory[item_id] = inventory_data[item_id]
                 
-                # Check if this item has a sales order
-                if item_id in salesorder_item_mapping_dict:
-                    # Get the sales order details
-                    salesorder_line_item_id = salesorder_item_mapping_dict[item_id]
-                    
-                    # Check if this sales order is already invoiced for this item
-                    is_invoiced = await self.check_if_item_invoiced(item_id, salesorder_line_item_id)
-                    
-                    if not is_invoiced:
-                        # Item has a valid sales order that can be used for invoicing
-                        mapped_salesorder_with_item_id[item_id] = salesorder_line_item_id
-                    else:
-                        # Item has a sales order but it's already invoiced
-                        missing_items_without_salesorder.append({
-                            'item_id': item_id,
-                            'sku': sku,
-                            'reason': 'Already invoiced'
-                        })
+                if str(item_id) in open_salesorder_lines:
+                    # Item has a sales order line that can be used for invoicing
+                    mapped_salesorder_with_item_id[item_id] = [
+                        line['line_item_id'] for line in open_salesorder_lines[str(item_id)]
+                    ]
+                elif str(item_id) in item_ids_with_salesorder_lines:
+                    # Item has sales order lines but they are all invoiced
+                    missing_items_without_salesorder.append({
+                        'item_id': item_id,
+                        'sku': sku,
+                        'reason': 'Already invoiced'
+                    })
                 else:
                     # Item doesn't have any sales order
                     missing_items_without_salesorder.append({
@@ -251,29 +288,13 @@ class InvoiceProcessor(ABC):
             'inventory_data': mapped_items_with_inventory
         }
 
-    async def check_if_item_invoiced(self, item_id, salesorder_line_item_id):
-        """Check if a specific item in a sales order is already invoiced."""
-        # Fetch invoice mappings
-        invoice_item_mapping_df = self.fetch_item_id_invoice_mapping_df()
-        
-        # Filter to find if this item_id is already in an invoice
-        if not invoice_item_mapping_df.empty:
-            filtered_df = invoice_item_mapping_df[
-                invoice_item_mapping_df['item_id'] == item_id
-            ]
-            
-            # If we found any invoice line items for this item_id, it's already invoiced
-            return not filtered_df.empty
-        
-        return False
-
     async def fetch_inventory_data(self, item_ids):
         """Fetch inventory data for a list of item IDs."""
         inventory_data = {}
         
         try:
             # Read product data from database
-            zakya_products_df = crud.read_table('zakya_products')
+            zakya_products_df = fetch_inventory_rows(item_ids)
             
             # Filter to only include specified item IDs
             if not zakya_products_df.empty:
@@ -2,10 +2,10 @@ from server.invoice.Aza import AzaInvoiceProcessor
 from server.invoice.Taj import TajInvoiceProcessor
 from server.invoice.Pernia import PerniaInvoiceProcessor
 
-# Wrapper functions for backward compatibility
-def process_taj_sales(taj_sales_df, invoice_date, zakya_connection_object):
+# Wrapper functions for backward compatibility; each returns (result, stage_report)
+def process_taj_sales(taj_sales_df, invoice_date, zakya_connection_object, on_result=None):
     """Process Taj sales data using the new class-based approach."""
-    processor = TajInvoiceProcessor(taj_sales_df, invoice_date, zakya_connection_object)
+    processor = TajInvoiceProcessor(taj_sales_df, invoice_date, zakya_connection_object, on_result)
     return processor.process()
 
 def process_aza_sales(aza_sales_df, invoice_date, customer_name, zakya_connection_object):
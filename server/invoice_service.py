@@ -1,14 +1,25 @@
-from utils.postgres_connector import crud
 from config.logger import logger
-from queries.zakya import queries
+from server.reports.metric_rollups import fetch_metric_rollup, fetch_metric_rollup_options
 
 
 
-def fetch_product_metrics_for_invoice_by_customer():
+def fetch_product_metrics_for_invoice_by_customer(filters=None):
+    """
+    Invoice metrics per day, item and customer from the invoice metric rollup.
+
+    Args:
+        filters (dict): Optional {column: {'op', 'value'}} pushed down to
+            Postgres, e.g. {'customer_type': {'op': 'eq', 'value': 'business'}}
+    """
     try:
-        invoicing_analytics = crud.execute_query(queries.invoice_product_mapping_query,True)
+        invoicing_analytics = fetch_metric_rollup('invoices', filters)
         #logger.debug(f"Data pulled is :{invoicing_analytics}")
         return invoicing_analytics
     except Exception as e:
         logger.debug(f"Product analytics query failed with error: {e}")
 
+
+def fetch_invoice_metric_filter_options():
+    """Categories, customers, customer types and date range present in the invoice metrics."""
+    return fetch_metric_rollup_options('invoices')
+
@@ -5,18 +5,23 @@ from datetime import datetime, timedelta
 import pandas as pd
 from dotenv import load_dotenv
 from utils.postgres_connector import crud
+from utils.reference_data_cache import reference_cache
+from utils.parquet_snapshot_store import snapshot_store
 from config.logger import logger
-from utils.common_filtering_database_function import find_product
+from utils.common_filtering_database_function import find_products_by_skus, fetch_inventory_rows
 from utils.zakya_api import fetch_records_from_zakya, post_record_to_zakya
 from core.helper_zakya import extract_record_list
 from server.invoice.route import PerniaInvoiceProcessor
+from server.invoice.invoice_status import add_invoice_status_columns
+from server.invoice.inventory_adjustments import post_inventory_adjustments
 # Load environment variables from .env file
 load_dotenv()
 
 def fetch_pernia_data_from_database(input):
     # Fetch all data from ppus_orders table
-    pernia_data = crud.read_table('ppus_orders')
-    pernia_data = pernia_data[pernia_data['Product Status'] == 'Received and QC Pass']
+    pernia_data = crud.read_table('ppus_orders', filters={
+        'Product Status': {'op': 'eq', 'value': 'Received and QC Pass'}
+    })
     #logger.debug(f"Pernia data fetched is : {pernia_data.columns}")
     
     # Extract start and end dates from input
@@ -60,14 +65,17 @@ def fetch_salesorders_by_customer(config):
     """Fetch sales orders for a specific customer."""
     try:
 
-        items_data_result = []
+        skus = []
         for indx,row in config['pernia_orders'].iterrows():
             sku = row.get("Vendor Code"," ") if row.get("Vendor Code") else ''
             #logger.debug(f"Sku is : {sku}")
             if len(sku) > 0:
-                item=find_product(sku)
-                #logger.debug(f"Item is : {item}")
-                items_data_result.extend(item)
+                skus.append(sku)
+
+        products_by_sku = find_products_by_skus(skus)
+        items_data_result = []
+        for sku in skus:
+            items_data_result.extend(products_by_sku.get(sku, []))
 
         mapped_pernia_products_df = pd.DataFrame.from_records(items_data_result)
         mapped_pernia_products_df = mapped_pernia_products_df[['item_id']]
@@ -80,7 +88,7 @@ def fetch_salesorders_by_customer(config):
             '/salesorders'
         )
 
-        salesorder_item_mapping_df = crud.read_table('zakya_salesorder_line_item_mapping')
+        salesorder_item_mapping_df = reference_cache.read_table('zakya_salesorder_line_item_mapping')
         # Extract sales orders
         all_orders = extract_record_list(sales_orders_data, "salesorders")
         # Convert to DataFrame for easier filtering
@@ -165,8 +173,8 @@ def process_sales_orders(order_data, customer_id, zakya_config, options=None):
     
     try:
         # Load product mappings
-        mapping_product = crud.read_table("zakya_products")
-        mapping_order = crud.read_table("zakya_sales_order")
+        mapping_product = reference_cache.read_table("zakya_products")
+        mapping_order = snapshot_store.read("zakya_sales_order", columns=["salesorder_id", "reference_number"])
 
         #logger.debug("Database call completed")
         
@@ -384,7 +392,7 @@ def fetch_salesorders_by_customer_service(config):
             '/salesorders'
         )
 
-        salesorder_item_mapping_df = crud.read_table('salesorder_line_item_mapping')
+        salesorder_item_mapping_df = reference_cache.read_table('salesorder_line_item_mapping')
         
         # Extract sales orders
         all_orders = extract_record_list(sales_orders_data, "salesorders")
@@ -509,33 +517,6 @@ def fetch_salesorders_by_customer_service(config):
 
         # Add invoice information - check if each sales order item has been invoiced
         if not mapped_sales_order_with_product_df.empty:
-            # Load necessary data from database tables
-            # logger.debug("Loading data from database tables")
-            
-            # Load invoice mappings
-            try:
-                salesorder_invoice_mapping_df = crud.read_table('zakya_salesorder_invoice_mapping')
-                # logger.debug(f"Loaded {len(salesorder_invoice_mapping_df)} sales order-invoice mappings")
-            except Exception as e:
-                logger.error(f"Error loading sales order invoice mappings: {str(e)}")
-                salesorder_invoice_mapping_df = pd.DataFrame()
-            
-            # Load sales order line item mappings
-            try:
-                salesorder_line_item_mapping_df = crud.read_table('salesorder_line_item_mapping')
-                #logger.debug(f"Loaded {len(salesorder_line_item_mapping_df)} sales order line items")
-            except Exception as e:
-                logger.error(f"Error loading sales order line item mappings: {str(e)}")
-                salesorder_line_item_mapping_df = pd.DataFrame()
-            
-            # Load invoice line item mappings
-            try:
-                invoice_item_mapping_df = crud.read_table('zakya_invoice_line_item_mapping')
-                #logger.debug(f"Loaded {len(invoice_item_mapping_df)} invoice line items")
-            except Exception as e:
-                logger.error(f"Error loading invoice line item mappings: {str(e)}")
-                invoice_item_mapping_df = pd.DataFrame()
-            
             # Helper function to extract PO value from reference string
             def extract_po_from_reference(ref_string):
                 if pd.isna(ref_string) or not isinstance(ref_string, str):
@@ -553,82 +534,10 @@ def fetch_salesorders_by_customer_service(config):
             if 'reference_number' in mapped_sales_order_with_product_df.columns:
                 mapped_sales_order_with_product_df['extracted_po'] = mapped_sales_order_with_product_df['reference_number'].apply(extract_po_from_reference)
             
-            # Create a dictionary to store invoice status and mapped salesorder_id for each row
-            invoice_status_dict = {}
-            mapped_salesorder_dict = {}
-            
-            # Function to check if an item is invoiced using reference numbers and database tables
-            def check_if_invoiced(row):
-                row_id = row.name  # Use DataFrame index as unique identifier
-                
-                # Method 1: Check reference number against PO Number in pernia_orders
-                if 'extracted_po' in row and not pd.isna(row['extracted_po']) and config.get('pernia_orders') is not None:
-                    extracted_po = row['extracted_po']
-                    
-                    # Check if this extracted PO number matches any PO Number in pernia_orders
-                    if 'PO Number' in config['pernia_orders'].columns:
-                        matching_po = config['pernia_orders'][
-                            config['pernia_orders']['PO Number'] == extracted_po
-                        ]
-                        
-                        if not matching_po.empty:
-                            # Found a matching PO Number
-                            mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
-                            return f"Invoiced (PO: {extracted_po})"
-                
-                # Method 2: Check using database tables
-                if not salesorder_invoice_mapping_df.empty and not invoice_item_mapping_df.empty and 'item_id' in row and not pd.isna(row['item_id']) and 'salesorder_id' in row and not pd.isna(row['salesorder_id']):
-                    sales_order_id = row.get('salesorder_id')
-                    item_id = row.get('item_id')
-                    
-                    # Filter for invoices associated with this sales order
-                    so_invoices = salesorder_invoice_mapping_df[
-                        salesorder_invoice_mapping_df['salesorder_id'] == sales_order_id
-                    ]
-                    
-                    if not so_invoices.empty:
-                        # For each invoice, check if the item is included
-                        for _, invoice_row in so_invoices.iterrows():
-                            invoice_id = invoice_row['invoice_id']
-                            invoice_number = invoice_row['invoice_number']
-                            
-                            # Find matching invoice items
-                            matching_items = invoice_item_mapping_df[
-                                (invoice_item_mapping_df['invoice_id'] == invoice_id) &
-                                (invoice_item_mapping_df['item_id'] == item_id)
-                            ]
-                            
-                            if not matching_items.empty:
-                                # If there are multiple matches, sort by line_item_id and take the first
-                                if len(matching_items) > 1 and 'line_item_id' in matching_items.columns:
-                                    matching_items = matching_items.sort_values('line_item_id').head(1)
-                                
-                                mapped_salesorder_dict[row_id] = sales_order_id
-                                return f"Invoiced (INV : {invoice_number})"
-                
-                # No invoice found through either method
-                if 'item_id' in row and not pd.isna(row['item_id']) and 'salesorder_id' in row and not pd.isna(row['salesorder_id']):
-                    # Still store the salesorder_id for non-invoiced items
-                    mapped_salesorder_dict[row_id] = row.get('salesorder_id', '')
-                
-                return "Not Invoiced"
-            
-            #logger.debug("Starting invoice status check")
-            
-            # Apply the check to each row in the DataFrame
-            results = []
-            for idx, row in mapped_sales_order_with_product_df.iterrows():
-                invoice_status = check_if_invoiced(row)
-                results.append(invoice_status)
-                invoice_status_dict[idx] = invoice_status
-            
-            # Add results back to DataFrame
-            mapped_sales_order_with_product_df['Invoice Status'] = results
-            
-            # Add the mapped salesorder_id
-            mapped_sales_order_with_product_df['Mapped Salesorder ID'] = mapped_sales_order_with_product_df.index.map(
-                lambda x: mapped_salesorder_dict.get(x, '')
-            )
+            # Resolve invoice status for all rows at once
+            pernia_orders = config.get('pernia_orders')
+            po_numbers = pernia_orders['PO Number'] if pernia_orders is not None and 'PO Number' in pernia_orders.columns else None
+            mapped_sales_order_with_product_df = add_invoice_status_columns(mapped_sales_order_with_product_df, po_numbers)
             
             # logger.debug(f"Invoice status check completed, status counts: {pd.Series(results).value_counts().to_dict()}")
                 
@@ -638,8 +547,8 @@ def fetch_salesorders_by_customer_service(config):
             item_ids = mapped_sales_order_with_product_df['item_id'].dropna().unique().tolist()
             
             if item_ids:
-                # Fetch product data
-                zakya_products_df = crud.read_table('zakya_products')
+                # Fetch inventory columns of the listed products only
+                zakya_products_df = fetch_inventory_rows(item_ids)
                 
                 # Create inventory lookup dictionary
                 inventory_lookup = {}
@@ -853,8 +762,8 @@ def add_inventory_data(df):
         item_ids = mapped_items['item_id'].dropna().unique().tolist()
         
         if item_ids:
-            # Fetch product data
-            zakya_products_df = crud.read_table('zakya_products')
+            # Fetch inventory columns of the listed products only
+            zakya_products_df = fetch_inventory_rows(item_ids)
             
             # Add inventory data
             for idx, row in df.iterrows():
@@ -1046,8 +955,8 @@ def fetch_inventory_data(zakya_connection, product_mapping):
         if not item_ids:
             return {}
             
-        # Fetch product data from zakya_products table
-        zakya_products_df = crud.read_table('zakya_products')
+        # Fetch inventory columns of the listed products only
+        zakya_products_df = fetch_inventory_rows(item_ids)
         
         # Create inventory lookup dictionary
         inventory_lookup = {}
@@ -1549,52 +1458,5 @@ def create_invoice(config):
 
 
 def update_inventory(config):
-# Process inventory adjustments if needed
-    adjustment_results = []
-    for adjustment in config['inventory_adjustments_needed']:
-        try:
-            inv_payload = {
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "reason": "Stock Retally",
-                "adjustment_type": "quantity",
-                "line_items": [
-                    {
-                        "item_id": adjustment["item_id"],
-                        "quantity_adjusted": adjustment["quantity_adjusted"]
-                    }
-                ]
-            }
-            
-            inventory_correction_response = post_record_to_zakya(
-                config['base_url'],
-                config['access_token'],
-                config['organization_id'],
-                'inventoryadjustments',
-                inv_payload   
-            )
-            
-            if "inventory_adjustment" in inventory_correction_response:
-                adjustment_id = inventory_correction_response["inventory_adjustment"].get("inventory_adjustment_id")
-                adjustment_results.append({
-                    "item_name": adjustment["item_name"],
-                    "adjustment_id": adjustment_id,
-                    "quantity_adjusted": adjustment["quantity_adjusted"],
-                    "status": "Success"
-                })
-            else:
-                adjustment_results.append({
-                    "item_name": adjustment["item_name"],
-                    "status": "Failed",
-                    "error": str(inventory_correction_response)
-                })
-
-            return adjustment_results
-                
-        except Exception as e:
-            logger.error(f"Error creating inventory adjustment for {adjustment['item_name']}: {e}")
-            adjustment_results.append({
-                "item_name": adjustment["item_name"],
-                "status": "Failed",
-                "error": str(e)
-            })    
-            return adjustment_results
\ No newline at end of file
+    """Apply all stock corrections in config as batched multi-line adjustments."""
+    return asyncio.run(post_inventory_adjustments(config, config['inventory_adjustments_needed']))
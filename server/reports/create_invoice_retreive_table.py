@@ -1,9 +1,9 @@
 import asyncio
 import pandas as pd
-from utils.zakya_api import fetch_records_from_zakya, fetch_object_for_each_id
+from server.reports.zakya_incremental_sync import sync_zakya_endpoint
+from utils.zakya_async_api import AsyncZakyaClient, ZAKYA_ASYNC_MAX_CONNECTIONS
 from utils.postgres_connector import crud
 from config.logger import logger
-from core.helper_zakya import extract_record_list
 
 
 
@@ -21,15 +21,9 @@ def fetch_all_invoices_from_zakya(config):
         # Fetch all invoices from Zakya
         logger.debug("Fetching all invoices from Zakya API")
         
-        invoices_data = fetch_records_from_zakya(
-            config['api_domain'],
-            config['access_token'],
-            config['organization_id'],
-            '/invoices'
-        )
-        
-        all_invoices = extract_record_list(invoices_data, "invoices")
-        all_invoices_df = pd.DataFrame(all_invoices)
+        # Bring zakya_invoices up to date with only the records changed since the last sync
+        sync_zakya_endpoint(config, 'invoices')
+        all_invoices_df = crud.read_table('zakya_invoices')
         
         logger.debug(f"Found {len(all_invoices_df)} total invoices in Zakya")
         return all_invoices_df
@@ -92,66 +86,32 @@ async def fetch_invoice_details(new_invoices_df, config):
     try:
         # Convert to list of dictionaries for processing
         new_invoice_records = new_invoices_df.to_dict('records')
+        invoice_ids = []
+        for invoice in new_invoice_records:
+            invoice_id = invoice.get('invoice_id')
+            if not invoice_id:
+                logger.debug("Skipping invoice with missing ID")
+                continue
+            invoice_ids.append(invoice_id)
         
-        # Set batch size for processing
-        batch_size = config.get('batch_size', 3)
-        
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(batch_size)
+        # Fetch all details through one rate-limited connection pool
+        async with AsyncZakyaClient(
+            config['api_domain'],
+            config['access_token'],
+            config['organization_id'],
+            max_connections=config.get('batch_size', ZAKYA_ASYNC_MAX_CONNECTIONS)
+        ) as client:
+            results = await client.get_many([f'invoices/{invoice_id}' for invoice_id in invoice_ids])
         
         # Create container for results
         detailed_invoices = []
-        
-        # Process invoices in batches
-        total_batches = (len(new_invoice_records) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(new_invoice_records), batch_size):
-            batch = new_invoice_records[i:i+batch_size]
-            
-            batch_num = i // batch_size + 1
-            logger.debug(f"Processing batch {batch_num} of {total_batches} ({len(batch)} invoices)")
-            
-            # Create tasks for each invoice in the batch
-            tasks = []
-            for invoice in batch:
-                invoice_id = invoice.get('invoice_id')
-                if not invoice_id:
-                    logger.debug("Skipping invoice with missing ID")
-                    continue
-                    
-                # Define coroutine to fetch with semaphore
-                async def fetch_with_semaphore(invoice_id):
-                    async with semaphore:
-                        logger.debug(f"Fetching details for invoice {invoice_id}")
-                        try:
-                            await asyncio.sleep(0.5)
-                            return await asyncio.to_thread(
-                                fetch_object_for_each_id,
-                                config['api_domain'],
-                                config['access_token'],
-                                config['organization_id'],
-                                f'invoices/{invoice_id}'
-                            )
-                        except Exception as e:
-                            logger.debug(f"Error fetching invoice {invoice_id}: {str(e)}")
-                            return None
-                
-                tasks.append((invoice_id, asyncio.create_task(fetch_with_semaphore(invoice_id))))
+        for invoice_id, details in zip(invoice_ids, results):
+            if not details:
+                logger.debug(f"No details returned for invoice {invoice_id}")
+                continue
             
-            # Wait for all tasks in this batch to complete
-            for invoice_id, task in tasks:
-                try:
-                    details = await task
-                    if not details:
-                        logger.debug(f"No details returned for invoice {invoice_id}")
-                        continue
-                    
-                    # Add the invoice details to our results
-                    detailed_invoices.append(details)
-                    
-                except Exception as e:
-                    logger.debug(f"Error processing invoice {invoice_id}: {str(e)}")
-                    continue
+            # Add the invoice details to our results
+            detailed_invoices.append(details)
         
         logger.debug(f"Completed processing {len(new_invoice_records)} invoices")
         return detailed_invoices
@@ -259,7 +219,7 @@ def save_invoice_line_item_mappings_to_database(invoice_line_item_mapping_data):
         invoice_line_item_mapping_data (list): List of invoice line item mapping records
         
     Returns:
-        DataFrame: DataFrame of all invoice line item mappings
+        DataFrame: DataFrame of the invoice line item mappings written
     """
     if not invoice_line_item_mapping_data:
         logger.debug("No invoice line item mappings to save")
@@ -269,35 +229,11 @@ def save_invoice_line_item_mappings_to_database(invoice_line_item_mapping_data):
     line_item_mappings_df = pd.DataFrame.from_records(invoice_line_item_mapping_data)
     logger.debug(f"Saving {len(line_item_mappings_df)} invoice line item mappings")
     
-    # Check if mapping table exists
-    try:
-
-        crud.create_table('invoice_line_item_mapping', line_item_mappings_df)
-        # existing_line_item_mappings = crud.read_table('invoice_line_item_mapping')
-        # logger.debug(f"Found {len(existing_line_item_mappings)} existing invoice line item mappings")
-        
-        # # Combine with new mappings
-        # all_line_item_mappings = pd.concat([existing_line_item_mappings, line_item_mappings_df], ignore_index=True)
-        
-        # # Remove duplicates based on invoice_id and line_item_id
-        # all_line_item_mappings = all_line_item_mappings.drop_duplicates(
-        #     subset=['invoice_id', 'line_item_id'], 
-        #     keep='last'
-        # )
-        
-        # # Save combined mappings
-        # crud.create_table('zakya_invoice_line_item_mapping', all_line_item_mappings)
-        logger.debug(f"Saved {len(line_item_mappings_df)} total invoice line item mappings")
-        
-        return line_item_mappings_df
-        
-    except Exception:
-        # Table doesn't exist, create new
-        logger.debug("Creating new invoice line item mapping table")
-        crud.create_table('invoice_line_item_mapping', line_item_mappings_df)
-        logger.debug(f"Created table with {len(line_item_mappings_df)} invoice line item mappings")
-        
-        return line_item_mappings_df
+    # Upsert on (invoice_id, line_item_id) so only these invoices' rows are written
+    result = crud.upsert('invoice_line_item_mapping', line_item_mappings_df, ['invoice_id', 'line_item_id'])
+    logger.debug(result)
+    
+    return line_item_mappings_df
 
 # This function has been removed as we don't need to map invoices to sales orders
 
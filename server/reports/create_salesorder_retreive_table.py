@@ -1,9 +1,9 @@
 import asyncio
 import pandas as pd
-from utils.zakya_api import fetch_records_from_zakya, fetch_object_for_each_id
+from server.reports.zakya_incremental_sync import sync_zakya_endpoint
+from utils.zakya_async_api import AsyncZakyaClient, ZAKYA_ASYNC_MAX_CONNECTIONS
 from utils.postgres_connector import crud
 from config.logger import logger
-from core.helper_zakya import extract_record_list
 
 def fetch_all_salesorder_and_mapping_records_from_database(config):
     """
@@ -21,15 +21,9 @@ def fetch_all_salesorder_and_mapping_records_from_database(config):
         # Step 2: Fetch all sales orders from Zakya
         #logger.debug("Fetching all sales orders from Zakya API")
         try:
-            sales_orders_data = fetch_records_from_zakya(
-                config['api_domain'],
-                config['access_token'],
-                config['organization_id'],
-                '/salesorders'
-            )
-            
-            all_orders = extract_record_list(sales_orders_data, "salesorders")
-            all_orders_df = pd.DataFrame(all_orders)
+            # Bring zakya_sales_order up to date with only the records changed since the last sync
+            sync_zakya_endpoint(config, 'salesorders')
+            all_orders_df = crud.read_table('zakya_sales_order')
             #logger.debug(f"Found {len(all_orders_df)} total sales orders in Zakya")
             
         except Exception as api_error:
@@ -68,155 +62,122 @@ async def fetch_missing_salesorder_details(new_orders_df, config):
     try:
         # Convert to list of dictionaries for processing
         new_orders_records = new_orders_df.to_dict('records')
-        
-        # Set batch size for processing
-        batch_size = config.get('batch_size', 3)
-        
-        # Create a semaphore to limit concurrency
-        semaphore = asyncio.Semaphore(batch_size)
+        order_ids = [order.get('salesorder_id') for order in new_orders_records if order.get('salesorder_id')]
         
         # Create containers for results
         line_item_mapping_data = []
         invoice_mapping_data = []
         
-        # Process orders in batches
-        total_batches = (len(new_orders_records) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(new_orders_records), batch_size):
-            batch = new_orders_records[i:i+batch_size]
-            
-            batch_num = i // batch_size + 1
-            #logger.debug(f"Processing batch {batch_num} of {total_batches} ({len(batch)} orders)")
-            
-            # Create tasks for each sales order in the batch
-            tasks = []
-            for order in batch:
-                order_id = order.get('salesorder_id')
-                if not order_id:
-                    #logger.debug("Skipping order with missing ID")
+        # Fetch all details through one rate-limited connection pool
+        async with AsyncZakyaClient(
+            config['api_domain'],
+            config['access_token'],
+            config['organization_id'],
+            max_connections=config.get('batch_size', ZAKYA_ASYNC_MAX_CONNECTIONS)
+        ) as client:
+            results = await client.get_many([f'salesorders/{order_id}' for order_id in order_ids])
+        
+        for order_id, details in zip(order_ids, results):
+            try:
+                if not details:
+                    #logger.debug(f"No details returned for order {order_id}")
                     continue
-                    
-                # Define coroutine to fetch with semaphore
-                async def fetch_with_semaphore(order_id):
-                    async with semaphore:
-                        #logger.debug(f"Fetching details for order {order_id}")
-                        try:
-                            return await asyncio.to_thread(
-                                fetch_object_for_each_id,
-                                config['api_domain'],
-                                config['access_token'],
-                                config['organization_id'],
-                                f'salesorders/{order_id}'
-                            )
-                        except Exception as e:
-                            #logger.debug(f"Error fetching order {order_id}: {str(e)}")
-                            return None
-                
-                tasks.append((order_id, asyncio.create_task(fetch_with_semaphore(order_id))))
-            
-            # Wait for all tasks in this batch to complete
-            for order_id, task in tasks:
-                try:
-                    details = await task
-                    if not details:
-                        #logger.debug(f"No details returned for order {order_id}")
-                        continue
-                    
-                    # Process the main sales order data
-                    order_data = {}
-                    if 'sales_order' in details:
-                        order_data = details['sales_order']
-                    elif 'salesorder' in details:
-                        order_data = details['salesorder']
-                    else:
-                        #logger.debug(f"Unexpected response format for order {order_id}")
-                        continue
-                    
-                    # Extract line items
-                    line_items = []
-                    if 'line_items' in order_data:
-                        line_items = order_data['line_items']
-                    else:
-                        #logger.debug(f"No line items found in order {order_id}")
-                        continue
-                    
-                    # Extract invoice data if present
-                    if 'invoices' in order_data:
-                        inv_mappings = extract_invoice_mapping_data(order_data, order_id)
-                        invoice_mapping_data.extend(inv_mappings)
-                    
-                    # Extract financial details
-                    financial_details = extract_financial_details(order_data)
-                    
-                    # Extract custom fields (store as-is)
-                    custom_fields = handle_custom_fields(order_data)
-                    
-                    # Process each line item
-                    for line_item in line_items:
-                        mapping_record = {
-                            # Sales order fields
-                            'salesorder_id': order_id,
-                            'salesorder_number': order_data.get('salesorder_number', ''),
-                            'date': order_data.get('date', ''),
-                            'reference_number': order_data.get('reference_number', ''),
-                            'customer_id': order_data.get('customer_id', ''),
-                            
-                            # Line item fields
-                            'line_item_id': line_item.get('line_item_id', ''),
-                            'item_id': line_item.get('item_id', ''),
-                            'sku': line_item.get('sku', ''),
-                            'vendor_code': line_item.get('vendor_code', ''),
-                            'name': line_item.get('name', ''),
-                            
-                            # Quantity fields
-                            'quantity': line_item.get('quantity', 0),
-                            'quantity_invoiced': line_item.get('quantity_invoiced', 0),
-                            'quantity_packed': line_item.get('quantity_packed', 0),
-                            'quantity_shipped': line_item.get('quantity_shipped', 0),
-                            'quantity_picked': line_item.get('quantity_picked', 0),
-                            'quantity_backordered': line_item.get('quantity_backordered', 0),
-                            'quantity_dropshipped': line_item.get('quantity_dropshipped', 0),
-                            'quantity_cancelled': line_item.get('quantity_cancelled', 0),
-                            'quantity_delivered': line_item.get('quantity_delivered', 0),
-                            'quantity_invoiced_cancelled': line_item.get('quantity_invoiced_cancelled', 0),
-                            'quantity_returned': line_item.get('quantity_returned', 0),
-                            
-                            # Price fields
-                            'rate': line_item.get('rate', 0),
-                            'bcy_rate': line_item.get('bcy_rate', 0),
-                            
-                            # Tax fields
-                            'tax_id': line_item.get('tax_id', ''),
-                            'tax_name': line_item.get('tax_name', ''),
-                            'tax_amount': line_item.get('tax_amount', 0),
-                            'tax_percentage': line_item.get('tax_percentage', 0),
-                            'tax_specific_type': line_item.get('tax_specific_type', ''),
-                            'hsn_or_sac': line_item.get('hsn_or_sac', ''),
-                            
-                            # Financial fields from order level
-                            'discount_amount': financial_details.get('discount_amount', 0),
-                            'adjustment': financial_details.get('adjustment', 0),
-                            'sub_total': financial_details.get('sub_total', 0),
-                            'bcy_sub_total': financial_details.get('bcy_sub_total', 0),
-                            'sub_total_inclusive_of_tax': financial_details.get('sub_total_inclusive_of_tax', 0),
-                            'sub_total_exclusive_of_discount': financial_details.get('sub_total_exclusive_of_discount', 0),
-                            'discount_total': financial_details.get('discount_total', 0),
-                            'bcy_discount_total': financial_details.get('bcy_discount_total', 0),
-                            'discount_percent': financial_details.get('discount_percent', 0),
-                            'tax_total': financial_details.get('tax_total', 0),
-                            'bcy_tax_total': financial_details.get('bcy_tax_total', 0),
-                            'total': financial_details.get('total', 0),
-                            'bcy_total': financial_details.get('bcy_total', 0),
-                            
-                            # Custom fields as JSON array
-                            'custom_fields': custom_fields
-                        }
-                        line_item_mapping_data.append(mapping_record)
-                        
-                except Exception as e:
-                    #logger.debug(f"Error processing order {order_id}: {str(e)}")
+
+                # Process the main sales order data
+                order_data = {}
+                if 'sales_order' in details:
+                    order_data = details['sales_order']
+                elif 'salesorder' in details:
+                    order_data = details['salesorder']
+                else:
+                    #logger.debug(f"Unexpected response format for order {order_id}")
                     continue
-        
+
+                # Extract line items
+                line_items = []
+                if 'line_items' in order_data:
+                    line_items = order_data['line_items']
+                else:
+                    #logger.debug(f"No line items found in order {order_id}")
+                    continue
+
+                # Extract invoice data if present
+                if 'invoices' in order_data:
+                    inv_mappings = extract_invoice_mapping_data(order_data, order_id)
+                    invoice_mapping_data.extend(inv_mappings)
+
+                # Extract financial details
+                financial_details = extract_financial_details(order_data)
+
+                # Extract custom fields (store as-is)
+                custom_fields = handle_custom_fields(order_data)
+
+                # Process each line item
+                for line_item in line_items:
+                    mapping_record = {
+                        # Sales order fields
+                        'salesorder_id': order_id,
+                        'salesorder_number': order_data.get('salesorder_number', ''),
+                        'date': order_data.get('date', ''),
+                        'reference_number': order_data.get('reference_number', ''),
+                        'customer_id': order_data.get('customer_id', ''),
+
+                        # Line item fields
+                        'line_item_id': line_item.get('line_item_id', ''),
+                        'item_id': line_item.get('item_id', ''),
+                        'sku': line_item.get('sku', ''),
+                        'vendor_code': line_item.get('vendor_code', ''),
+                        'name': line_item.get('name', ''),
+
+                        # Quantity fields
+                        'quantity': line_item.get('quantity', 0),
+                        'quantity_invoiced': line_item.get('quantity_invoiced', 0),
+                        'quantity_packed': line_item.get('quantity_packed', 0),
+                        'quantity_shipped': line_item.get('quantity_shipped', 0),
+                        'quantity_picked': line_item.get('quantity_picked', 0),
+                        'quantity_backordered': line_item.get('quantity_backordered', 0),
+                        'quantity_dropshipped': line_item.get('quantity_dropshipped', 0),
+                        'quantity_cancelled': line_item.get('quantity_cancelled', 0),
+                        'quantity_delivered': line_item.get('quantity_delivered', 0),
+                        'quantity_invoiced_cancelled': line_item.get('quantity_invoiced_cancelled', 0),
+                        'quantity_returned': line_item.get('quantity_returned', 0),
+
+                        # Price fields
+                        'rate': line_item.get('rate', 0),
+                        'bcy_rate': line_item.get('bcy_rate', 0),
+
+                        # Tax fields
+                        'tax_id': line_item.get('tax_id', ''),
+                        'tax_name': line_item.get('tax_name', ''),
+                        'tax_amount': line_item.get('tax_amount', 0),
+                        'tax_percentage': line_item.get('tax_percentage', 0),
+                        'tax_specific_type': line_item.get('tax_specific_type', ''),
+                        'hsn_or_sac': line_item.get('hsn_or_sac', ''),
+
+                        # Financial fields from order level
+                        'discount_amount': financial_details.get('discount_amount', 0),
+                        'adjustment': financial_details.get('adjustment', 0),
+                        'sub_total': financial_details.get('sub_total', 0),
+                        'bcy_sub_total': financial_details.get('bcy_sub_total', 0),
+                        'sub_total_inclusive_of_tax': financial_details.get('sub_total_inclusive_of_tax', 0),
+                        'sub_total_exclusive_of_discount': financial_details.get('sub_total_exclusive_of_discount', 0),
+                        'discount_total': financial_details.get('discount_total', 0),
+                        'bcy_discount_total': financial_details.get('bcy_discount_total', 0),
+                        'discount_percent': financial_details.get('discount_percent', 0),
+                        'tax_total': financial_details.get('tax_total', 0),
+                        'bcy_tax_total': financial_details.get('bcy_tax_total', 0),
+                        'total': financial_details.get('total', 0),
+                        'bcy_total': financial_details.get('bcy_total', 0),
+
+                        # Custom fields as JSON array
+                        'custom_fields': custom_fields
+                    }
+                    line_item_mapping_data.append(mapping_record)
+
+            except Exception as e:
+                #logger.debug(f"Error processing order {order_id}: {str(e)}")
+                continue
+
         #logger.debug(f"Completed processing {len(new_orders_records)} orders")
         #logger.debug(f"Generated {len(line_item_mapping_data)} line item mappings")
         #logger.debug(f"Generated {len(invoice_mapping_data)} invoice mappings")
@@ -334,15 +295,8 @@ def save_new_mappings_to_database(line_item_mapping_data, existing_mappings_df):
     new_mappings_df = pd.DataFrame.from_records(line_item_mapping_data)
     logger.debug(f"Saving {len(new_mappings_df)} new line item mappings")
     
-    # If no existing mappings, create a new table
-    if existing_mappings_df.empty:
-        #logger.debug("Creating new line item mapping table")
-        crud.create_table('salesorder_line_item_mapping', new_mappings_df)
-    else:
-        # Append new mappings to existing table
-        #logger.debug("Appending to existing line item mapping table")
-        all_mappings_df = pd.concat([existing_mappings_df, new_mappings_df], ignore_index=True)
-        crud.create_table('salesorder_line_item_mapping', all_mappings_df)
+    # Write only the processed orders' rows; other mappings are left untouched
+    crud.upsert('salesorder_line_item_mapping', new_mappings_df, ['salesorder_id', 'line_item_id'])
     
     logger.debug(f"Successfully saved {len(new_mappings_df)} line item mappings")
     
@@ -357,7 +311,7 @@ def save_invoice_mappings_to_database(invoice_mapping_data):
         invoice_mapping_data (list): List of invoice mapping records
         
     Returns:
-        DataFrame: DataFrame of all invoice mappings
+        DataFrame: DataFrame of the invoice mappings written
     """
     if not invoice_mapping_data:
         #logger.debug("No invoice mappings to save")
@@ -367,33 +321,11 @@ def save_invoice_mappings_to_database(invoice_mapping_data):
     invoice_mappings_df = pd.DataFrame.from_records(invoice_mapping_data)
     #logger.debug(f"Saving {len(invoice_mappings_df)} invoice mappings")
     
-    # Check if mapping table exists
-    try:
-        existing_invoice_mappings = crud.read_table('zakya_salesorder_invoice_mapping')
-        #logger.debug(f"Found {len(existing_invoice_mappings)} existing invoice mappings")
-        
-        # Combine with new mappings
-        all_invoice_mappings = pd.concat([existing_invoice_mappings, invoice_mappings_df], ignore_index=True)
-        
-        # Remove duplicates based on salesorder_id and invoice_id
-        all_invoice_mappings = all_invoice_mappings.drop_duplicates(
-            subset=['salesorder_id', 'invoice_id'], 
-            keep='last'
-        )
-        
-        # Save combined mappings
-        crud.create_table('zakya_salesorder_invoice_mapping', all_invoice_mappings)
-        #logger.debug(f"Saved {len(all_invoice_mappings)} total invoice mappings")
-        
-        return all_invoice_mappings
-        
-    except Exception:
-        # Table doesn't exist, create new
-        #logger.debug("Creating new invoice mapping table")
-        crud.create_table('zakya_salesorder_invoice_mapping', invoice_mappings_df)
-        #logger.debug(f"Created table with {len(invoice_mappings_df)} invoice mappings")
-        
-        return invoice_mappings_df
+    # Upsert on (salesorder_id, invoice_id) instead of rewriting the whole table
+    result = crud.upsert('zakya_salesorder_invoice_mapping', invoice_mappings_df, ['salesorder_id', 'invoice_id'])
+    logger.debug(result)
+    
+    return invoice_mappings_df
 
 async def sync_salesorder_mappings(config):
     """
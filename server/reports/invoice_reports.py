@@ -2,99 +2,74 @@ import asyncio
 import streamlit as st
 from config.logger import logger
 import pandas as pd
-from utils.zakya_api import (fetch_object_for_each_id, fetch_records_from_zakya)
+from utils.zakya_api import iter_zakya_records
+from core.helper_zakya import concat_record_chunks, ZAKYA_RECORD_CHUNK_SIZE
+from utils.zakya_async_api import AsyncZakyaClient
 from utils.postgres_connector import crud
 
-def extract_record_list(input_data, key):
-    records = []
-    for record in input_data:
-        records.extend(record[f'{key}'])
-    return records
-
 async def fetch_records_from_zakya_in_df_format(endpoint):
-    object_data = fetch_records_from_zakya(
+    object_data = iter_zakya_records(
         st.session_state['api_domain'],
         st.session_state['access_token'],
         st.session_state['organization_id'],
-        f'/{endpoint}'                  
+        f'/{endpoint}',
+        endpoint,
+        chunk_size=ZAKYA_RECORD_CHUNK_SIZE
     )
-    object_data = extract_record_list(object_data, f"{endpoint}")
-    object_data = pd.DataFrame.from_records(object_data)
-    return object_data
-
-async def fetch_details_with_semaphore(semaphore, api_domain, access_token, org_id, endpoint, item_id):
-    """Fetch details for a single item with semaphore for rate limiting"""
-    async with semaphore:
-        # Use asyncio.to_thread to run the synchronous API call in a separate thread
-        return await asyncio.to_thread(
-            fetch_object_for_each_id,
-            api_domain,
-            access_token,
-            org_id,
-            f'{endpoint}/{item_id}'
-        )
+    return concat_record_chunks(object_data)
 
 async def process_items_in_batches(items, endpoint, batch_size=20):
-    """Process items in batches with concurrency control"""
+    """Fetch details for every item through the rate-limited async client"""
     mapping_data = []
     
-    # Create a semaphore to limit concurrency
-    semaphore = asyncio.Semaphore(batch_size)
+    item_ids = []
+    for item in items:
+        item_id = item.get(f'{endpoint[:-1]}_id')  # invoice_id or salesorder_id
+        if item_id:
+            item_ids.append(item_id)
     
-    # Process items in batches
-    for i in range(0, len(items), batch_size):
-        batch = items[i:i+batch_size]
-        
-        logger.info(f"Processing batch {i//batch_size + 1} of {(len(items) + batch_size - 1) // batch_size} for {endpoint}")
-        
-        # Create tasks for each item in the batch
-        tasks = []
-        for item in batch:
-            item_id = item.get(f'{endpoint[:-1]}_id')  # invoice_id or salesorder_id
-            if not item_id:
+    logger.info(f"Fetching {len(item_ids)} {endpoint} details")
+    
+    # batch_size caps open connections; the token bucket caps the request rate
+    async with AsyncZakyaClient(
+        st.session_state['api_domain'],
+        st.session_state['access_token'],
+        st.session_state['organization_id'],
+        max_connections=batch_size
+    ) as client:
+        results = await client.get_many([f'{endpoint}/{item_id}' for item_id in item_ids])
+    
+    for item_id, details in zip(item_ids, results):
+        try:
+            if not details:
                 continue
+            
+            # Extract line items from the response
+            if f'{endpoint[:-1]}' in details and 'line_items' in details[f'{endpoint[:-1]}']:
+                line_items = details[f'{endpoint[:-1]}']['line_items']
+            elif 'line_items' in details:
+                line_items = details['line_items']
+            else:
+                # Skip if no line items are found
+                #logger.debug(f"No line items found in {endpoint} {item_id}")
+                continue
+            
+            # Process each line item
+            for line_item in line_items:
+                mapping_record = {
+                    f'{endpoint[:-1]}_id': item_id,
+                    f'{endpoint[:-1]}_number': details.get(f'{endpoint[:-1]}', {}).get(f'{endpoint[:-1]}_number', ''),
+                    'line_item_id': line_item.get('line_item_id', ''),
+                    'item_id': line_item.get('item_id', ''),
+                    'item_name': line_item.get('name', ''),
+                    'quantity': line_item.get('quantity', 0),
+                    'rate': line_item.get('rate', 0),
+                    'amount': line_item.get('item_total', 0),
+                }
+                mapping_data.append(mapping_record)
                 
-            task = fetch_details_with_semaphore(
-                semaphore,
-                st.session_state['api_domain'],
-                st.session_state['access_token'],
-                st.session_state['organization_id'],
-                endpoint,
-                item_id
-            )
-            tasks.append((item_id, task))
-        
-        # Wait for all tasks in this batch to complete
-        for item_id, task in tasks:
-            try:
-                details = await task
-                
-                # Extract line items from the response
-                if f'{endpoint[:-1]}' in details and 'line_items' in details[f'{endpoint[:-1]}']:
-                    line_items = details[f'{endpoint[:-1]}']['line_items']
-                elif 'line_items' in details:
-                    line_items = details['line_items']
-                else:
-                    # Skip if no line items are found
-                    #logger.debug(f"No line items found in {endpoint} {item_id}")
-                    continue
-                
-                # Process each line item
-                for line_item in line_items:
-                    mapping_record = {
-                        f'{endpoint[:-1]}_id': item_id,
-                        f'{endpoint[:-1]}_number': details.get(f'{endpoint[:-1]}', {}).get(f'{endpoint[:-1]}_number', ''),
-                        'line_item_id': line_item.get('line_item_id', ''),
-                        'item_id': line_item.get('item_id', ''),
-                        'item_name': line_item.get('name', ''),
-                        'quantity': line_item.get('quantity', 0),
-                        'rate': line_item.get('rate', 0),
-                        'amount': line_item.get('item_total', 0),
-                    }
-                    mapping_data.append(mapping_record)
-                    
-            except Exception as e:
-                logger.error(f"Error processing {endpoint} {item_id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error processing {endpoint} {item_id}: {str(e)}")
     
     return mapping_data
 
@@ -0,0 +1,206 @@
+import os
+import argparse
+import asyncio
+import threading
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+from utils.pipeline_metrics import profile_stage
+from server.reports.update_salesorder_items_id_mapping_table import sync_salesorder_mappings
+from server.reports.update_invoice_item_ids_mapping_table import sync_invoice_mappings
+from server.reports.zakya_incremental_sync import build_config_from_refresh_token
+from server.reports.metric_rollups import MAPPING_SYNC_ROLLUPS, refresh_metric_rollup
+
+# Load environment variables from .env
+load_dotenv()
+
+MAPPING_SYNC_STATUS_TABLE = 'zakya_mapping_sync_status'
+
+# A mapping sync that succeeded this recently is not run again by readiness checks
+MAPPING_SYNC_MAX_AGE_MINUTES = int(os.getenv("MAPPING_SYNC_MAX_AGE_MINUTES", 15))
+# A 'running' sync older than this is assumed dead (e.g. the app restarted) and may be re-run
+MAPPING_SYNC_STALE_RUN_MINUTES = int(os.getenv("MAPPING_SYNC_STALE_RUN_MINUTES", 30))
+
+MAPPING_SYNC_JOBS = {
+    'salesorder_mappings': sync_salesorder_mappings,
+    'invoice_mappings': sync_invoice_mappings,
+}
+
+_background_lock = threading.Lock()
+_background_thread = None
+
+
+def ensure_mapping_sync_status_table():
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS public.{MAPPING_SYNC_STATUS_TABLE} (
+                job TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                last_success_at TIMESTAMPTZ,
+                mapping_rows INTEGER,
+                error TEXT
+            )
+        """))
+
+
+def claim_mapping_sync(job, max_age_minutes=MAPPING_SYNC_MAX_AGE_MINUTES, force=False):
+    """
+    Atomically mark job as running, unless it is fresh or already running.
+
+    Fresh means the last success finished less than max_age_minutes ago
+    (ignored when force is set). A run started more than
+    MAPPING_SYNC_STALE_RUN_MINUTES ago is treated as dead.
+
+    Returns:
+        bool: True when this caller should run the sync
+    """
+    with crud.engine.begin() as connection:
+        claimed = connection.execute(text(f"""
+            INSERT INTO public.{MAPPING_SYNC_STATUS_TABLE} AS s (job, status, started_at)
+            VALUES (:job, 'running', now())
+            ON CONFLICT (job) DO UPDATE
+                SET status = 'running', started_at = now(), finished_at = NULL, error = NULL
+                WHERE (:force OR s.last_success_at IS NULL
+                       OR s.last_success_at < now() - make_interval(mins => :max_age))
+                  AND (s.status <> 'running' OR s.started_at < now() - make_interval(mins => :stale_run))
+            RETURNING s.job
+        """), {
+            "job": job,
+            "force": force,
+            "max_age": max_age_minutes,
+            "stale_run": MAPPING_SYNC_STALE_RUN_MINUTES
+        }).first()
+    return claimed is not None
+
+
+def finish_mapping_sync(job, mapping_rows=None, error=None):
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            UPDATE public.{MAPPING_SYNC_STATUS_TABLE}
+            SET status = CASE WHEN :error IS NULL THEN 'succeeded' ELSE 'failed' END,
+                finished_at = now(),
+                last_success_at = CASE WHEN :error IS NULL THEN now() ELSE last_success_at END,
+                mapping_rows = COALESCE(:mapping_rows, mapping_rows),
+                error = :error
+            WHERE job = :job
+        """), {"job": job, "mapping_rows": mapping_rows, "error": error})
+
+
+async def run_mapping_sync(job, config, max_age_minutes=MAPPING_SYNC_MAX_AGE_MINUTES, force=False):
+    """
+    Run one mapping sync if it is stale and nobody else is running it.
+
+    Returns:
+        dict: job and status ('skipped', 'succeeded' or 'failed')
+    """
+    await asyncio.to_thread(ensure_mapping_sync_status_table)
+    if not await asyncio.to_thread(claim_mapping_sync, job, max_age_minutes, force):
+        logger.info(f"Skipping {job} sync: fresh or already running")
+        return {'job': job, 'status': 'skipped'}
+
+    try:
+        with profile_stage(f'sync_{job}'):
+            mappings_df = await MAPPING_SYNC_JOBS[job](config, raise_errors=True)
+    except Exception as e:
+        await asyncio.to_thread(finish_mapping_sync, job, None, str(e))
+        return {'job': job, 'status': 'failed', 'error': str(e)}
+
+    # The sync returns only the mappings it added
+    mapping_rows = len(mappings_df) if isinstance(mappings_df, pd.DataFrame) else None
+    await asyncio.to_thread(finish_mapping_sync, job, mapping_rows)
+
+    # Recompute the dashboard metrics for what this sync changed
+    new_record_ids = mappings_df.attrs.get('new_record_ids') if isinstance(mappings_df, pd.DataFrame) else None
+    with profile_stage(f'rollup_{job}'):
+        logger.info(await asyncio.to_thread(refresh_metric_rollup, MAPPING_SYNC_ROLLUPS[job], new_record_ids))
+    return {'job': job, 'status': 'succeeded', 'mapping_rows': mapping_rows}
+
+
+async def sync_mappings_if_stale(config, max_age_minutes=MAPPING_SYNC_MAX_AGE_MINUTES, force=False):
+    """
+    Bring the sales order and invoice line item mappings up to date, unless they already are.
+
+    Each job is skipped when it succeeded within max_age_minutes or another
+    session is running it; otherwise it runs incrementally (only records
+    changed since the last sync are pulled from Zakya).
+
+    Args:
+        config (dict): Zakya credentials (api_domain, access_token, organization_id)
+        max_age_minutes (int): Freshness window
+        force (bool): Run even when fresh
+
+    Returns:
+        list: One result dict per job
+    """
+    return [await run_mapping_sync(job, config, max_age_minutes, force) for job in MAPPING_SYNC_JOBS]
+
+
+def start_background_mapping_sync(config, force=False):
+    """
+    Run sync_mappings_if_stale on a daemon thread so the caller does not wait.
+
+    Returns:
+        bool: False when a background sync is already running in this process
+    """
+    global _background_thread
+    with _background_lock:
+        if _background_thread is not None and _background_thread.is_alive():
+            return False
+        _background_thread = threading.Thread(
+            target=lambda: asyncio.run(sync_mappings_if_stale(config, force=force)),
+            name="mapping-sync",
+            daemon=True
+        )
+        _background_thread.start()
+        return True
+
+
+def background_mapping_sync_running():
+    return _background_thread is not None and _background_thread.is_alive()
+
+
+def mapping_sync_status(max_age_minutes=MAPPING_SYNC_MAX_AGE_MINUTES):
+    """
+    Last run of each mapping sync.
+
+    Returns:
+        DataFrame: job, status, started_at, finished_at, last_success_at,
+        mapping_rows (mappings added by the last run), error, minutes since
+        the last success and whether it is fresh
+    """
+    ensure_mapping_sync_status_table()
+    rows = crud.fetch_rows(f"""
+        SELECT *, EXTRACT(EPOCH FROM now() - last_success_at) / 60 AS minutes_since_success
+        FROM public.{MAPPING_SYNC_STATUS_TABLE}
+    """)
+    status = pd.DataFrame(rows, columns=[
+        'job', 'status', 'started_at', 'finished_at', 'last_success_at', 'mapping_rows', 'error', 'minutes_since_success'
+    ])
+    status = status.set_index('job').reindex(list(MAPPING_SYNC_JOBS)).reset_index()
+    status['status'] = status['status'].fillna('never run')
+    status['minutes_since_success'] = pd.to_numeric(status['minutes_since_success']).round(1)
+    status['fresh'] = status['minutes_since_success'] < max_age_minutes
+    return status
+
+
+def main():
+    """
+    Command line entry point, e.g. for a cron job every few minutes:
+        python -m server.reports.mapping_sync
+    """
+    parser = argparse.ArgumentParser(description="Sync Zakya sales order and invoice line item mappings")
+    parser.add_argument("--max-age", type=int, default=MAPPING_SYNC_MAX_AGE_MINUTES, help="Freshness window in minutes")
+    parser.add_argument("--force", action="store_true", help="Sync even when the mappings are fresh")
+    args = parser.parse_args()
+
+    results = asyncio.run(sync_mappings_if_stale(build_config_from_refresh_token(), args.max_age, args.force))
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import argparse
+import pandas as pd
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+from utils.query_result_cache import query_cache, bump_data_version
+from utils.duckdb_engine import duckdb_engine, use_duckdb, duckdb_sql, duckdb_where_clause
+from server.reports.open_salesorder_lines import NUMBER
+from server.reports.zakya_incremental_sync import ZAKYA_SYNC_OVERLAP_SECONDS
+
+METRIC_ROLLUP_STATE_TABLE = 'zakya_metric_rollup_state'
+
+# Day of a Zakya record ('YYYY-MM-DD' text), NULL when missing or blank
+DAY = "NULLIF({}::text, '')::date"
+MODIFIED = "NULLIF({}::text, '')::timestamptz"
+
+# Sales order lines per order and item, at the grain the sales order dashboard
+# lists them (the order number and total stay on each row). Refreshed per
+# sales order, so an order whose date or customer changed moves cleanly.
+SALESORDER_ROLLUP_SELECT = f"""
+SELECT
+    som.salesorder_id::text AS salesorder_id,
+    p.item_id::text AS item_id,
+    {DAY.format('so.date')} AS order_date,
+    p.item_name,
+    p.sku,
+    COALESCE(p.category_name, '') AS category_name,
+    COALESCE(so.customer_name, '') AS customer_name,
+    COALESCE(c.customer_sub_type, '') AS customer_type,
+    so.salesorder_number,
+    SUM({NUMBER.format('som.quantity')}) AS total_quantity,
+    SUM({NUMBER.format('som.amount')}) AS total_item_revenue,
+    {NUMBER.format('so.total')} AS total_order_value,
+    now() AS refreshed_at
+FROM public.zakya_salesorder_line_item_mapping som
+LEFT JOIN public.zakya_products p ON som.item_id::text = p.item_id::text
+LEFT JOIN public.zakya_sales_order so ON som.salesorder_id::text = so.salesorder_id::text
+LEFT JOIN public.zakya_contacts c ON so.customer_id::text = c.contact_id::text
+WHERE so.customer_name IS NOT NULL AND c.gst_treatment = 'business_gst' {{scope_filter}}
+GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 12
+"""
+
+# Invoice lines per day, item and customer, for paid/sent/overdue invoices.
+# Refreshed per day: every affected day is recomputed from all its invoices.
+INVOICE_ROLLUP_SELECT = f"""
+SELECT
+    {DAY.format('i.date')} AS invoice_date,
+    p.item_id::text AS item_id,
+    i.customer_id::text AS customer_id,
+    COALESCE(c.customer_sub_type, '') AS customer_type,
+    COALESCE(p.category_name, '') AS category_name,
+    p.name AS product_name,
+    p.cf_collection AS collection,
+    COALESCE(c.contact_name, '') AS customer_name,
+    c.company_name,
+    SUM({NUMBER.format('lim.quantity')}) AS total_quantity_sold,
+    SUM({NUMBER.format('lim.amount')}) AS total_revenue,
+    CASE
+        WHEN SUM({NUMBER.format('lim.quantity')}) > 0
+        THEN SUM({NUMBER.format('lim.amount')}) / SUM({NUMBER.format('lim.quantity')})
+        ELSE 0
+    END AS avg_selling_price,
+    COUNT(DISTINCT lim.invoice_id) AS invoice_count,
+    now() AS refreshed_at
+FROM public.zakya_invoice_line_item_mapping lim
+LEFT JOIN public.zakya_products p ON lim.item_id::text = p.item_id::text
+LEFT JOIN public.zakya_invoices i ON lim.invoice_id::text = i.invoice_id::text
+LEFT JOIN public.zakya_contacts c ON i.customer_id::text = c.contact_id::text
+WHERE i.status IN ('paid', 'sent', 'overdue')
+    AND i.customer_id IS NOT NULL {{scope_filter}}
+GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9
+"""
+
+METRIC_ROLLUPS = {
+    'salesorders': {
+        'table': 'zakya_salesorder_item_metrics',
+        'select': SALESORDER_ROLLUP_SELECT,
+        'source_table': 'zakya_sales_order',
+        'mapping_table': 'zakya_salesorder_line_item_mapping',
+        # Tables the select joins, as read by the DuckDB engine
+        'snapshot_tables': ['zakya_salesorder_line_item_mapping', 'zakya_products', 'zakya_sales_order', 'zakya_contacts'],
+        'id_column': 'salesorder_id',
+        'date_column': 'order_date',
+        # Rows are replaced per sales order
+        'scope': 'salesorder_id',
+        'scope_filter': "AND som.salesorder_id::text = ANY(:scope)",
+        'columns': """
+            salesorder_id TEXT,
+            item_id TEXT,
+            order_date DATE,
+            item_name TEXT,
+            sku TEXT,
+            category_name TEXT,
+            customer_name TEXT,
+            customer_type TEXT,
+            salesorder_number TEXT,
+            total_quantity NUMERIC,
+            total_item_revenue NUMERIC,
+            total_order_value NUMERIC,
+            refreshed_at TIMESTAMPTZ
+        """,
+        'filter_columns': ['category_name', 'customer_name', 'customer_type'],
+    },
+    'invoices': {
+        'table': 'zakya_invoice_item_daily_metrics',
+        'select': INVOICE_ROLLUP_SELECT,
+        'source_table': 'zakya_invoices',
+        'mapping_table': 'zakya_invoice_line_item_mapping',
+        'snapshot_tables': ['zakya_invoice_line_item_mapping', 'zakya_products', 'zakya_invoices', 'zakya_contacts'],
+        'id_column': 'invoice_id',
+        'date_column': 'invoice_date',
+        # Rows are replaced per invoice day. The day each invoice was last
+        # rolled into is kept in day_map_table, so a refresh also rewrites the
+        # old day of an invoice whose date changed or that was deleted.
+        'scope': 'invoice_date',
+        'day_map_table': 'zakya_invoice_metric_rollup_days',
+        'scope_filter': f"AND {DAY.format('i.date')} = ANY(:scope)",
+        'columns': """
+            invoice_date DATE,
+            item_id TEXT,
+            customer_id TEXT,
+            customer_type TEXT,
+            category_name TEXT,
+            product_name TEXT,
+            collection TEXT,
+            customer_name TEXT,
+            company_name TEXT,
+            total_quantity_sold NUMERIC,
+            total_revenue NUMERIC,
+            avg_selling_price NUMERIC,
+            invoice_count INTEGER,
+            refreshed_at TIMESTAMPTZ
+        """,
+        'filter_columns': ['category_name', 'customer_name', 'customer_type'],
+    },
+}
+
+# Mapping sync job -> rollup it feeds
+MAPPING_SYNC_ROLLUPS = {
+    'salesorder_mappings': 'salesorders',
+    'invoice_mappings': 'invoices',
+}
+
+
+def ensure_metric_rollup_tables(connection, rollup):
+    """
+    Create the rollup table, its filter indexes, its day map (day-scoped
+    rollups) and the refresh state table.
+
+    Returns:
+        bool: False when a source table does not exist yet
+    """
+    spec = METRIC_ROLLUPS[rollup]
+    inspector = inspect(connection)
+    for table in (spec['mapping_table'], spec['source_table'], 'zakya_products', 'zakya_contacts'):
+        if not inspector.has_table(table, schema="public"):
+            logger.info(f"{table} does not exist yet, skipping {rollup} metric rollup refresh")
+            return False
+
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS public.{spec['table']} ({spec['columns']})"))
+    for column in [spec['date_column'], spec['scope'], *spec['filter_columns']]:
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {spec['table']}_{column}_idx ON public.{spec['table']} ({column})"
+        ))
+    if spec.get('day_map_table'):
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS public.{spec['day_map_table']} (
+                record_id TEXT PRIMARY KEY,
+                day DATE
+            )
+        """))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {spec['day_map_table']}_day_idx ON public.{spec['day_map_table']} (day)"
+        ))
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS public.{METRIC_ROLLUP_STATE_TABLE} (
+            rollup TEXT PRIMARY KEY,
+            refreshed_at TIMESTAMPTZ,
+            mode TEXT,
+            row_count INTEGER
+        )
+    """))
+    return True
+
+
+def changed_scope(connection, rollup, since, record_ids=None):
+    """
+    Scope values (sales order ids or invoice days) a refresh has to rewrite.
+
+    Covers source records Zakya modified after since (minus
+    ZAKYA_SYNC_OVERLAP_SECONDS, as Zakya's clock is not ours), the given
+    record_ids (e.g. records that were mapped in this sync) and records the
+    source no longer has. For day-scoped rollups both the day a changed
+    record is on now and the day it was rolled into last time are included.
+    """
+    spec = METRIC_ROLLUPS[rollup]
+    id_column = spec['id_column']
+    source_columns = {
+        col['name'] for col in inspect(connection).get_columns(spec['source_table'], schema="public")
+    }
+    conditions = [f"{id_column}::text = ANY(:record_ids)"]
+    if 'last_modified_time' in source_columns:
+        conditions.append(
+            f"{MODIFIED.format('last_modified_time')} >= :since - make_interval(secs => :overlap)"
+        )
+
+    changed_ids = connection.execute(text(f"""
+        SELECT DISTINCT {id_column}::text
+        FROM public.{spec['source_table']}
+        WHERE {' OR '.join(conditions)}
+    """), {
+        "record_ids": [str(record_id) for record_id in record_ids or []],
+        "since": since,
+        "overlap": ZAKYA_SYNC_OVERLAP_SECONDS
+    }).scalars().all()
+    # Records whose id the source no longer has still need their rows dropped
+    changed_ids = sorted(set(changed_ids) | {str(record_id) for record_id in record_ids or []})
+
+    if spec['scope'] == id_column:
+        removed_ids = connection.execute(text(f"""
+            SELECT DISTINCT r.{id_column}
+            FROM public.{spec['table']} r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM public.{spec['source_table']} s WHERE s.{id_column}::text = r.{id_column}
+            )
+        """)).scalars().all()
+        return sorted(set(changed_ids) | set(removed_ids))
+
+    rows = connection.execute(text(f"""
+        SELECT {DAY.format('date')} FROM public.{spec['source_table']} WHERE {id_column}::text = ANY(:changed_ids)
+        UNION
+        SELECT day FROM public.{spec['day_map_table']} WHERE record_id = ANY(:changed_ids)
+        UNION
+        SELECT m.day FROM public.{spec['day_map_table']} m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM public.{spec['source_table']} s WHERE s.{id_column}::text = m.record_id
+        )
+    """), {"changed_ids": changed_ids}).scalars().all()
+    return [row for row in rows if row is not None]
+
+
+def refresh_day_map(connection, rollup, scope=None):
+    """
+    Record the day every source record on the scope days (all days when
+    scope is None) is rolled into, for the next changed_scope.
+    """
+    spec = METRIC_ROLLUPS[rollup]
+    day = DAY.format('date')
+    if scope is None:
+        connection.execute(text(f"DELETE FROM public.{spec['day_map_table']}"))
+        day_filter, params = "", {}
+    else:
+        connection.execute(
+            text(f"DELETE FROM public.{spec['day_map_table']} WHERE day = ANY(:scope)"), {"scope": scope}
+        )
+        day_filter, params = f"AND {day} = ANY(:scope)", {"scope": scope}
+    connection.execute(text(f"""
+        INSERT INTO public.{spec['day_map_table']} (record_id, day)
+        SELECT {spec['id_column']}::text, {day}
+        FROM public.{spec['source_table']}
+        WHERE {spec['id_column']} IS NOT NULL AND {day} IS NOT NULL {day_filter}
+        ON CONFLICT (record_id) DO UPDATE SET day = EXCLUDED.day
+    """), params)
+
+
+def refresh_metric_rollup(rollup, record_ids=None, full=False):
+    """
+    Bring one metric rollup up to date with the synced Zakya tables.
+
+    Incremental by default: only sales orders (or invoice days) whose
+    source record changed since the last refresh, or is in record_ids,
+    are recomputed. The first refresh, or full=True, rebuilds the whole
+    table - run that nightly to pick up renamed products or customers,
+    which do not touch the sales order or invoice records themselves.
+    Each refresh rewrites its rows in one transaction.
+
+    Args:
+        rollup (str): One of METRIC_ROLLUPS
+        record_ids (list): Sales order / invoice ids to recompute in any case
+        full (bool): Rebuild every row
+
+    Returns:
+        str: Status message
+    """
+    spec = METRIC_ROLLUPS[rollup]
+    columns = ", ".join(
+        line.split()[0] for line in spec['columns'].strip().splitlines() if line.strip()
+    )
+
+    try:
+        with crud.engine.begin() as connection:
+            if not ensure_metric_rollup_tables(connection, rollup):
+                return f"Source tables missing, {rollup} metric rollup not refreshed."
+
+            refreshed_at = connection.execute(text("SELECT now()")).scalar()
+            since = connection.execute(
+                text(f"SELECT refreshed_at FROM public.{METRIC_ROLLUP_STATE_TABLE} WHERE rollup = :rollup"),
+                {"rollup": rollup}
+            ).scalar()
+            full = full or since is None
+            if spec.get('day_map_table') and not full:
+                # Without a day map (first run after it was added) old days are unknown
+                full = connection.execute(
+                    text(f"SELECT NOT EXISTS (SELECT 1 FROM public.{spec['day_map_table']})")
+                ).scalar()
+
+            if full:
+                connection.execute(text(f"DELETE FROM public.{spec['table']}"))
+                select = spec['select'].format(scope_filter="")
+                params = {}
+            else:
+                scope = changed_scope(connection, rollup, since, record_ids)
+                connection.execute(
+                    text(f"DELETE FROM public.{spec['table']} WHERE {spec['scope']} = ANY(:scope)"),
+                    {"scope": scope}
+                )
+                select = spec['select'].format(scope_filter=spec['scope_filter'])
+                params = {"scope": scope}
+
+            result = connection.execute(text(
+                f"INSERT INTO public.{spec['table']} ({columns}) SELECT {columns} FROM ({select}) rollup_rows"
+            ), params)
+            if spec.get('day_map_table'):
+                refresh_day_map(connection, rollup, None if full else scope)
+
+            connection.execute(text(f"""
+                INSERT INTO public.{METRIC_ROLLUP_STATE_TABLE} (rollup, refreshed_at, mode, row_count)
+                VALUES (:rollup, :refreshed_at, :mode, :row_count)
+                ON CONFLICT (rollup) DO UPDATE SET
+                    refreshed_at = EXCLUDED.refreshed_at,
+                    mode = EXCLUDED.mode,
+                    row_count = EXCLUDED.row_count
+            """), {
+                "rollup": rollup,
+                "refreshed_at": refreshed_at,
+                "mode": 'full' if full else 'incremental',
+                "row_count": result.rowcount
+            })
+            # Cached dashboard results for this rollup are dropped once this commits
+            bump_data_version(connection, spec['table'])
+    except Exception as e:
+        logger.error(f"Error refreshing {rollup} metric rollup: {e}")
+        return f"Error refreshing {rollup} metric rollup: {e}"
+
+    crud.notify_write(spec['table'])
+    scope_note = "all rows" if full else f"{len(scope)} {spec['scope']} values"
+    return f"Refreshed {rollup} metric rollup for {scope_note}: {result.rowcount} rows."
+
+
+def refresh_metric_rollups(full=False):
+    """Refresh every metric rollup; returns one status message per rollup."""
+    return [refresh_metric_rollup(rollup, full=full) for rollup in METRIC_ROLLUPS]
+
+
+def duckdb_metric_query(rollup, filters=None):
+    """
+    The rollup's select as one DuckDB query over the source snapshots.
+
+    Computes the same rows as the rollup table, for every record at once,
+    with filters applied on top.
+
+    Returns:
+        tuple: (sql, params)
+    """
+    spec = METRIC_ROLLUPS[rollup]
+    where_sql, params = crud.where_clause_params(filters)
+    query = f"""
+        SELECT * EXCLUDE (refreshed_at)
+        FROM ({duckdb_sql(spec['select'].format(scope_filter=""))}) metrics
+        {duckdb_where_clause(where_sql)}
+        ORDER BY {spec['date_column']} DESC NULLS LAST
+    """
+    return query, params
+
+
+def fetch_metric_duckdb(rollup, filters=None, engine=None):
+    """
+    Compute rollup rows matching filters with DuckDB over the Parquet snapshots.
+
+    Nothing is read from Postgres except to rebuild a stale snapshot.
+    Results are not kept in query_cache: snapshot writes do not bump a data
+    version, and DuckDB recomputes a dashboard's rows in well under a second.
+
+    Raises:
+        Exception: When DuckDB or a snapshot is unavailable
+    """
+    query, params = duckdb_metric_query(rollup, filters)
+    return (engine or duckdb_engine).query(query, METRIC_ROLLUPS[rollup]['snapshot_tables'], params)
+
+
+def fetch_metric_rollup(rollup, filters=None, engine=None):
+    """
+    Read rollup rows matching filters, newest first.
+
+    Filters are pushed down to Postgres and hit the rollup's indexes, so a
+    dashboard filter change reads only the matching rows. Results are
+    shared across sessions through query_cache until the next refresh of
+    the rollup. The table is built on first use.
+
+    With METRICS_ENGINE=duckdb (or engine='duckdb') the rows are computed
+    by fetch_metric_duckdb instead, falling back to Postgres on error.
+
+    Args:
+        rollup (str): One of METRIC_ROLLUPS
+        filters (dict): {column: {'op': operator, 'value': value}} as for crud.read_table
+        engine (str): 'postgres' or 'duckdb' (default: METRICS_ENGINE)
+
+    Returns:
+        DataFrame: Matching rows (empty on error)
+    """
+    spec = METRIC_ROLLUPS[rollup]
+
+    if use_duckdb(engine):
+        try:
+            return fetch_metric_duckdb(rollup, filters)
+        except Exception as e:
+            logger.error(f"Error computing {rollup} metrics in DuckDB, reading Postgres instead: {e}")
+
+    def load():
+        if not inspect(crud.engine).has_table(spec['table'], schema="public"):
+            logger.info(refresh_metric_rollup(rollup))
+        rows = crud.read_table(spec['table'], filters=filters)
+        if not isinstance(rows, pd.DataFrame):
+            raise RuntimeError(rows)
+        return rows.drop(columns=['refreshed_at']).sort_values(spec['date_column'], ascending=False, ignore_index=True)
+
+    try:
+        return query_cache.get(f'{rollup}_metrics', filters, [spec['table']], load)
+    except Exception as e:
+        logger.error(f"Error fetching {rollup} metrics: {e}")
+        return pd.DataFrame()
+
+
+def fetch_metric_rollup_options(rollup, engine=None):
+    """
+    Values to offer in the dashboard filters of a rollup.
+
+    Args:
+        rollup (str): One of METRIC_ROLLUPS
+        engine (str): 'postgres' or 'duckdb' (default: METRICS_ENGINE)
+
+    Returns:
+        dict: Sorted distinct values per filter column, plus 'min_date' and
+        'max_date' (None when the rollup is empty or unreadable)
+    """
+    spec = METRIC_ROLLUPS[rollup]
+
+    if use_duckdb(engine):
+        try:
+            metrics = fetch_metric_duckdb(rollup)
+            dates = pd.to_datetime(metrics[spec['date_column']]).dropna()
+            return {
+                **{column: sorted(metrics[column].dropna().unique()) for column in spec['filter_columns']},
+                'min_date': dates.min().date() if len(dates) else None,
+                'max_date': dates.max().date() if len(dates) else None,
+            }
+        except Exception as e:
+            logger.error(f"Error computing {rollup} metric filter options in DuckDB, reading Postgres instead: {e}")
+
+    def load():
+        if not inspect(crud.engine).has_table(spec['table'], schema="public"):
+            logger.info(refresh_metric_rollup(rollup))
+        options = {
+            column: [
+                row['value'] for row in crud.fetch_rows(
+                    f"SELECT DISTINCT {column} AS value FROM public.{spec['table']} "
+                    f"WHERE {column} IS NOT NULL ORDER BY 1"
+                )
+            ]
+            for column in spec['filter_columns']
+        }
+        options.update(crud.fetch_rows(
+            f"SELECT MIN({spec['date_column']}) AS min_date, MAX({spec['date_column']}) AS max_date "
+            f"FROM public.{spec['table']}"
+        )[0])
+        return options
+
+    try:
+        return query_cache.get(f'{rollup}_filter_options', None, [spec['table']], load)
+    except Exception as e:
+        logger.error(f"Error fetching {rollup} metric filter options: {e}")
+        return {**{column: [] for column in spec['filter_columns']}, 'min_date': None, 'max_date': None}
+
+
+def main():
+    """
+    Command line entry point, e.g. for a nightly full rebuild:
+        python -m server.reports.metric_rollups --full
+    """
+    parser = argparse.ArgumentParser(description="Refresh the dashboard metric rollup tables")
+    parser.add_argument("--rollup", choices=list(METRIC_ROLLUPS), help="Refresh only this rollup")
+    parser.add_argument("--full", action="store_true", help="Rebuild every row instead of what changed")
+    args = parser.parse_args()
+
+    rollups = [args.rollup] if args.rollup else list(METRIC_ROLLUPS)
+    for rollup in rollups:
+        print(refresh_metric_rollup(rollup, full=args.full))
+
+
+if __name__ == "__main__":
+    main()
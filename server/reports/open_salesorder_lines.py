@@ -0,0 +1,229 @@
+from collections import defaultdict
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+
+OPEN_SALESORDER_LINES_TABLE = 'zakya_open_salesorder_lines'
+SALESORDER_LINE_MAPPING_TABLE = 'zakya_salesorder_line_item_mapping'
+INVOICE_LINE_MAPPING_TABLE = 'zakya_invoice_line_item_mapping'
+
+# Columns the open lines read that older mapping tables may lack
+SOURCE_COLUMNS = {
+    SALESORDER_LINE_MAPPING_TABLE: [('quantity_invoiced', 'NUMERIC'), ('quantity_cancelled', 'NUMERIC')],
+    INVOICE_LINE_MAPPING_TABLE: [('salesorder_item_id', 'TEXT')],
+}
+
+# Quantities may be stored as numbers or, for columns added by upsert, as text
+NUMBER = "COALESCE(NULLIF({}::text, '')::numeric, 0)"
+
+# One row per sales order line that still has quantity left to invoice.
+#
+# Invoiced quantity comes from invoice lines that point at the line through
+# salesorder_item_id, or from the line's own quantity_invoiced (as Zakya
+# reported it when the order was mapped; it is not refreshed afterwards, so
+# it only serves as a floor), whichever is larger. Invoices that are not
+# linked to sales order lines (Aza, invoices made by hand in Zakya) fall back
+# to the old item-level rule: once the item is on such an invoice, all of
+# its lines count as fully invoiced.
+OPEN_LINES_SELECT = f"""
+WITH so_lines AS (
+    SELECT
+        so.item_id::text AS item_id,
+        so.salesorder_id::text AS salesorder_id,
+        so.salesorder_number,
+        so.line_item_id::text AS line_item_id,
+        {NUMBER.format('so.quantity')} AS quantity,
+        {NUMBER.format('so.quantity_invoiced')} AS quantity_invoiced,
+        {NUMBER.format('so.quantity_cancelled')} AS quantity_cancelled
+    FROM public.{SALESORDER_LINE_MAPPING_TABLE} so
+    WHERE so.item_id IS NOT NULL AND so.item_id::text <> '' {{item_filter}}
+),
+linked_invoice_lines AS (
+    SELECT inv.salesorder_item_id::text AS line_item_id, SUM({NUMBER.format('inv.quantity')}) AS quantity
+    FROM public.{INVOICE_LINE_MAPPING_TABLE} inv
+    WHERE inv.salesorder_item_id IS NOT NULL AND inv.salesorder_item_id::text <> ''
+    GROUP BY 1
+),
+unlinked_invoice_items AS (
+    SELECT DISTINCT inv.item_id::text AS item_id
+    FROM public.{INVOICE_LINE_MAPPING_TABLE} inv
+    WHERE inv.salesorder_item_id IS NULL OR inv.salesorder_item_id::text = ''
+),
+scored AS (
+    SELECT
+        s.*,
+        CASE
+            WHEN u.item_id IS NOT NULL THEN s.quantity
+            ELSE GREATEST(s.quantity_invoiced, COALESCE(l.quantity, 0))
+        END AS invoiced
+    FROM so_lines s
+    LEFT JOIN linked_invoice_lines l ON l.line_item_id = s.line_item_id
+    LEFT JOIN unlinked_invoice_items u ON u.item_id = s.item_id
+)
+SELECT
+    item_id, salesorder_id, salesorder_number, line_item_id, quantity,
+    invoiced AS quantity_invoiced, quantity_cancelled,
+    quantity - invoiced - quantity_cancelled AS quantity_remaining,
+    now() AS refreshed_at
+FROM scored
+WHERE quantity - invoiced - quantity_cancelled > 0
+"""
+
+
+def ensure_open_salesorder_lines_table(connection):
+    """
+    Create the open lines table and the source columns it reads.
+
+    Returns:
+        bool: False when a mapping table does not exist yet
+    """
+    inspector = inspect(connection)
+    for table in (SALESORDER_LINE_MAPPING_TABLE, INVOICE_LINE_MAPPING_TABLE):
+        if not inspector.has_table(table, schema="public"):
+            logger.info(f"{table} does not exist yet, skipping open sales order lines refresh")
+            return False
+
+    # ALTER TABLE takes an ACCESS EXCLUSIVE lock even when IF NOT EXISTS
+    # makes it a no-op, so only run it for columns that are really missing
+    for table, columns in SOURCE_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table, schema="public")}
+        missing = [f"ADD COLUMN IF NOT EXISTS {name} {sql_type}" for name, sql_type in columns if name not in existing]
+        if missing:
+            connection.execute(text(f"ALTER TABLE public.{table} {', '.join(missing)}"))
+
+    if not inspector.has_table(OPEN_SALESORDER_LINES_TABLE, schema="public"):
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS public.{OPEN_SALESORDER_LINES_TABLE} (
+                item_id TEXT NOT NULL,
+                salesorder_id TEXT,
+                salesorder_number TEXT,
+                line_item_id TEXT PRIMARY KEY,
+                quantity NUMERIC,
+                quantity_invoiced NUMERIC,
+                quantity_cancelled NUMERIC,
+                quantity_remaining NUMERIC,
+                refreshed_at TIMESTAMPTZ
+            )
+        """))
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {OPEN_SALESORDER_LINES_TABLE}_item_id_idx "
+            f"ON public.{OPEN_SALESORDER_LINES_TABLE} (item_id)"
+        ))
+    return True
+
+
+def refresh_open_salesorder_lines(item_ids=None):
+    """
+    Recompute open sales order lines, for the given item_ids only or for all items.
+
+    Called after each mapping sync with the item_ids the sync touched, so a
+    refresh rewrites just those items' rows in one transaction.
+
+    Returns:
+        str: Status message
+    """
+    if item_ids is not None:
+        item_ids = list({str(item_id) for item_id in item_ids if item_id is not None and str(item_id) != ''})
+        if not item_ids:
+            return "No items to refresh."
+
+    try:
+        with crud.engine.begin() as connection:
+            if not ensure_open_salesorder_lines_table(connection):
+                return "Mapping tables missing, nothing refreshed."
+
+            columns = ("item_id, salesorder_id, salesorder_number, line_item_id, quantity, "
+                       "quantity_invoiced, quantity_cancelled, quantity_remaining, refreshed_at")
+            if item_ids is None:
+                connection.execute(text(f"DELETE FROM public.{OPEN_SALESORDER_LINES_TABLE}"))
+                select = OPEN_LINES_SELECT.format(item_filter="")
+                params = {}
+            else:
+                connection.execute(
+                    text(f"DELETE FROM public.{OPEN_SALESORDER_LINES_TABLE} WHERE item_id = ANY(:item_ids)"),
+                    {"item_ids": item_ids}
+                )
+                select = OPEN_LINES_SELECT.format(item_filter="AND so.item_id::text = ANY(:item_ids)")
+                params = {"item_ids": item_ids}
+
+            # Duplicate mapping rows for a line keep the first one
+            result = connection.execute(text(
+                f"INSERT INTO public.{OPEN_SALESORDER_LINES_TABLE} ({columns}) "
+                f"SELECT {columns} FROM ({select}) open_lines "
+                f"ON CONFLICT (line_item_id) DO NOTHING"
+            ), params)
+    except Exception as e:
+        logger.error(f"Error refreshing open sales order lines: {e}")
+        return f"Error refreshing open sales order lines: {e}"
+
+    crud.notify_write(OPEN_SALESORDER_LINES_TABLE)
+    scope = "all items" if item_ids is None else f"{len(item_ids)} items"
+    return f"Refreshed open sales order lines for {scope}: {result.rowcount} open lines."
+
+
+def fetch_open_salesorder_lines(item_ids):
+    """
+    Open sales order lines for item_ids, oldest sales order first.
+
+    Builds the table on first use.
+
+    Returns:
+        dict: item_id (str) -> list of line dicts (salesorder_id,
+        salesorder_number, line_item_id, quantity_remaining, ...)
+    """
+    item_ids = list({str(item_id) for item_id in item_ids if item_id is not None})
+    if not item_ids:
+        return {}
+
+    if not inspect(crud.engine).has_table(OPEN_SALESORDER_LINES_TABLE, schema="public"):
+        logger.info(refresh_open_salesorder_lines())
+
+    try:
+        rows = crud.fetch_rows(
+            f"SELECT * FROM public.{OPEN_SALESORDER_LINES_TABLE} "
+            f"WHERE item_id = ANY(:item_ids) ORDER BY salesorder_number, line_item_id",
+            {"item_ids": item_ids}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching open sales order lines: {e}")
+        return {}
+
+    open_lines = defaultdict(list)
+    for row in rows:
+        open_lines[row['item_id']].append(row)
+    return dict(open_lines)
+
+
+def fetch_item_ids_with_salesorder_lines(item_ids):
+    """Return the item_ids (as strings) that have any sales order line, open or not."""
+    item_ids = list({str(item_id) for item_id in item_ids if item_id is not None})
+    if not item_ids:
+        return set()
+    try:
+        rows = crud.fetch_rows(
+            f"SELECT DISTINCT item_id::text AS item_id FROM public.{SALESORDER_LINE_MAPPING_TABLE} "
+            f"WHERE item_id::text = ANY(:item_ids)",
+            {"item_ids": item_ids}
+        )
+    except Exception as e:
+        logger.error(f"Error fetching sales order lines: {e}")
+        return set()
+    return {row['item_id'] for row in rows}
+
+
+def take_open_line(open_lines, item_id, quantity=1):
+    """
+    Reserve quantity on the oldest open line of item_id.
+
+    Decrements quantity_remaining in open_lines so repeated calls within one
+    invoice run move on to the next line once a line is used up.
+
+    Returns:
+        str: line_item_id, or None when the item has no open line left
+    """
+    for line in open_lines.get(str(item_id), []):
+        if line['quantity_remaining'] > 0:
+            line['quantity_remaining'] -= quantity
+            return line['line_item_id']
+    return None
@@ -0,0 +1,288 @@
+import argparse
+import os
+from datetime import timedelta
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.zakya_api import iter_zakya_pages, get_access_token
+from utils.postgres_connector import crud
+from utils.parquet_snapshot_store import snapshot_store, UNKNOWN_MONTH
+
+# Load environment variables from .env
+load_dotenv()
+
+ZAKYA_SYNC_WATERMARK_TABLE = 'zakya_sync_watermarks'
+
+# Records modified this long before the stored watermark are fetched again,
+# so edits landing in the same second as the last sync are never missed.
+ZAKYA_SYNC_OVERLAP_SECONDS = int(os.getenv("ZAKYA_SYNC_OVERLAP_SECONDS", 300))
+ZAKYA_SYNC_CHUNK_SIZE = int(os.getenv("ZAKYA_SYNC_CHUNK_SIZE", 1000))
+
+ZAKYA_SYNC_ENDPOINTS = {
+    'salesorders': {'key': 'salesorders', 'table': 'zakya_sales_order', 'id_column': 'salesorder_id'},
+    'invoices': {'key': 'invoices', 'table': 'zakya_invoices', 'id_column': 'invoice_id'},
+    'items': {'key': 'items', 'table': 'zakya_products', 'id_column': 'item_id'},
+    'contacts': {'key': 'contacts', 'table': 'zakya_contacts', 'id_column': 'contact_id'},
+}
+
+INCREMENTAL = 'incremental'
+FULL = 'full'
+
+
+def parse_zakya_time(value):
+    """Parse a Zakya timestamp such as 2024-03-15T10:20:30+0530 to a UTC Timestamp."""
+    if not value:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    return timestamp.tz_convert('UTC') if timestamp.tzinfo else timestamp.tz_localize('UTC')
+
+
+def format_zakya_time(timestamp):
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+def ensure_watermark_table():
+    with crud.engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS public.{ZAKYA_SYNC_WATERMARK_TABLE} (
+                endpoint TEXT PRIMARY KEY,
+                last_modified_time TEXT,
+                mode TEXT,
+                row_count INTEGER,
+                synced_at TIMESTAMPTZ DEFAULT now()
+            )
+        """))
+
+
+def get_watermark(endpoint):
+    """Return the stored high-water mark for endpoint as a UTC Timestamp, or None."""
+    ensure_watermark_table()
+    with crud.engine.connect() as connection:
+        row = connection.execute(
+            text(f"SELECT last_modified_time FROM public.{ZAKYA_SYNC_WATERMARK_TABLE} WHERE endpoint = :endpoint"),
+            {"endpoint": endpoint}
+        ).fetchone()
+    return parse_zakya_time(row[0]) if row else None
+
+
+def set_watermark(endpoint, last_modified_time, mode, row_count):
+    ensure_watermark_table()
+    with crud.engine.begin() as connection:
+        connection.execute(
+            text(f"""
+                INSERT INTO public.{ZAKYA_SYNC_WATERMARK_TABLE} (endpoint, last_modified_time, mode, row_count, synced_at)
+                VALUES (:endpoint, :last_modified_time, :mode, :row_count, now())
+                ON CONFLICT (endpoint) DO UPDATE SET
+                    last_modified_time = EXCLUDED.last_modified_time,
+                    mode = EXCLUDED.mode,
+                    row_count = EXCLUDED.row_count,
+                    synced_at = EXCLUDED.synced_at
+            """),
+            {"endpoint": endpoint, "last_modified_time": last_modified_time, "mode": mode, "row_count": row_count}
+        )
+
+
+def fetch_sync_status():
+    """Return the watermark table as a DataFrame (empty if no sync has run yet)."""
+    ensure_watermark_table()
+    status = crud.read_table(ZAKYA_SYNC_WATERMARK_TABLE)
+    return status if isinstance(status, pd.DataFrame) else pd.DataFrame()
+
+
+def iter_modified_records(config, endpoint, since=None):
+    """
+    Yield records of endpoint modified at or after since (all records if None).
+
+    Asks Zakya for newest-first ordering by last_modified_time plus a
+    last_modified_time filter. When the response confirms that ordering,
+    paging stops at the first older record; otherwise older records are
+    skipped client-side so the result is the same either way.
+    """
+    spec = ZAKYA_SYNC_ENDPOINTS[endpoint]
+    params = {'sort_column': 'last_modified_time', 'sort_order': 'D'}
+    if since is not None:
+        params['last_modified_time'] = format_zakya_time(since)
+
+    for page in iter_zakya_pages(
+        config['api_domain'],
+        config['access_token'],
+        config['organization_id'],
+        f'/{endpoint}',
+        params=params
+    ):
+        page_context = page.get('page_context', {})
+        sorted_newest_first = (
+            page_context.get('sort_column') == 'last_modified_time'
+            and page_context.get('sort_order') == 'D'
+        )
+        for record in page.get(spec['key'], []):
+            modified = parse_zakya_time(record.get('last_modified_time'))
+            if since is not None and modified is not None and modified < since:
+                if sorted_newest_first:
+                    return
+                continue
+            yield record
+
+
+def sync_zakya_endpoint(config, endpoint, mode=INCREMENTAL, chunk_size=ZAKYA_SYNC_CHUNK_SIZE):
+    """
+    Sync one Zakya list endpoint into its Postgres table.
+
+    incremental: fetch records modified since the stored watermark (minus
+    ZAKYA_SYNC_OVERLAP_SECONDS) and upsert them by id. Falls back to a full
+    sync when no watermark exists yet.
+    full: stream every record and atomically replace the table, which also
+    drops records deleted in Zakya. Meant for the nightly reconcile.
+
+    Args:
+        config (dict): Dictionary with API credentials (api_domain, access_token, organization_id)
+        endpoint (str): One of ZAKYA_SYNC_ENDPOINTS
+        mode (str): 'incremental' or 'full'
+        chunk_size (int): Rows written per batch
+
+    Returns:
+        dict: endpoint, mode, rows written, new watermark and the crud status message
+    """
+    spec = ZAKYA_SYNC_ENDPOINTS[endpoint]
+    since = None
+    if mode == INCREMENTAL:
+        watermark = get_watermark(endpoint)
+        if watermark is not None:
+            since = watermark - timedelta(seconds=ZAKYA_SYNC_OVERLAP_SECONDS)
+        else:
+            logger.info(f"No watermark for {endpoint}, running a full sync")
+            mode = FULL
+
+    state = {'rows': 0, 'max_modified': None, 'max_modified_raw': None, 'months': set()}
+    snapshot_date_column = snapshot_store.tables.get(spec['table'])
+
+    def chunks():
+        buffer = []
+        for record in iter_modified_records(config, endpoint, since):
+            modified = parse_zakya_time(record.get('last_modified_time'))
+            if modified is not None and (state['max_modified'] is None or modified > state['max_modified']):
+                state['max_modified'] = modified
+                state['max_modified_raw'] = record.get('last_modified_time')
+            if snapshot_date_column:
+                state['months'].add(str(record.get(snapshot_date_column) or '')[:7] or UNKNOWN_MONTH)
+            buffer.append(record)
+            if len(buffer) >= chunk_size:
+                state['rows'] += len(buffer)
+                yield pd.DataFrame.from_records(buffer)
+                buffer = []
+        if buffer:
+            state['rows'] += len(buffer)
+            yield pd.DataFrame.from_records(buffer)
+
+    if mode == FULL:
+        result = crud.create_table_from_chunks(spec['table'], chunks())
+    else:
+        result = f"No changes for '{spec['table']}'."
+        for chunk in chunks():
+            if snapshot_date_column:
+                # The months these records are in before the upsert; a record
+                # whose date moved must leave its old month's partition too
+                state['months'] |= snapshot_store.record_months(spec['table'], spec['id_column'], chunk.get(spec['id_column'], []))
+            result = crud.upsert(spec['table'], chunk, [spec['id_column']])
+            if result.startswith("Error"):
+                break
+
+    # Leave the watermark where it was so the next run retries these records
+    if result.startswith("Error"):
+        raise RuntimeError(result)
+    logger.info(f"Zakya {mode} sync of {endpoint}: {state['rows']} rows. {result}")
+
+    if state['max_modified_raw'] is not None:
+        set_watermark(endpoint, state['max_modified_raw'], mode, state['rows'])
+
+    # Incremental syncs rewrite only the snapshot months they touched, old and new
+    if mode == FULL or state['rows']:
+        snapshot_store.refresh(spec['table'], state['months'] if mode == INCREMENTAL and snapshot_date_column else None)
+
+    return {
+        'endpoint': endpoint,
+        'mode': mode,
+        'rows': state['rows'],
+        'watermark': state['max_modified_raw'],
+        'result': result,
+    }
+
+
+def sync_zakya_records(config, endpoints=None, mode=INCREMENTAL):
+    """
+    Sync several endpoints; a failure in one is logged and does not stop the rest.
+
+    Returns:
+        list: One result dict per endpoint (with an 'error' key on failure)
+    """
+    results = []
+    for endpoint in endpoints or ZAKYA_SYNC_ENDPOINTS:
+        try:
+            results.append(sync_zakya_endpoint(config, endpoint, mode))
+        except Exception as e:
+            logger.error(f"Zakya {mode} sync of {endpoint} failed: {e}")
+            results.append({'endpoint': endpoint, 'mode': mode, 'rows': 0, 'error': str(e)})
+    return results
+
+
+def fetch_unmapped_records(endpoint, mapping_table):
+    """
+    Return synced records of endpoint whose id has no row in mapping_table.
+
+    Falls back to every synced record when the mapping table does not exist.
+    """
+    spec = ZAKYA_SYNC_ENDPOINTS[endpoint]
+    query = f"""
+        SELECT * FROM {spec['table']}
+        WHERE "{spec['id_column']}"::text NOT IN (
+            SELECT DISTINCT "{spec['id_column']}"::text FROM {mapping_table}
+            WHERE "{spec['id_column']}" IS NOT NULL
+        )
+    """
+    unmapped = crud.execute_query(query, return_data=True)
+    if unmapped is None:
+        unmapped = crud.read_table(spec['table'])
+    return unmapped if isinstance(unmapped, pd.DataFrame) else pd.DataFrame()
+
+
+def build_config_from_refresh_token():
+    """
+    Build a sync config outside Streamlit, from the zakya_auth refresh token.
+
+    Mirrors app.set_access_token_via_refresh_token; ZAKYA_ORGANIZATION_ID
+    must be set in the environment.
+    """
+    zakya_auth_df = crud.read_table("zakya_auth")
+    zakya_auth_df = zakya_auth_df[zakya_auth_df['env'] == os.getenv('env')]
+    if zakya_auth_df.empty:
+        raise Exception("No authentication data found")
+
+    token_data = get_access_token(refresh_token=zakya_auth_df["refresh_token"].iloc[0])
+    return {
+        'api_domain': 'https://api.zakya.in/',
+        'access_token': token_data['access_token'],
+        'organization_id': os.getenv("ZAKYA_ORGANIZATION_ID"),
+    }
+
+
+def main():
+    """
+    Command line entry point, e.g. for a nightly cron job:
+        python -m server.reports.zakya_incremental_sync --mode full
+    """
+    parser = argparse.ArgumentParser(description="Sync Zakya list endpoints into Postgres")
+    parser.add_argument("--mode", choices=[INCREMENTAL, FULL], default=INCREMENTAL)
+    parser.add_argument("--endpoints", nargs="*", choices=list(ZAKYA_SYNC_ENDPOINTS), default=None)
+    args = parser.parse_args()
+
+    results = sync_zakya_records(build_config_from_refresh_token(), args.endpoints, args.mode)
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
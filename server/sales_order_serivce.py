@@ -1,10 +1,10 @@
 import pandas as pd
 from utils.zakya_api import fetch_records_from_zakya
-from utils.postgres_connector import crud
+from utils.reference_data_cache import reference_cache
 from config.logger import logger
-from queries.zakya import queries
+from server.reports.metric_rollups import fetch_metric_rollup, fetch_metric_rollup_options
 from core.helper_zakya import extract_record_list
-from utils.common_filtering_database_function import find_product
+from utils.common_filtering_database_function import find_products_by_skus
 
 def fetch_salesorders_by_customer(config):
     """Fetch sales orders for a specific customer, with or without Pernia product filtering."""
@@ -17,7 +17,7 @@ def fetch_salesorders_by_customer(config):
             '/salesorders'
         )
 
-        salesorder_item_mapping_df = crud.read_table('zakya_salesorder_line_item_mapping')
+        salesorder_item_mapping_df = reference_cache.read_table('zakya_salesorder_line_item_mapping')
         
         # Extract sales orders
         all_orders = extract_record_list(sales_orders_data, "salesorders")
@@ -42,12 +42,16 @@ def fetch_salesorders_by_customer(config):
         # If Pernia orders are provided, filter to only include those items
         if config.get('pernia_orders') is not None:
             # Original Pernia-specific filtering code
-            items_data_result = []
+            skus = []
             for indx, row in config['pernia_orders'].iterrows():
                 sku = row.get("Vendor Code", " ")
                 if len(sku) > 0:
-                    item = find_product(sku)
-                    items_data_result.extend(item)
+                    skus.append(sku)
+
+            products_by_sku = find_products_by_skus(skus)
+            items_data_result = []
+            for sku in skus:
+                items_data_result.extend(products_by_sku.get(sku, []))
             
             mapped_pernia_products_df = pd.DataFrame.from_records(items_data_result)
             mapped_pernia_products_df = mapped_pernia_products_df[['item_id']]
@@ -92,10 +96,21 @@ def fetch_salesorders_by_customer(config):
     
 
 
-def fetch_product_metrics_for_sales_order_by_customer():
+def fetch_product_metrics_for_sales_order_by_customer(filters=None):
+    """
+    Sales order metrics per order and item from the sales order metric rollup.
+
+    Args:
+        filters (dict): Optional {column: {'op', 'value'}} pushed down to
+            Postgres, e.g. {'order_date': {'op': 'between', 'value': [start, end]}}
+    """
     try:
-        product_analytics = crud.execute_query(queries.salesorder_product_metrics_query,True)
+        product_analytics = fetch_metric_rollup('salesorders', filters)
         return product_analytics
     except Exception as e:
         logger.debug(f"Product analytics query failed with error: {e}")
 
+
+def fetch_salesorder_metric_filter_options():
+    """Categories, customers, customer types and date range present in the sales order metrics."""
+    return fetch_metric_rollup_options('salesorders')
@@ -10,6 +10,7 @@ from config.logger import logger
 from schema.zakya_schemas.schema import ZakyaContacts,ZakyaSalesOrder, ZakyaProducts
 from utils.zakya_api import fetch_object_for_each_id, post_record_to_zakya, fetch_record_from_zakya
 from queries.zakya import queries
+from utils.common_filtering_database_function import find_products_by_skus, find_salesorders_by_numbers
 from config.constants import (
     customer_mapping_zakya_contacts
     ,salesorder_mapping_zakya
@@ -34,13 +35,8 @@ async def create_whereclause_fetch_data(pydantic_model, filter_dict, query):
     """
     try:
         # Filter customer data for the given branch name
-        whereClause = crud.build_where_clause(pydantic_model, filter_dict)
-        formatted_query = query.format(whereClause=whereClause)
-        
         # Run the synchronous database query in a thread pool to make it non-blocking
-        data = await asyncio.to_thread(crud.execute_query, query=formatted_query, return_data=True)
-        # #logger.debug(f"query is {formatted_query} and data is {data}")
-        return data.to_dict('records')
+        return await crud.fetch_where_async(pydantic_model, filter_dict, query)
     except Exception as e:
         return {"error": f"Error fetching row: {e}"}
 
@@ -92,10 +88,7 @@ async def preprocess_taj_sales_report(taj_sales_df):
     existing_sku_item_id_mapping = {}
     existing_salesorder_number_salesorder_id_mapping = {}
     
-    # Prepare tasks for both product and sales order lookups
-    product_tasks = []
     product_styles = []
-    salesorder_tasks = []
     salesorder_numbers = []
     
     for _, row in taj_sales_df.iterrows():
@@ -103,29 +96,28 @@ async def preprocess_taj_sales_report(taj_sales_df):
         salesorder_number = row.get("PartyDoc No", "").split(" ")[-1]
         #logger.debug(f"sku is {style} and sales order number is {salesorder_number}")
         
-        product_tasks.append(find_missing_products(style))
         product_styles.append(style)
-        
-        salesorder_tasks.append(find_missing_salesorder(salesorder_number))
         salesorder_numbers.append(salesorder_number)
     
-    # Run product lookup tasks with concurrency limit
-    product_results = await run_limited_tasks(product_tasks, limit=10)
+    # Resolve all styles and all sales order numbers with one query each
+    products_by_style, salesorders_by_number = await asyncio.gather(
+        asyncio.to_thread(find_products_by_skus, product_styles),
+        asyncio.to_thread(find_salesorders_by_numbers, salesorder_numbers)
+    )
     
     # Process product results
-    for style, items_data in zip(product_styles, product_results):
-        if items_data and not isinstance(items_data, dict) and "error" not in items_data:
+    for style in product_styles:
+        items_data = products_by_style.get(style)
+        if items_data:
             existing_sku_item_id_mapping[style] = items_data[0]["item_id"]
             existing_products.append(style)
         else:
             missing_products.append(style)
     
-    # Run sales order lookup tasks with concurrency limit
-    salesorder_results = await run_limited_tasks(salesorder_tasks, limit=10)
-    
     # Process sales order results
-    for salesorder_number, salesorder_data in zip(salesorder_numbers, salesorder_results):
-        if salesorder_data and not isinstance(salesorder_data, dict) and "error" not in salesorder_data:
+    for salesorder_number in salesorder_numbers:
+        salesorder_data = salesorders_by_number.get(salesorder_number)
+        if salesorder_data:
             existing_salesorder_number_salesorder_id_mapping[salesorder_number] = salesorder_data[0]["salesorder_id"]
             existing_sales_orders.append(salesorder_data)
         else:
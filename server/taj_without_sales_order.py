@@ -7,8 +7,11 @@ from collections import defaultdict
 from utils.postgres_connector import crud
 from config.logger import logger
 from schema.zakya_schemas.schema import ZakyaContacts, ZakyaProducts
-from utils.zakya_api import post_record_to_zakya
+from server.invoice.branch_invoices import post_branch_invoices
+from utils.zakya_async_api import shared_zakya_clients
+from utils.pipeline_metrics import PipelineProfiler, save_stage_report
 from queries.zakya import queries
+from utils.common_filtering_database_function import find_products_by_skus
 from config.constants import (
     customer_mapping_zakya_contacts,
     products_mapping_zakya_products
@@ -20,10 +23,7 @@ load_dotenv()
 async def create_whereclause_fetch_data(pydantic_model, filter_dict, query):
     """Fetch data using where clause asynchronously."""
     try:
-        whereClause = crud.build_where_clause(pydantic_model, filter_dict)
-        formatted_query = query.format(whereClause=whereClause)
-        data = await asyncio.to_thread(crud.execute_query, query=formatted_query, return_data=True)
-        return data.to_dict('records')
+        return await crud.fetch_where_async(pydantic_model, filter_dict, query)
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return {"error": f"Error fetching data: {e}"}
@@ -51,8 +51,6 @@ async def preprocess_products(taj_sales_df):
     missing_products = []
     existing_sku_item_id_mapping = {}
     
-    # Prepare product lookup tasks
-    product_tasks = []
     product_styles = []
     
     for _, row in taj_sales_df.iterrows():
@@ -60,15 +58,15 @@ async def preprocess_products(taj_sales_df):
         if not style:
             continue
             
-        product_tasks.append(find_product(style))
         product_styles.append(style)
     
-    # Run product lookup tasks with concurrency limit
-    product_results = await run_limited_tasks(product_tasks, limit=10)
+    # Resolve every style in the report with one query
+    products_by_style = await asyncio.to_thread(find_products_by_skus, product_styles)
     
     # Process product results
-    for style, items_data in zip(product_styles, product_results):
-        if items_data and not isinstance(items_data, dict) and "error" not in items_data and len(items_data) > 0:
+    for style in product_styles:
+        items_data = products_by_style.get(style)
+        if items_data:
             existing_sku_item_id_mapping[style] = items_data[0]["item_id"]
             existing_products.append(style)
         else:
@@ -83,7 +81,7 @@ async def preprocess_products(taj_sales_df):
         "existing_sku_item_id_mapping": existing_sku_item_id_mapping
     }
 
-async def create_invoices(taj_sales_df, zakya_connection_object, invoice_object):
+async def create_invoices(taj_sales_df, zakya_connection_object, invoice_object, on_result=None):
     """Create invoices grouped by branch name."""
     # Group by branch name
     branch_to_customer_map = {}
@@ -144,8 +142,8 @@ async def create_invoices(taj_sales_df, zakya_connection_object, invoice_object)
             logger.error(f"Error processing row: {e}")
             continue
     
-    # Create invoices (one per branch)
-    invoice_summary = []
+    # Build one invoice payload per branch
+    branch_invoice_payloads = {}
     
     for branch_name, data in branch_to_invoice_payload.items():
         if not data["line_items"]:
@@ -173,65 +171,51 @@ async def create_invoices(taj_sales_df, zakya_connection_object, invoice_object)
         if customer_data.get("gst"):
             invoice_payload["gst_no"] = customer_data["gst"]
         
-        try:
-            #logger.debug(f"Creating invoice for {branch_name} with payload: {invoice_payload.keys()} and {len(invoice_payload["line_items"])}")
-            invoice_response = post_record_to_zakya(
-                zakya_connection_object['base_url'],
-                zakya_connection_object['access_token'],
-                zakya_connection_object['organization_id'],
-                'invoices',
-                invoice_payload
-            )
-            
-            if isinstance(invoice_response, dict) and "invoice" in invoice_response:
-                invoice_data = invoice_response["invoice"]
-                total_amount = sum(item["rate"] * item["quantity"] for item in data["line_items"])
-                
-                invoice_summary.append({
-                    "invoice_id": invoice_data.get("invoice_id"),
-                    "invoice_number": invoice_data.get("invoice_number"),
-                    "customer_name": branch_name,
-                    "date": invoice_payload["date"],
-                    "due_date": invoice_data.get("due_date"),
-                    "amount": total_amount,
-                    "status": "Success"
-                })
-                logger.info(f"Successfully created invoice for {branch_name}: {invoice_data.get('invoice_number')}")
-            else:
-                logger.error(f"Invalid invoice response for {branch_name}: {invoice_response}")
-                invoice_summary.append({
-                    "customer_name": branch_name,
-                    "date": invoice_payload["date"],
-                    "status": "Failed",
-                    "error": str(invoice_response)
-                })
-        except Exception as e:
-            logger.error(f"Error creating invoice for {branch_name}: {e}")
-            invoice_summary.append({
-                "customer_name": branch_name,
-                "date": invoice_payload["date"],
-                "status": "Failed",
-                "error": str(e)
-            })
+        branch_invoice_payloads[branch_name] = invoice_payload
+    
+    # Post all branches concurrently; a branch already invoiced by an earlier run is not posted again
+    invoice_summary = await post_branch_invoices(zakya_connection_object, branch_invoice_payloads, on_result=on_result)
     
     return pd.DataFrame(invoice_summary) if invoice_summary else pd.DataFrame()
 
-def process_taj_sales(taj_sales_df, invoice_date, zakya_connection_object):
-    """Main processing function for Taj sales."""
+def process_taj_sales(taj_sales_df, invoice_date, zakya_connection_object, on_result=None):
+    """
+    Main processing function for Taj sales.
+
+    on_result, if given, is called with each branch's invoice summary row as
+    soon as that branch's invoice has been posted (or skipped).
+
+    Returns:
+        tuple: (invoice summary DataFrame, stage_report DataFrame), profiled
+        like InvoiceProcessor.process
+    """
     # Preprocess the dataframe
     taj_sales_df["Style"] = taj_sales_df["Style"].astype(str) 
     taj_sales_df['Rounded_Total'] = taj_sales_df['Total'].apply(lambda x: math.ceil(x) if x - int(x) >= 0.5 else math.floor(x))
     
-    # Find existing products
-    product_config = asyncio.run(preprocess_products(taj_sales_df))
-    
-    # Prepare invoice object
-    invoice_object = {
-        'invoice_date': invoice_date,
-        'existing_sku_item_id_mapping': product_config['existing_sku_item_id_mapping']
-    }
-    
-    # Create invoices
-    invoice_df = asyncio.run(create_invoices(taj_sales_df, zakya_connection_object, invoice_object))
-    
-    return invoice_df
\ No newline at end of file
+    profiler = PipelineProfiler('TajInvoice')
+    try:
+        result = asyncio.run(run_taj_invoices(taj_sales_df, invoice_date, zakya_connection_object, profiler, on_result))
+    finally:
+        stage_report = profiler.report()
+        logger.info(f"{profiler.pipeline} stage report:\n{stage_report.to_string(index=False)}")
+        save_stage_report(profiler, crud)
+    return result, stage_report
+
+
+async def run_taj_invoices(taj_sales_df, invoice_date, zakya_connection_object, profiler, on_result=None):
+    """Product lookup and invoice creation in one event loop, sharing one Zakya client."""
+    async with shared_zakya_clients():
+        # Find existing products
+        with profiler.stage('preprocess_products'):
+            product_config = await preprocess_products(taj_sales_df)
+        
+        # Prepare invoice object
+        invoice_object = {
+            'invoice_date': invoice_date,
+            'existing_sku_item_id_mapping': product_config['existing_sku_item_id_mapping']
+        }
+        
+        # Create invoices
+        with profiler.stage('create_invoices'):
+            return await create_invoices(taj_sales_df, zakya_connection_object, invoice_object, on_result)
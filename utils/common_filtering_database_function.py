@@ -1,16 +1,15 @@
+from collections import defaultdict
+import pandas as pd
 from utils.postgres_connector import crud
 from config.logger import logger
-from config.constants import products_mapping_zakya_products
-from schema.zakya_schemas.schema import ZakyaProducts
+from config.constants import products_mapping_zakya_products, salesorder_mapping_zakya
+from schema.zakya_schemas.schema import ZakyaProducts, ZakyaSalesOrder
 from queries.zakya import queries
 
 def create_whereclause_fetch_data(pydantic_model, filter_dict, query):
     """Fetch data using where clause asynchronously."""
     try:
-        whereClause = crud.build_where_clause(pydantic_model, filter_dict)
-        formatted_query = query.format(whereClause=whereClause)
-        data = crud.execute_query(query=formatted_query, return_data=True)
-        return data.to_dict('records')
+        return crud.fetch_where(pydantic_model, filter_dict, query)
     except Exception as e:
         logger.error(f"Error fetching data: {e}")
         return {"error": f"Error fetching data: {e}"}
@@ -21,3 +20,70 @@ def find_product(sku):
         products_mapping_zakya_products['style']: {'op': 'eq', 'value': sku}
     }, queries.fetch_prodouct_records)    
     return items_data
+
+
+def group_records_by(records, column):
+    grouped = defaultdict(list)
+    for record in records:
+        grouped[record[column]].append(record)
+    return dict(grouped)
+
+def find_products_by_skus(skus):
+    """
+    Resolve many SKUs with a single "sku = ANY(:skus)" query.
+
+    Args:
+        skus (iterable): SKUs/styles to look up; blanks and duplicates are ignored
+
+    Returns:
+        dict: sku -> list of zakya_products rows (the same rows find_product
+        returns). SKUs without a product are absent.
+    """
+    sku_column = products_mapping_zakya_products['style']
+    skus = list({sku for sku in skus if sku})
+    if not skus:
+        return {}
+    items_data = crud.fetch_where(ZakyaProducts, {
+        sku_column: {'op': 'in', 'value': skus}
+    }, queries.fetch_prodouct_records)
+    return group_records_by(items_data, sku_column)
+
+def find_salesorders_by_numbers(salesorder_numbers):
+    """
+    Resolve many sales order numbers with a single query.
+
+    Returns:
+        dict: salesorder_number -> list of {salesorder_number, salesorder_id}
+        rows. Numbers without a sales order are absent.
+    """
+    number_column = salesorder_mapping_zakya['salesorder_number']
+    salesorder_numbers = list({number for number in salesorder_numbers if number})
+    if not salesorder_numbers:
+        return {}
+    salesorder_data = crud.fetch_where(ZakyaSalesOrder, {
+        number_column: {'op': 'in', 'value': salesorder_numbers}
+    }, queries.fetch_salesorder_number_id_records)
+    return group_records_by(salesorder_data, number_column)
+
+INVENTORY_COLUMNS = [
+    'item_id', 'available_stock', 'actual_available_stock',
+    'stock_on_hand', 'reorder_level', 'track_inventory'
+]
+
+def fetch_inventory_rows(item_ids, columns=INVENTORY_COLUMNS):
+    """
+    Read only the inventory columns of zakya_products for the given item_ids.
+
+    Returns:
+        DataFrame: one row per product found (empty on error)
+    """
+    item_ids = list({str(item_id) for item_id in item_ids if item_id is not None})
+    if not item_ids:
+        return pd.DataFrame(columns=columns)
+    products_df = crud.read_table('zakya_products', columns=columns, filters={
+        'item_id': {'op': 'in', 'value': item_ids}
+    })
+    if not isinstance(products_df, pd.DataFrame):
+        logger.error(products_df)
+        return pd.DataFrame(columns=columns)
+    return products_df
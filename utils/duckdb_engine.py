@@ -0,0 +1,106 @@
+import os
+import re
+import threading
+from dotenv import load_dotenv
+from utils.parquet_snapshot_store import snapshot_store
+
+try:
+    import duckdb
+except ImportError:
+    # Optional: only needed when METRICS_ENGINE=duckdb
+    duckdb = None
+
+# Load environment variables from .env
+load_dotenv()
+
+# Engine the dashboard metrics run on: 'postgres' (the rollup tables) or
+# 'duckdb' (computed in process from the Parquet snapshots)
+METRICS_ENGINE = os.getenv("METRICS_ENGINE", "postgres").lower()
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", 4))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "1GB")
+
+# Postgres -> DuckDB rewrites for the metric SQL. DuckDB's NUMERIC is
+# DECIMAL(18,3), which would round rates and amounts; the snapshots store
+# numbers as float64, so DOUBLE loses nothing. Snapshot views are unqualified.
+DUCKDB_DIALECT = [
+    ("::numeric", "::double"),
+    ("public.", ""),
+]
+
+
+def use_duckdb(engine=None):
+    """Whether metrics should run on DuckDB (engine, default METRICS_ENGINE)."""
+    return (engine or METRICS_ENGINE) == "duckdb" and duckdb is not None
+
+
+def duckdb_sql(query):
+    """Postgres-dialect metric SQL rewritten for DuckDB (see DUCKDB_DIALECT)."""
+    for postgres, replacement in DUCKDB_DIALECT:
+        query = query.replace(postgres, replacement)
+    return query
+
+
+def duckdb_where_clause(where_sql):
+    """crud.where_clause_params SQL with :name binds turned into DuckDB's $name."""
+    return re.sub(r"(?<!:):(\w+)", r"$\1", where_sql)
+
+
+class DuckDBEngine:
+    """
+    In-process DuckDB over the Parquet snapshots of the synced Zakya tables.
+
+    Analytical queries run here instead of on the shared Postgres, so wide
+    aggregations neither compete with invoice writes nor pay for moving
+    every row over the network. Each query registers the live snapshot of
+    the tables it names (refreshed first when stale, see
+    utils.parquet_snapshot_store) as views, and DuckDB scans only the
+    columns and row groups it needs.
+
+    One in-memory database is shared; every query runs on its own cursor,
+    so Streamlit sessions can query concurrently.
+    """
+
+    def __init__(self, store=snapshot_store, threads=DUCKDB_THREADS, memory_limit=DUCKDB_MEMORY_LIMIT):
+        self.store = store
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self._database = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed; pip install duckdb or set METRICS_ENGINE=postgres")
+        with self._lock:
+            if self._database is None:
+                self._database = duckdb.connect(config={
+                    'threads': self.threads,
+                    'memory_limit': self.memory_limit,
+                })
+            return self._database.cursor()
+
+    def query(self, query, tables, params=None):
+        """
+        Run query over the snapshots of tables.
+
+        Args:
+            query (str): DuckDB SQL referring to the tables by their bare names
+            tables (list): Snapshot tables the query reads
+            params (dict): $name parameters
+
+        Returns:
+            DataFrame: Query result
+
+        Raises:
+            Exception: When a snapshot cannot be built or the query fails;
+            callers fall back to Postgres.
+        """
+        cursor = self._connect()
+        try:
+            for table_name in tables:
+                cursor.register(table_name, self.store.dataset(table_name))
+            return cursor.execute(query, params or {}).df()
+        finally:
+            cursor.close()
+
+
+duckdb_engine = DuckDBEngine()
@@ -0,0 +1,443 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+from dotenv import load_dotenv
+from sqlalchemy import inspect, types as sqltypes
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+
+# Load environment variables from .env
+load_dotenv()
+
+PARQUET_SNAPSHOT_DIR = os.getenv("PARQUET_SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+# Seconds a snapshot is trusted without a local write to its table. Syncs in
+# this process refresh snapshots as they write; the age only bounds staleness
+# from writes made by other processes (other app instances, cron syncs), so an
+# older snapshot is still served while a fresh one is built in the background.
+PARQUET_SNAPSHOT_MAX_AGE = int(os.getenv("PARQUET_SNAPSHOT_MAX_AGE", 900))
+PARQUET_SNAPSHOT_CHUNK_SIZE = int(os.getenv("PARQUET_SNAPSHOT_CHUNK_SIZE", 50000))
+
+# Table -> date column ('YYYY-MM-DD') whose month partitions the snapshot, or None
+SNAPSHOT_TABLES = {
+    'zakya_products': None,
+    'zakya_contacts': None,
+    'zakya_sales_order': 'date',
+    'zakya_invoices': 'date',
+    'zakya_salesorder_line_item_mapping': None,
+    'zakya_invoice_line_item_mapping': None,
+    'zakya_salesorder_invoice_mapping': None,
+}
+
+MONTH_COLUMN = 'snapshot_month'
+UNKNOWN_MONTH = 'unknown'
+MONTH_PARTITIONING = ds.partitioning(pa.schema([(MONTH_COLUMN, pa.string())]), flavor="hive")
+
+
+def arrow_type(column_type):
+    """Arrow type for a SQLAlchemy column type; anything unrecognised is stored as text."""
+    if isinstance(column_type, sqltypes.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, sqltypes.Integer):
+        return pa.int64()
+    if isinstance(column_type, (sqltypes.Float, sqltypes.Numeric)):
+        return pa.float64()
+    if isinstance(column_type, sqltypes.DateTime):
+        return pa.timestamp('us', tz='UTC' if column_type.timezone else None)
+    if isinstance(column_type, sqltypes.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def as_text(value):
+    """Text form of a cell for a string column (JSON for dicts and lists), keeping nulls."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def filter_expression(filters, schema, month_column=None):
+    """
+    pyarrow expression for {column: {'op', 'value'}} filters (the crud.read_table format).
+
+    Values compared with a text column are compared as text, so date
+    objects match 'YYYY-MM-DD' strings. Filters on month_column (the
+    partitioning date column) also restrict snapshot_month, so whole
+    month partitions are skipped without being opened.
+    """
+    expression = None
+
+    def combine(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    for column, condition in (filters or {}).items():
+        operator, value = condition.get("op"), condition.get("value")
+        field = pc.field(column)
+        if schema.field(column).type == pa.string():
+            value = [as_text(v) for v in value] if isinstance(value, (list, tuple, set)) else as_text(value)
+
+        if operator == "eq":
+            combine(field == value)
+        elif operator == "neq":
+            combine(field != value)
+        elif operator == "gt":
+            combine(field > value)
+        elif operator == "lt":
+            combine(field < value)
+        elif operator == "gte":
+            combine(field >= value)
+        elif operator == "lte":
+            combine(field <= value)
+        elif operator == "in":
+            combine(field.isin(list(value)))
+        elif operator == "between":
+            combine((field >= value[0]) & (field <= value[1]))
+        elif operator == "like":
+            combine(pc.match_like(field, value))
+        else:
+            raise ValueError(f"Invalid operator '{operator}' for column '{column}'")
+
+        if column == month_column:
+            month = pc.field(MONTH_COLUMN)
+            months = [str(v)[:7] for v in value] if isinstance(value, (list, tuple, set)) else str(value)[:7]
+            if operator == "eq":
+                combine(month == months)
+            elif operator == "in":
+                combine(month.isin(months))
+            elif operator == "between":
+                combine((month >= months[0]) & (month <= months[1]))
+            elif operator in ("gt", "gte"):
+                combine(month >= months)
+            elif operator in ("lt", "lte"):
+                combine(month <= months)
+
+    return expression
+
+
+class ParquetSnapshotStore:
+    """
+    Columnar Parquet copies of the synced Zakya tables on local disk.
+
+    Each table lives under <root>/<table>/<version>/, with a CURRENT file
+    naming the live version; writers build a new version and swap CURRENT,
+    so readers never see a half-written snapshot. Tables with a date column
+    are partitioned by month, and an incremental sync rewrites only the
+    months it touched (unchanged partitions are hard-linked, not copied).
+    Reads memory-map the files and push column projection and filters down
+    to the Parquet scan.
+
+    A crud write to a table marks its snapshot stale; the next read
+    rebuilds it. Snapshots older than max_age are rebuilt in a background
+    thread, and read as they are until the new version is live.
+    """
+
+    def __init__(self, crud_client, root=PARQUET_SNAPSHOT_DIR, tables=None, max_age=PARQUET_SNAPSHOT_MAX_AGE,
+                 chunk_size=PARQUET_SNAPSHOT_CHUNK_SIZE):
+        self.crud = crud_client
+        self.root = root
+        self.tables = dict(SNAPSHOT_TABLES if tables is None else tables)
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._table_locks = {}
+        self._refreshing = set()
+        crud_client.add_write_listener(self.mark_stale)
+
+    def mark_stale(self, table_name):
+        if table_name in self.tables:
+            with self._lock:
+                self._stale.add(table_name)
+
+    def _table_lock(self, table_name):
+        with self._lock:
+            return self._table_locks.setdefault(table_name, threading.Lock())
+
+    def _current(self, table_name):
+        """(version directory, metadata dict) of the live snapshot, or (None, None)."""
+        try:
+            with open(os.path.join(self.root, table_name, "CURRENT")) as current_file:
+                version = current_file.read().strip()
+            version_dir = os.path.join(self.root, table_name, version)
+            with open(os.path.join(version_dir, "_snapshot.json")) as metadata_file:
+                return version_dir, json.load(metadata_file)
+        except (OSError, ValueError):
+            return None, None
+
+    def is_fresh(self, table_name):
+        _, metadata = self._current(table_name)
+        with self._lock:
+            stale = table_name in self._stale
+        return metadata is not None and not stale and time.time() - metadata['written_at'] < self.max_age
+
+    def _schema(self, connection, table_name):
+        columns = inspect(connection).get_columns(table_name, schema="public")
+        fields = [pa.field(col['name'], arrow_type(col['type'])) for col in columns]
+        if self.tables.get(table_name):
+            fields.append(pa.field(MONTH_COLUMN, pa.string()))
+        return pa.schema(fields)
+
+    def _month_sql(self, date_column):
+        """SQL for a row's snapshot month: 'YYYY-MM' of date_column, or UNKNOWN_MONTH."""
+        return f"COALESCE(NULLIF(LEFT({self.crud.quote_identifier(date_column)}::text, 7), ''), '{UNKNOWN_MONTH}')"
+
+    def record_months(self, table_name, id_column, ids):
+        """
+        Snapshot months the given records are in now, according to Postgres.
+
+        Call before an upsert: a record whose date moves to another month
+        has to have its old month rewritten as well, or the old copy stays
+        in that partition.
+
+        Returns:
+            set: 'YYYY-MM' months (empty for tables that are not month-partitioned)
+        """
+        date_column = self.tables.get(table_name)
+        ids = list({str(record_id) for record_id in ids if record_id is not None})
+        if not date_column or not ids:
+            return set()
+        with self.crud.engine.connect() as connection:
+            if not inspect(connection).has_table(table_name, schema="public"):
+                return set()
+            rows = connection.execute(text(f"""
+                SELECT DISTINCT {self._month_sql(date_column)}
+                FROM public.{table_name}
+                WHERE {self.crud.quote_identifier(id_column)}::text = ANY(:ids)
+            """), {"ids": ids})
+            return {row[0] for row in rows}
+
+    def _record_batches(self, connection, table_name, schema, months=None):
+        """Stream the table (or the given months of it) out of Postgres as Arrow record batches."""
+        date_column = self.tables.get(table_name)
+        select = f"SELECT * FROM public.{table_name}"
+        params = {}
+        if date_column:
+            month_sql = self._month_sql(date_column)
+            select = f"SELECT *, {month_sql} AS {MONTH_COLUMN} FROM public.{table_name}"
+            if months is not None:
+                select += f" WHERE {month_sql} = ANY(:months)"
+                params["months"] = list(months)
+
+        streaming = connection.execution_options(stream_results=True)
+        for chunk in pd.read_sql(text(select), streaming, params=params, chunksize=self.chunk_size):
+            try:
+                batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                for field in schema:
+                    if field.type == pa.string():
+                        chunk[field.name] = chunk[field.name].map(as_text)
+                batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            yield batch
+
+    def write_snapshot(self, table_name, months=None):
+        """
+        Export table_name from Postgres to a new snapshot version.
+
+        Args:
+            table_name (str): One of the store's tables
+            months (iterable): 'YYYY-MM' partitions to rewrite (month-
+                partitioned tables only); the others are carried over from
+                the current version. None rewrites the whole table.
+
+        Returns:
+            str: Status message
+        """
+        date_column = self.tables[table_name]
+        if months is not None and not months:
+            return f"No months to rewrite in the {table_name} snapshot."
+        with self._table_lock(table_name):
+            current_dir, current_metadata = self._current(table_name)
+            if not date_column or current_dir is None:
+                months = None
+            # Clear first, so a write landing during the export marks it stale again
+            with self._lock:
+                self._stale.discard(table_name)
+
+            version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            version_dir = os.path.join(self.root, table_name, version)
+            os.makedirs(version_dir)
+            try:
+                with self.crud.engine.connect() as connection:
+                    if not inspect(connection).has_table(table_name, schema="public"):
+                        shutil.rmtree(version_dir)
+                        return f"{table_name} does not exist, no snapshot written."
+                    schema = self._schema(connection, table_name)
+                    # Partitions carried over must share the new schema (upserts add columns)
+                    if months is not None and current_metadata.get('columns') != schema.names:
+                        months = None
+
+                    if months is not None:
+                        months = {str(month) for month in months}
+                        self._link_partitions(current_dir, version_dir, skip=months)
+
+                    ds.write_dataset(
+                        self._record_batches(connection, table_name, schema, months),
+                        version_dir,
+                        schema=schema,
+                        format="parquet",
+                        partitioning=MONTH_PARTITIONING if date_column else None,
+                        basename_template=f"part-{version}-{{i}}.parquet",
+                        existing_data_behavior="overwrite_or_ignore",
+                        max_rows_per_group=self.chunk_size,
+                    )
+
+                row_count = ds.dataset(version_dir, format="parquet", partitioning=MONTH_PARTITIONING).count_rows()
+                with open(os.path.join(version_dir, "_snapshot.json"), "w") as metadata_file:
+                    json.dump({
+                        'table': table_name,
+                        'rows': row_count,
+                        'columns': schema.names,
+                        'written_at': time.time(),
+                        'months_rewritten': sorted(months) if months is not None else None,
+                    }, metadata_file)
+
+                pointer = os.path.join(self.root, table_name, f"CURRENT.{version}")
+                with open(pointer, "w") as pointer_file:
+                    pointer_file.write(version)
+                os.replace(pointer, os.path.join(self.root, table_name, "CURRENT"))
+            except Exception:
+                shutil.rmtree(version_dir, ignore_errors=True)
+                with self._lock:
+                    self._stale.add(table_name)
+                raise
+
+            self._remove_old_versions(table_name, keep={version, os.path.basename(current_dir or "")})
+
+        scope = "all months" if months is None else f"{len(months)} months"
+        return f"Wrote {table_name} snapshot ({scope}): {row_count} rows."
+
+    @staticmethod
+    def _link_partitions(current_dir, version_dir, skip):
+        """Hard-link the month partitions of the current version that are not being rewritten."""
+        for entry in os.listdir(current_dir):
+            if not entry.startswith(f"{MONTH_COLUMN}=") or entry.split("=", 1)[1] in skip:
+                continue
+            os.makedirs(os.path.join(version_dir, entry))
+            for file_name in os.listdir(os.path.join(current_dir, entry)):
+                source = os.path.join(current_dir, entry, file_name)
+                target = os.path.join(version_dir, entry, file_name)
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target)
+
+    def _remove_old_versions(self, table_name, keep):
+        """Delete versions other than keep; the previous one stays for readers still scanning it."""
+        table_dir = os.path.join(self.root, table_name)
+        for entry in os.listdir(table_dir):
+            path = os.path.join(table_dir, entry)
+            if entry not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def refresh(self, table_name, months=None):
+        """write_snapshot for a store table, logging instead of raising; other tables are ignored."""
+        if table_name not in self.tables:
+            return None
+        try:
+            message = self.write_snapshot(table_name, months)
+        except Exception as e:
+            message = f"Error writing {table_name} snapshot: {e}"
+            logger.error(message)
+            return message
+        logger.info(message)
+        return message
+
+    def _refresh_in_background(self, table_name):
+        """Start one refresh thread for table_name, unless one is already running."""
+        with self._lock:
+            if table_name in self._refreshing:
+                return
+            self._refreshing.add(table_name)
+
+        def run():
+            try:
+                self.refresh(table_name)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(table_name)
+
+        threading.Thread(target=run, name=f"snapshot-{table_name}", daemon=True).start()
+
+    def dataset(self, table_name):
+        """
+        The live snapshot of table_name as a pyarrow Dataset.
+
+        Built first when missing or stale from a write in this process.
+        When it is only older than max_age it is returned as it is and
+        rebuilt in the background, so a page load does not wait on a full
+        export. For engines that scan the files themselves (e.g.
+        utils.duckdb_engine); month-partitioned tables carry an extra
+        snapshot_month column.
+        """
+        version_dir, metadata = self._current(table_name)
+        with self._lock:
+            stale = table_name in self._stale
+        if metadata is None or stale:
+            logger.info(self.write_snapshot(table_name))
+            version_dir, _ = self._current(table_name)
+        elif time.time() - metadata['written_at'] >= self.max_age:
+            self._refresh_in_background(table_name)
+        return ds.dataset(version_dir, format="parquet", partitioning=MONTH_PARTITIONING, filesystem=self.filesystem)
+
+    def read(self, table_name, columns=None, filters=None):
+        """
+        Read a snapshot into a DataFrame (built or refreshed as for dataset).
+
+        Only the requested columns are read from disk, and filters are
+        evaluated by the Parquet scan (row groups and month partitions that
+        cannot match are skipped). Falls back to crud.read_table when the
+        snapshot cannot be written or read.
+
+        Args:
+            table_name (str): One of the store's tables
+            columns (list): Columns to load (default: all); unknown columns are left out
+            filters (dict): {column: {'op': operator, 'value': value}} as for crud.read_table
+
+        Returns:
+            DataFrame, or crud's error string from the fallback
+        """
+        try:
+            dataset = self.dataset(table_name)
+            available = [name for name in dataset.schema.names if name != MONTH_COLUMN]
+            selected = available if columns is None else [col for col in columns if col in available]
+            table = dataset.to_table(
+                columns=selected,
+                filter=filter_expression(filters, dataset.schema, self.tables.get(table_name))
+            )
+            return table.to_pandas()
+        except Exception as e:
+            logger.error(f"Error reading {table_name} snapshot, reading Postgres instead: {e}")
+            return self.crud.read_table(table_name, columns=columns, filters=filters)
+
+    def status(self):
+        """
+        One row per table: rows, age in seconds, months rewritten by the last write and whether it is fresh.
+        """
+        rows = []
+        for table_name in self.tables:
+            _, metadata = self._current(table_name)
+            rows.append({
+                'table': table_name,
+                'rows': metadata['rows'] if metadata else None,
+                'age_seconds': round(time.time() - metadata['written_at'], 1) if metadata else None,
+                'months_rewritten': metadata.get('months_rewritten') if metadata else None,
+                'fresh': self.is_fresh(table_name),
+            })
+        return pd.DataFrame(rows)
+
+
+snapshot_store = ParquetSnapshotStore(crud)
@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.logger import logger
+
+# Load environment variables from .env
+load_dotenv()
+
+# Write every stage report to PIPELINE_METRICS_TABLE for trending
+PIPELINE_METRICS_ENABLED = os.getenv("PIPELINE_METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+PIPELINE_METRICS_TABLE = os.getenv("PIPELINE_METRICS_TABLE", "invoice_pipeline_stage_metrics")
+
+# The stage counters of the code running right now. Context variables follow
+# asyncio tasks, asyncio.run and asyncio.to_thread, so work a stage starts is
+# attributed to it; plain thread pools must submit through copy_context().run.
+_current_stage = contextvars.ContextVar("pipeline_stage", default=None)
+
+
+class StageMetrics:
+    """Counters for one pipeline stage; updated from several threads at once."""
+
+    def __init__(self, name, profiler, parent=None):
+        self.name = name
+        self.profiler = profiler
+        self.parent = parent
+        self.wall_seconds = 0.0
+        self.db_queries = 0
+        self.db_rows = 0
+        self.http_calls = 0
+        self.http_bytes = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for counter, value in counts.items():
+                setattr(self, counter, getattr(self, counter) + value)
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "parent": self.parent,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "db_queries": self.db_queries,
+            "db_rows": self.db_rows,
+            "http_calls": self.http_calls,
+            "http_bytes": self.http_bytes,
+            "error": self.error,
+        }
+
+
+class PipelineProfiler:
+    """
+    Per-stage wall time, DB queries/rows and Zakya HTTP calls/bytes for one pipeline run.
+
+    Usage:
+        profiler = PipelineProfiler('aza_invoice')
+        with profiler.stage('find_existing_products'):
+            ...
+        profiler.report()
+
+    Counts go to the innermost open stage only; an outer stage's wall time
+    includes its sub-stages (see profile_stage).
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        parent = _current_stage.get()
+        metrics = StageMetrics(name, self, parent.name if parent is not None else None)
+        self.stages.append(metrics)
+        token = _current_stage.set(metrics)
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except Exception as e:
+            metrics.error = str(e)
+            raise
+        finally:
+            metrics.wall_seconds = time.perf_counter() - start
+            _current_stage.reset(token)
+
+    def report(self):
+        """
+        Returns:
+            DataFrame: One row per stage, in the order the stages started
+        """
+        report = pd.DataFrame(
+            [metrics.as_dict() for metrics in self.stages],
+            columns=["stage", "parent", "wall_seconds", "db_queries", "db_rows", "http_calls", "http_bytes", "error"]
+        )
+        report.insert(0, "pipeline", self.pipeline)
+        report.insert(0, "run_id", self.run_id)
+        return report
+
+    def save(self, crud_client):
+        """Append this run's stage rows to PIPELINE_METRICS_TABLE."""
+        report = self.report()
+        report.insert(2, "started_at", self.started_at.isoformat())
+        return crud_client.upsert(PIPELINE_METRICS_TABLE, report, ["run_id", "stage"])
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Open a sub-stage in the profiler of the current stage, if there is one.
+
+    Lets shared code (e.g. the mapping syncs) show up separately in a report
+    without knowing which pipeline called it; outside a profiled run it does nothing.
+    """
+    current = _current_stage.get()
+    if current is None:
+        yield None
+        return
+    with current.profiler.stage(name) as metrics:
+        yield metrics
+
+
+def record_http_call(response_bytes):
+    """Count one Zakya HTTP response against the current stage."""
+    current = _current_stage.get()
+    if current is not None:
+        current.add(http_calls=1, http_bytes=response_bytes or 0)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    current = _current_stage.get()
+    if current is not None:
+        # rowcount is the number of rows a SELECT returned (psycopg2 buffers them)
+        returned_rows = cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0
+        current.add(db_queries=1, db_rows=returned_rows)
+
+
+def save_stage_report(profiler, crud_client):
+    """Write the profiler's report when PIPELINE_METRICS_ENABLED is set; never raises."""
+    if not PIPELINE_METRICS_ENABLED:
+        return
+    try:
+        logger.info(profiler.save(crud_client))
+    except Exception as e:
+        logger.error(f"Error saving pipeline metrics: {e}")
@@ -1,7 +1,16 @@
 import pandas as pd
-from sqlalchemy import create_engine
+import numpy as np
+from sqlalchemy import create_engine, inspect, Integer
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
 from sqlalchemy.sql import text
 import os
+import io
+import time
+import asyncio
+import threading
+from functools import lru_cache
 import json
 import bcrypt
 from dotenv import load_dotenv
@@ -14,39 +23,571 @@ load_dotenv()
 
 POSTGRES_URI = os.getenv("POSTGRES_SESSION_POOL_URI")
 
+# Connection pool settings. The crud singleton is shared by every Streamlit
+# session and by the asyncio.to_thread workers, so pool_size + max_overflow
+# bounds the number of connections one app process opens on the pooler.
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", 5))
+POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", 10))
+POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", 30))
+# The Supabase pooler drops idle client connections; recycle before it does
+POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", 300))
+POSTGRES_POOL_PRE_PING = os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+POSTGRES_POOL_USE_LIFO = os.getenv("POSTGRES_POOL_USE_LIFO", "true").lower() in ("1", "true", "yes")
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv("POSTGRES_CONNECT_TIMEOUT", 10))
+POSTGRES_ASYNC_ENGINE = os.getenv("POSTGRES_ASYNC_ENGINE", "false").lower() in ("1", "true", "yes")
+# Seconds before read_table looks again for requested columns a table did not have
+COLUMN_CACHE_RECHECK_SECONDS = float(os.getenv("COLUMN_CACHE_RECHECK_SECONDS", 60))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long callers wait for a connection.
+
+    The time covers waiting for a free slot plus opening a new connection
+    when the pool grows into overflow; checkouts that hit pool_timeout are
+    counted separately.
+    """
+
+    def __init__(self, *args, max_overflow=10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        # Configured limit, kept for pool_status (QueuePool only has it privately)
+        self.max_overflow = max_overflow
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+
+def pool_engine_kwargs():
+    """create_engine keyword arguments built from the POSTGRES_POOL_* settings."""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": POSTGRES_POOL_SIZE,
+        "max_overflow": POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": POSTGRES_POOL_RECYCLE,
+        "pool_pre_ping": POSTGRES_POOL_PRE_PING,
+        "pool_use_lifo": POSTGRES_POOL_USE_LIFO,
+        "connect_args": {"connect_timeout": POSTGRES_CONNECT_TIMEOUT},
+    }
+
+
 class PostgresCRUD:
-    def __init__(self):
-        self.engine = create_engine(POSTGRES_URI)
-        
+    def __init__(self, uri=None, **engine_kwargs):
+        self.uri = uri or POSTGRES_URI
+        self.engine = create_engine(self.uri, **{**pool_engine_kwargs(), **engine_kwargs})
+        self._async_engine = None
+        self._write_listeners = []
+        # Table name -> (column names, monotonic read time), for read_table's column projection
+        self._column_cache = {}
+
+    def add_write_listener(self, listener):
+        """Register listener(table_name), called after every successful write through this client."""
+        self._write_listeners.append(listener)
+
+    def notify_write(self, table_name):
+        """Tell write listeners (e.g. the reference data cache) that table_name changed."""
+        table_name = table_name.split(".")[-1]
+        self._column_cache.pop(table_name, None)
+        for listener in self._write_listeners:
+            try:
+                listener(table_name)
+            except Exception as e:
+                print(f"Write listener failed for '{table_name}': {e}")
+
+    def pool_status(self):
+        """
+        Snapshot of the connection pool for monitoring.
 
-    def create_table(self, table_name, dataframe):
-        """Create a table in PostgreSQL from a pandas DataFrame."""
+        Returns:
+            dict: pool size, checked in/out and overflow connections, plus
+            checkout count, timeouts and total/average/max wait in seconds
+        """
+        pool = self.engine.pool
+        status = {"pool": pool.status()}
+        if isinstance(pool, QueuePool):
+            status.update({
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        if isinstance(pool, TimedQueuePool):
+            with pool._stats_lock:
+                status.update({
+                    "max_overflow": pool.max_overflow,
+                    "checkouts": pool.checkouts,
+                    "timeouts": pool.timeouts,
+                    "total_wait_seconds": round(pool.total_wait, 4),
+                    "avg_wait_seconds": round(pool.total_wait / pool.checkouts, 4) if pool.checkouts else 0.0,
+                    "max_wait_seconds": round(pool.max_wait, 4),
+                })
+        return status
+
+    @property
+    def async_engine(self):
+        """
+        Lazily created psycopg (v3) AsyncEngine for the async invoice code.
+
+        Needs the optional psycopg and greenlet packages
+        (pip install "psycopg[binary]" "sqlalchemy[asyncio]"). Uses NullPool: connection pooling is
+        done by the Supabase pooler, and every invoice run (and every
+        Streamlit action) gets its own asyncio.run loop, which pooled async
+        connections cannot outlive. prepare_threshold=None because the transaction
+        pooler cannot keep server-side prepared statements.
+        """
+        if self._async_engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            url = make_url(self.uri).set(drivername="postgresql+psycopg")
+            self._async_engine = create_async_engine(
+                url,
+                poolclass=NullPool,
+                connect_args={"prepare_threshold": None, "connect_timeout": POSTGRES_CONNECT_TIMEOUT},
+            )
+        return self._async_engine
+
+    async def fetch_where_async(self, model: BaseModel, filters: dict, query: str) -> list:
+        """
+        Async fetch_where for the async invoice code paths.
+
+        Runs on the psycopg async engine when POSTGRES_ASYNC_ENGINE is set,
+        otherwise runs the sync fetch_where in a worker thread.
+        """
+        if not POSTGRES_ASYNC_ENGINE:
+            return await asyncio.to_thread(self.fetch_where, model, filters, query)
+        where_sql, params = self.build_where_clause_params(model, filters)
+        statement = prepare_statement(query, where_sql)
+        async with self.async_engine.connect() as connection:
+            result = await connection.execute(statement, params)
+            return [dict(row) for row in result.mappings()]
+
+
+    @staticmethod
+    def serialize_json_columns(dataframe):
+        """
+        Dump dict/list cells to JSON strings so they can be stored as text.
+
+        Each object column is type-checked in a single pass and only the
+        dict/list cells are serialised; NULLs and scalars are left as they
+        are. Returns a new DataFrame when anything changed.
+        """
+        serialized = {}
         for col in dataframe.columns:
-                if dataframe[col].apply(lambda x: isinstance(x, (dict,list))).any():
-                    dataframe[col] = dataframe[col].apply(json.dumps) 
+            if dataframe[col].dtype != object:
+                continue
+            values = dataframe[col].to_numpy()
+            is_json = np.fromiter((type(value) in (dict, list) for value in values), dtype=bool, count=len(values))
+            if is_json.any():
+                values = values.copy()
+                values[is_json] = [json.dumps(value) for value in values[is_json]]
+                serialized[col] = values
+
+        if not serialized:
+            return dataframe
+        dataframe = dataframe.copy(deep=False)
+        for col, values in serialized.items():
+            dataframe[col] = values
+        return dataframe
+
+    @staticmethod
+    def replace_table_schema(connection, table_name, dataframe):
+        """Drop the table and recreate it empty, with the column types to_sql would pick."""
+        connection.execute(text(f"DROP TABLE IF EXISTS public.{table_name}"))
+        connection.execute(text(pd.io.sql.get_schema(dataframe, table_name, con=connection, schema="public")))
+
+    def create_table(self, table_name, dataframe):
+        """
+        Create a table in PostgreSQL from a pandas DataFrame.
+
+        The table is recreated from the DataFrame's schema and the rows are
+        streamed in with COPY, in one transaction.
+        """
+        dataframe = self.serialize_json_columns(dataframe)
 
         print(f"dataframe is : {dataframe.columns}")        
         try:
-            dataframe.to_sql(table_name, con=self.engine, schema="public" ,if_exists='replace', index=False)
+            with self.engine.begin() as connection:
+                self.replace_table_schema(connection, table_name, dataframe)
+                self.copy_dataframe(connection, f"public.{table_name}", dataframe)
         except Exception as e:
             return f"Error creating table '{table_name}': {e}"
         
+        self.notify_write(table_name)
         return f"Table '{table_name}' created successfully."
 
-    def read_table(self, table_name):
-        """Read a table from PostgreSQL into a pandas DataFrame."""
+    def create_table_from_chunks(self, table_name, chunks):
+        """
+        Create a table in PostgreSQL from an iterable of DataFrame chunks.
+
+        The first chunk replaces the table and the rest are appended, all in
+        one transaction, so readers keep seeing the old table until the last
+        chunk is written. Columns that first appear in a later chunk are added
+        as TEXT. Only one chunk is held in memory at a time.
+        """
+        total_rows = 0
+        columns = None
+        try:
+            with self.engine.begin() as connection:
+                for chunk in chunks:
+                    if chunk.empty:
+                        continue
+                    chunk = self.serialize_json_columns(chunk)
+
+                    if columns is None:
+                        self.replace_table_schema(connection, table_name, chunk)
+                        columns = set(chunk.columns)
+                    else:
+                        self.add_missing_columns(connection, table_name, chunk.columns, columns)
+                        chunk = self.align_integer_columns(connection, table_name, chunk)
+                    self.copy_dataframe(connection, f"public.{table_name}", chunk)
+
+                    total_rows += len(chunk)
+        except Exception as e:
+            return f"Error creating table '{table_name}': {e}"
+
+        self.notify_write(table_name)
+        return f"Table '{table_name}' created successfully with {total_rows} rows."
+
+    @staticmethod
+    def align_integer_columns(connection, table_name, dataframe):
+        """
+        Fit float columns of a later chunk to integer columns of the table.
+
+        The table's types come from the first chunk, so a column can be
+        BIGINT while a later chunk holds floats. Whole-number floats (pandas
+        turns an integer column into floats once it holds a NaN) are cast to
+        nullable Int64, since COPY rejects "1.0" for a bigint column. If any
+        value has a fraction, the table column is widened to DOUBLE
+        PRECISION (what the first chunk would have produced) instead.
+        """
+        float_columns = [col for col in dataframe.columns if pd.api.types.is_float_dtype(dataframe[col])]
+        if not float_columns:
+            return dataframe
+
+        integer_columns = {
+            col['name'] for col in inspect(connection).get_columns(table_name, schema="public")
+            if isinstance(col['type'], Integer)
+        }
+        to_cast = []
+        for col in float_columns:
+            if col not in integer_columns:
+                continue
+            values = dataframe[col].dropna()
+            if (values == np.floor(values)).all():
+                to_cast.append(col)
+            else:
+                connection.execute(text(
+                    f'ALTER TABLE public.{table_name} ALTER COLUMN "{col}" TYPE DOUBLE PRECISION'
+                ))
+        if not to_cast:
+            return dataframe
+        return dataframe.astype({col: 'Int64' for col in to_cast})
+
+    @staticmethod
+    def add_missing_columns(connection, table_name, columns, existing_columns):
+        """Add any of columns not in existing_columns to the table as TEXT."""
+        for col in columns:
+            if col not in existing_columns:
+                connection.execute(text(f'ALTER TABLE public.{table_name} ADD COLUMN "{col}" TEXT'))
+                existing_columns.add(col)
+
+    @staticmethod
+    def copy_dataframe(connection, table_name, dataframe):
+        """
+        Bulk load a DataFrame into an existing table with COPY FROM STDIN.
+
+        connection is a SQLAlchemy connection inside a transaction; the rows
+        are only visible once that transaction commits.
+        """
+        buffer = io.StringIO()
+        dataframe.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+
+        columns = ", ".join(f'"{col}"' for col in dataframe.columns)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def ensure_unique_key(connection, table_name, key_columns):
+        """
+        Make sure a unique index on key_columns exists so ON CONFLICT can use it.
+
+        Tables written by create_table have no constraints, so the first
+        upsert removes duplicate keys (keeping the newest physical row) and
+        creates the index.
+        """
+        for index in inspect(connection).get_indexes(table_name, schema="public"):
+            if index.get('unique') and list(index['column_names']) == list(key_columns):
+                return
+
+        key_list = ", ".join(f'"{col}"' for col in key_columns)
+        # One window pass (sort or hash by key) rather than a self-join, which
+        # can only run as a nested loop on ctid and is quadratic in the table size
+        connection.execute(text(f"""
+            DELETE FROM public.{table_name}
+            WHERE ctid IN (
+                SELECT ctid FROM (
+                    SELECT ctid, row_number() OVER (PARTITION BY {key_list} ORDER BY ctid DESC) AS rn
+                    FROM public.{table_name}
+                ) ranked
+                WHERE rn > 1
+            )
+        """))
+        index_name = f"{table_name}_{'_'.join(key_columns)}_key"[:63]
+        connection.execute(text(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" ON public.{table_name} ({key_list})'
+        ))
+
+    def upsert(self, table_name, dataframe, key_columns):
+        """
+        Insert or update rows of a PostgreSQL table by key.
+
+        The rows are COPY'd into a temporary table and merged with
+        INSERT ... ON CONFLICT (key_columns) DO UPDATE, in one transaction.
+        The table is created if it does not exist; columns it does not have
+        yet are added as TEXT. dict/list columns are stored as JSON strings,
+        as create_table does.
+
+        Args:
+            table_name (str): Table to write to
+            dataframe (DataFrame): Rows to write
+            key_columns (list): Columns identifying a row
+
+        Returns:
+            str: Status message, as create_table
+        """
+        dataframe = dataframe.dropna(subset=key_columns).drop_duplicates(subset=key_columns, keep='last')
+        if dataframe.empty:
+            return f"No rows to upsert into '{table_name}'."
+
+        dataframe = self.serialize_json_columns(dataframe)
+        staging_table = f"_upsert_{table_name}"[:63]
+        try:
+            with self.engine.begin() as connection:
+                if not inspect(connection).has_table(table_name, schema="public"):
+                    self.replace_table_schema(connection, table_name, dataframe)
+
+                existing_columns = {
+                    col['name'] for col in inspect(connection).get_columns(table_name, schema="public")
+                }
+                self.add_missing_columns(connection, table_name, dataframe.columns, existing_columns)
+                self.ensure_unique_key(connection, table_name, key_columns)
+                dataframe = self.align_integer_columns(connection, table_name, dataframe)
+
+                connection.execute(text(
+                    f"CREATE TEMP TABLE {staging_table} (LIKE public.{table_name}) ON COMMIT DROP"
+                ))
+                self.copy_dataframe(connection, staging_table, dataframe)
+
+                columns = ", ".join(f'"{col}"' for col in dataframe.columns)
+                key_list = ", ".join(f'"{col}"' for col in key_columns)
+                updates = ", ".join(
+                    f'"{col}" = EXCLUDED."{col}"' for col in dataframe.columns if col not in key_columns
+                )
+                conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                connection.execute(text(
+                    f"INSERT INTO public.{table_name} ({columns}) "
+                    f"SELECT {columns} FROM {staging_table} "
+                    f"ON CONFLICT ({key_list}) {conflict_action}"
+                ))
+        except Exception as e:
+            return f"Error upserting into table '{table_name}': {e}"
+
+        self.notify_write(table_name)
+        return f"Upserted {len(dataframe)} rows into '{table_name}'."
+
+    def read_table(self, table_name, columns=None, filters=None):
+        """
+        Read a table from PostgreSQL into a pandas DataFrame.
+
+        Args:
+            table_name (str): Table to read
+            columns (list): Columns to select instead of *. Requested columns
+                the table does not have are left out, so callers reading them
+                with row.get(col, default) behave as with SELECT *.
+            filters (dict): {column: {'op': operator, 'value': value}} pushed
+                down as a parameterised WHERE clause, e.g.
+                {'item_id': {'op': 'in', 'value': ids},
+                 'date': {'op': 'between', 'value': [start, end]}}
+
+        Returns:
+            DataFrame, or an error message string
+        """
         try:
-            query = f"SELECT * FROM {table_name}"
-            return pd.read_sql(query, self.engine)
+            with self.engine.connect() as connection:
+                select_list = "*"
+                if columns is not None:
+                    existing_columns = self.table_column_names(connection, table_name, columns)
+                    selected = [col for col in columns if col in existing_columns]
+                    if not selected:
+                        return pd.DataFrame(columns=list(columns))
+                    select_list = ", ".join(self.quote_identifier(col) for col in selected)
+                where_sql, params = self.where_clause_params(filters, quote_columns=True)
+                query = prepare_statement(f"SELECT {select_list} FROM {table_name} {{whereClause}}", where_sql)
+                return pd.read_sql(query, connection, params=params)
         except Exception as e:
+            # The table may have been recreated with other columns elsewhere
+            self._column_cache.pop(table_name.split(".")[-1], None)
             return f"Error reading table '{table_name}': {e}"
 
+    def table_column_names(self, connection, table_name, wanted=()):
+        """
+        Column names of table_name, cached per table.
+
+        Writes through this client drop the entry. It is also re-read when
+        any of wanted is missing, in case another process added the column,
+        but at most every COLUMN_CACHE_RECHECK_SECONDS.
+        """
+        schema, _, name = table_name.rpartition(".")
+        cached, read_at = self._column_cache.get(name, (None, 0.0))
+        if cached is None or (not set(wanted) <= cached
+                              and time.monotonic() - read_at > COLUMN_CACHE_RECHECK_SECONDS):
+            cached = {col['name'] for col in inspect(connection).get_columns(name, schema=schema or None)}
+            self._column_cache[name] = (cached, time.monotonic())
+        return cached
+
+    def page_where_clause(self, filters=None, search=None):
+        """
+        WHERE clause for read_page, count_rows and copy_csv.
+
+        search is (column, text): rows whose column, as text, contains text
+        (case-insensitive).
+
+        Returns:
+            tuple: (list of SQL conditions, params dict)
+        """
+        where_sql, params = self.where_clause_params(filters, quote_columns=True)
+        conditions = [where_sql[len("WHERE "):]] if where_sql else []
+        if search and search[1]:
+            conditions.append(f"{self.quote_identifier(search[0])}::text ILIKE :search")
+            params["search"] = f"%{search[1]}%"
+        return conditions, params
+
+    def read_page(self, table_name, sort_column, after=None, descending=False, key_column="ctid",
+                  filters=None, search=None, page_size=100):
+        """
+        Read one page of a table with keyset pagination.
+
+        Rows are ordered by sort_column (NULLs last), then key_column as a
+        tie-breaker; the default ctid works for tables without a unique key.
+        The next page starts after the cursor of the previous one instead of
+        an OFFSET, so deep pages cost the same as the first.
+
+        Args:
+            table_name (str): Table to read
+            sort_column (str): Column to order by
+            after (tuple): Cursor returned with the previous page, None for the first page
+            descending (bool): Sort direction
+            key_column (str): Unique column breaking ties in sort_column
+            filters (dict): {column: {'op': operator, 'value': value}} as for read_table
+            search (tuple): (column, text) substring filter
+            page_size (int): Rows per page
+
+        Returns:
+            tuple: (DataFrame of the page, cursor of its last row or None when it is the last page)
+        """
+        sort_sql = self.quote_identifier(sort_column)
+        key_sql = key_column if key_column == "ctid" else self.quote_identifier(key_column)
+        conditions, params = self.page_where_clause(filters, search)
+
+        if after is not None:
+            after_sort, after_key = after
+            comparison = "<" if descending else ">"
+            params["after_key"] = after_key
+            if after_sort is None:
+                conditions.append(f"{sort_sql} IS NULL AND {key_sql} {comparison} :after_key")
+            else:
+                params["after_sort"] = after_sort
+                conditions.append(
+                    f"({sort_sql} IS NULL OR ({sort_sql}, {key_sql}) {comparison} (:after_sort, :after_key))"
+                )
+
+        direction = "DESC" if descending else "ASC"
+        where_sql = "WHERE " + " AND ".join(conditions) if conditions else ""
+        query = f"""
+            SELECT *, {sort_sql}::text AS _page_sort, {key_sql}::text AS _page_key
+            FROM {table_name} {where_sql}
+            ORDER BY {sort_sql} {direction} NULLS LAST, {key_sql} {direction}
+            LIMIT :page_size
+        """
+        params["page_size"] = page_size + 1
+
+        with self.engine.connect() as connection:
+            page = pd.read_sql(text(query), connection, params=params)
+
+        next_cursor = None
+        if len(page) > page_size:
+            page = page.iloc[:page_size]
+            last_row = page.iloc[-1]
+            next_cursor = (
+                None if pd.isna(last_row["_page_sort"]) else last_row["_page_sort"],
+                last_row["_page_key"]
+            )
+        return page.drop(columns=["_page_sort", "_page_key"]), next_cursor
+
+    def count_rows(self, table_name, filters=None, search=None):
+        """Number of rows in table_name matching filters and search (see read_page)."""
+        conditions, params = self.page_where_clause(filters, search)
+        where_sql = "WHERE " + " AND ".join(conditions) if conditions else ""
+        with self.engine.connect() as connection:
+            return connection.execute(text(f"SELECT COUNT(*) FROM {table_name} {where_sql}"), params).scalar()
+
+    def copy_csv(self, table_name, output, sort_column=None, descending=False, filters=None, search=None):
+        """
+        Write the rows matching filters and search to output as CSV with a header.
+
+        Uses COPY ... TO STDOUT, so Postgres streams the rows in chunks into
+        output (any writable file object, e.g. a temporary file) without a
+        DataFrame or a CSV string of the whole result in memory.
+        """
+        conditions, params = self.page_where_clause(filters, search)
+        where_sql = "WHERE " + " AND ".join(conditions) if conditions else ""
+        order_sql = ""
+        if sort_column:
+            order_sql = f"ORDER BY {self.quote_identifier(sort_column)} {'DESC' if descending else 'ASC'} NULLS LAST"
+
+        with self.engine.connect() as connection:
+            # COPY takes no bind parameters; let the driver inline them safely
+            compiled = text(f"SELECT * FROM {table_name} {where_sql} {order_sql}").bindparams(**params).compile(
+                dialect=connection.dialect
+            )
+            cursor = connection.connection.cursor()
+            try:
+                select_sql = cursor.mogrify(compiled.string, compiled.params).decode()
+                cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv, HEADER)", output)
+            finally:
+                cursor.close()
+
     def update_table(self, table_name, set_clause, condition):
         """Update rows in a PostgreSQL table."""
         try:
             with self.engine.connect() as connection:
                 query = f"UPDATE {table_name} SET {set_clause} WHERE {condition}"
                 connection.execute(query)
+            self.notify_write(table_name)
             return f"Table '{table_name}' updated successfully."
         except Exception as e:
             return f"Error updating table '{table_name}': {e}"
@@ -57,6 +598,7 @@ class PostgresCRUD:
             with self.engine.connect() as connection:
                 query = f"DELETE FROM {table_name} WHERE {condition}"
                 connection.execute(query)
+            self.notify_write(table_name)
             return f"Rows deleted from table '{table_name}' where {condition}."
         except Exception as e:
             return f"Error deleting rows from table '{table_name}': {e}"
@@ -67,6 +609,7 @@ class PostgresCRUD:
             with self.engine.connect() as connection:
                 query = f"DROP TABLE IF EXISTS {table_name}"
                 connection.execute(query)
+            self.notify_write(table_name)
             return f"Table '{table_name}' deleted successfully."
         except Exception as e:
             return f"Error deleting table '{table_name}': {e}"
@@ -262,5 +805,102 @@ class PostgresCRUD:
         return "WHERE " + " AND ".join(clauses) if len(clauses) > 0 else clause
 
 
+    def build_where_clause_params(self, model: BaseModel, filters: dict) -> tuple:
+        """
+        Bound-parameter version of build_where_clause.
+
+        Returns (where_sql, params): where_sql only depends on the columns and
+        operators used, so the statement text is the same for every value and
+        can be cached by prepare_statement. 'in' lists are bound as a single
+        array parameter (column = ANY(:p0)).
+
+        Args:
+            model (BaseModel): Pydantic model whose fields are the valid columns
+            filters (dict): {column: {'op': operator, 'value': value}}
+
+        Returns:
+            tuple: (where_sql, params dict)
+        """
+        valid_columns = model.model_fields.keys()  # Infer table columns from Pydantic model
+        for column in filters:
+            if column not in valid_columns:
+                raise ValueError(f"Invalid column: {column}")
+        return self.where_clause_params(filters)
+
+    @staticmethod
+    def quote_identifier(name):
+        """Quote a column or table name for use in SQL."""
+        return '"' + str(name).replace('"', '""') + '"'
+
+    @staticmethod
+    def where_clause_params(filters: dict, quote_columns=False) -> tuple:
+        """
+        Build a bound-parameter WHERE clause from {column: {'op', 'value'}} filters.
+
+        'in' binds the list as one array (column = ANY(:p0)); 'between'
+        takes [from, to], e.g. a date range. Operator names are OPERATORS keys.
+
+        Returns:
+            tuple: (where_sql, params dict); where_sql is '' without filters
+        """
+        clauses = []
+        params = {}
+
+        for i, (column, condition) in enumerate((filters or {}).items()):
+            operator = condition.get("op")
+            value = condition.get("value")
+
+            if operator not in OPERATORS:
+                raise ValueError(f"Invalid operator '{operator}' for column '{column}'")
+
+            name = f"p{i}"
+            sql_column = PostgresCRUD.quote_identifier(column) if quote_columns else column
+            if operator == "in" and isinstance(value, (list, tuple, set)):
+                clauses.append(f"{sql_column} = ANY(:{name})")
+                params[name] = list(value)
+            elif operator == "between" and isinstance(value, (list, tuple)) and len(value) == 2:
+                clauses.append(f"{sql_column} BETWEEN :{name}_from AND :{name}_to")
+                params[f"{name}_from"], params[f"{name}_to"] = value
+            else:
+                clauses.append(f"{sql_column} {OPERATORS[operator]} :{name}")
+                params[name] = value
+
+        where_sql = "WHERE " + " AND ".join(clauses) if clauses else ""
+        return where_sql, params
+
+    def fetch_where(self, model: BaseModel, filters: dict, query: str) -> list:
+        """
+        Run a {whereClause} query template with bound parameters.
+
+        Drop-in for the format + execute_query pattern: returns the rows as a
+        list of dicts, like DataFrame.to_dict('records').
+        """
+        where_sql, params = self.build_where_clause_params(model, filters)
+        return self.fetch_rows(prepare_statement(query, where_sql), params)
+
+    def fetch_rows(self, query, params=None) -> list:
+        """
+        Run a query with bound parameters and return the rows as a list of dicts.
+
+        Args:
+            query (str or TextClause): SQL with :name placeholders
+            params (dict): Values for the placeholders
+        """
+        statement = prepare_statement(query) if isinstance(query, str) else query
+        with self.engine.connect() as connection:
+            result = connection.execute(statement, params or {})
+            return [dict(row) for row in result.mappings()]
+
+
+@lru_cache(maxsize=512)
+def prepare_statement(query, where_clause=""):
+    """
+    Build (once) the text() statement for a query template and where clause.
+
+    Repeated lookups with different values reuse the same statement object,
+    so SQLAlchemy's compiled cache is hit instead of re-parsing the SQL.
+    """
+    return text(query.replace("{whereClause}", where_clause))
+
 
 crud = PostgresCRUD()        
\ No newline at end of file
@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy.sql import text
+from config.logger import logger
+from utils.postgres_connector import crud
+
+# Load environment variables from .env
+load_dotenv()
+
+DATA_VERSION_TABLE = 'zakya_data_versions'
+
+# Results kept across all Streamlit sessions; least recently used go first
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 256))
+# Seconds a data version read from Postgres is trusted before it is read again
+DATA_VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", 2))
+
+
+def ensure_data_version_table(connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS public.{DATA_VERSION_TABLE} (
+            name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            bumped_at TIMESTAMPTZ
+        )
+    """))
+
+
+def bump_data_version(connection, name):
+    """
+    Increment the data version of name inside the caller's transaction.
+
+    Cached results computed from name's rows stop being served once the
+    transaction commits, in this process and every other one.
+    """
+    ensure_data_version_table(connection)
+    connection.execute(text(f"""
+        INSERT INTO public.{DATA_VERSION_TABLE} (name, version, bumped_at)
+        VALUES (:name, 1, now())
+        ON CONFLICT (name) DO UPDATE
+            SET version = {DATA_VERSION_TABLE}.version + 1, bumped_at = now()
+    """), {"name": name})
+
+
+def filters_key(filters):
+    """
+    Hashable, order-independent form of a {column: {'op', 'value'}} filter dict.
+
+    Lists become tuples and dates their ISO string, so equal selections made
+    in different sessions map to the same cache entry.
+    """
+    def normalize(value):
+        if isinstance(value, (list, tuple, set)):
+            return tuple(normalize(item) for item in value)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    return tuple(
+        (column, condition.get('op'), normalize(condition.get('value')))
+        for column, condition in sorted((filters or {}).items())
+    )
+
+
+class QueryResultCache:
+    """
+    Process-wide cache of dashboard query results, shared by every Streamlit session.
+
+    Entries are keyed on (query name, filters, data version of the tables the
+    query reads). Writers bump a table's version in Postgres (see
+    bump_data_version), so results are invalidated even when a cron sync in
+    another process refreshed the data. Each caller gets its own copy.
+    """
+
+    def __init__(self, crud_client, max_entries=QUERY_CACHE_MAX_ENTRIES, version_poll_seconds=DATA_VERSION_POLL_SECONDS):
+        self.crud = crud_client
+        self.max_entries = max_entries
+        self.version_poll_seconds = version_poll_seconds
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._version_table_ready = False
+
+    def _count(self, query_name, counter):
+        stats = self._stats.setdefault(query_name, {'hits': 0, 'misses': 0})
+        stats[counter] += 1
+
+    def data_versions(self, names):
+        """
+        Current versions of names, re-read from Postgres at most every version_poll_seconds.
+
+        Returns:
+            tuple: One version per name (0 for a name never bumped)
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = [self._versions.get(name) for name in names]
+            if all(entry is not None and now - entry[1] < self.version_poll_seconds for entry in cached):
+                return tuple(entry[0] for entry in cached)
+
+        with self.crud.engine.begin() as connection:
+            if not self._version_table_ready:
+                ensure_data_version_table(connection)
+                self._version_table_ready = True
+            rows = connection.execute(
+                text(f"SELECT name, version FROM public.{DATA_VERSION_TABLE} WHERE name = ANY(:names)"),
+                {"names": list(names)}
+            ).all()
+
+        versions = {name: 0 for name in names}
+        versions.update({row.name: row.version for row in rows})
+        with self._lock:
+            for name, version in versions.items():
+                self._versions[name] = (version, now)
+        return tuple(versions[name] for name in names)
+
+    def get(self, query_name, filters, sources, loader):
+        """
+        Cached loader() result for query_name with filters.
+
+        Concurrent misses on the same key wait for a single load. A loader
+        that raises is not cached; the exception reaches the caller. If the
+        data versions cannot be read, loader() runs uncached.
+
+        Args:
+            query_name (str): Name of the query, part of the key
+            filters (dict): {column: {'op', 'value'}} the loader applies
+            sources (list): Table names whose data version the result depends on
+            loader (callable): Returns the DataFrame (or any picklable value) to cache
+
+        Returns:
+            A copy of the cached result
+        """
+        try:
+            versions = self.data_versions(sources)
+        except Exception as e:
+            logger.error(f"Could not read data versions for {query_name}, loading uncached: {e}")
+            return loader()
+        key = (query_name, filters_key(filters), versions)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count(query_name, 'hits')
+                return self._copy(self._entries[key])
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._count(query_name, 'hits')
+                    return self._copy(self._entries[key])
+                self._count(query_name, 'misses')
+
+            result = loader()
+
+            with self._lock:
+                self._entries[key] = result
+                self._drop_stale(query_name, key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+                self._key_locks.pop(key, None)
+            return self._copy(result)
+
+    def _drop_stale(self, query_name, current_key):
+        """Drop entries of query_name computed under an older data version."""
+        for key in [key for key in self._entries if key[0] == query_name and key[2] != current_key[2]]:
+            del self._entries[key]
+
+    @staticmethod
+    def _copy(value):
+        return value.copy() if isinstance(value, (pd.DataFrame, dict, list)) else value
+
+    def invalidate(self):
+        """Drop every cached result in this process."""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters per query.
+
+        Returns:
+            DataFrame: one row per query name with hits, misses, hit_rate and
+            the number of cached filter combinations
+        """
+        rows = []
+        with self._lock:
+            for query_name, counters in self._stats.items():
+                lookups = counters['hits'] + counters['misses']
+                rows.append({
+                    'query': query_name,
+                    **counters,
+                    'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+                    'cached_results': sum(1 for key in self._entries if key[0] == query_name),
+                })
+        return pd.DataFrame(rows, columns=['query', 'hits', 'misses', 'hit_rate', 'cached_results'])
+
+
+query_cache = QueryResultCache(crud)
+
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+import pandas as pd
+from dotenv import load_dotenv
+from config.logger import logger
+from utils.postgres_connector import crud
+
+# Load environment variables from .env
+load_dotenv()
+
+# Seconds a loaded table stays fresh. Tables we write ourselves are also
+# invalidated on every crud write, so the TTL only bounds staleness from
+# writes made by other processes (other app instances, cron syncs).
+REFERENCE_DATA_DEFAULT_TTL = int(os.getenv("REFERENCE_DATA_DEFAULT_TTL", 60))
+REFERENCE_DATA_TTLS = {
+    'zakya_products': int(os.getenv("REFERENCE_DATA_PRODUCTS_TTL", 300)),
+    'zakya_contacts': int(os.getenv("REFERENCE_DATA_CONTACTS_TTL", 600)),
+    'zakya_salesorder_line_item_mapping': int(os.getenv("REFERENCE_DATA_MAPPING_TTL", 120)),
+    'salesorder_line_item_mapping': int(os.getenv("REFERENCE_DATA_MAPPING_TTL", 120)),
+    'zakya_invoice_line_item_mapping': int(os.getenv("REFERENCE_DATA_MAPPING_TTL", 120)),
+    'zakya_salesorder_invoice_mapping': int(os.getenv("REFERENCE_DATA_MAPPING_TTL", 120)),
+}
+
+
+class ReferenceDataCache:
+    """
+    Process-wide cache of whole reference tables in front of crud.read_table.
+
+    Lives at module level, so loaded frames are shared by every function in an
+    invoice run and survive Streamlit reruns. Each caller gets its own copy,
+    so callers can keep mutating what they read. Entries expire after the
+    table's TTL and are dropped whenever crud writes the table.
+    """
+
+    def __init__(self, crud_client, ttls=None, default_ttl=REFERENCE_DATA_DEFAULT_TTL):
+        self.crud = crud_client
+        self.ttls = dict(REFERENCE_DATA_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self._entries = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._table_locks = {}
+        crud_client.add_write_listener(self.invalidate)
+
+    def ttl_for(self, table_name):
+        return self.ttls.get(table_name, self.default_ttl)
+
+    def _count(self, table_name, counter):
+        stats = self._stats.setdefault(table_name, {'hits': 0, 'misses': 0, 'invalidations': 0})
+        stats[counter] += 1
+
+    def _fresh_entry(self, table_name):
+        entry = self._entries.get(table_name)
+        if entry and 'loaded_at' in entry and time.monotonic() - entry['loaded_at'] < self.ttl_for(table_name):
+            return entry
+        return None
+
+    def read_table(self, table_name):
+        """
+        Cached crud.read_table: a copy of the table, or crud's error string.
+
+        Concurrent misses on the same table wait for a single load.
+        """
+        with self._lock:
+            entry = self._fresh_entry(table_name)
+            if entry is not None:
+                self._count(table_name, 'hits')
+                return entry['data'].copy()
+            table_lock = self._table_locks.setdefault(table_name, threading.Lock())
+
+        with table_lock:
+            with self._lock:
+                entry = self._fresh_entry(table_name)
+                if entry is not None:
+                    self._count(table_name, 'hits')
+                    return entry['data'].copy()
+                self._count(table_name, 'misses')
+                generation = self._entries.get(table_name, {}).get('generation', 0)
+
+            data = self.crud.read_table(table_name)
+            if not isinstance(data, pd.DataFrame):
+                logger.error(data)
+                return data
+
+            with self._lock:
+                # Skip storing if the table was written while we were reading it
+                current = self._entries.get(table_name, {}).get('generation', 0)
+                if current == generation:
+                    self._entries[table_name] = {'data': data, 'loaded_at': time.monotonic(), 'generation': generation}
+            return data.copy()
+
+    def invalidate(self, *table_names):
+        """Drop the given tables from the cache, or every table when called without arguments."""
+        with self._lock:
+            for table_name in table_names or list(self._entries):
+                entry = self._entries.get(table_name, {})
+                self._entries[table_name] = {'generation': entry.get('generation', 0) + 1}
+                self._count(table_name, 'invalidations')
+
+    def stats(self):
+        """
+        Hit/miss counters per table.
+
+        Returns:
+            DataFrame: one row per table with hits, misses, invalidations,
+            hit_rate, cached rows and the age of the cached copy in seconds
+        """
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for table_name, counters in self._stats.items():
+                entry = self._entries.get(table_name, {})
+                lookups = counters['hits'] + counters['misses']
+                rows.append({
+                    'table': table_name,
+                    **counters,
+                    'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+                    'cached_rows': len(entry['data']) if 'data' in entry else None,
+                    'age_seconds': round(now - entry['loaded_at'], 1) if 'loaded_at' in entry else None,
+                    'ttl_seconds': self.ttl_for(table_name),
+                })
+        return pd.DataFrame(rows)
+
+
+reference_cache = ReferenceDataCache(crud)
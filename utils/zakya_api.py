@@ -1,7 +1,11 @@
 import requests
 import os
+import contextvars
 import pandas as pd
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from utils.pipeline_metrics import record_http_call
 
 # Load environment variables from .env
 load_dotenv()
@@ -15,6 +19,65 @@ REDIRECT_URI = os.getenv("ZAKYA_REDIRECT_URI")
 print(f"re direct url is : {REDIRECT_URI}")
 TOKEN_URL = "https://accounts.zoho.in/oauth/v2/token"
 
+# Connection pool settings for the shared Zakya HTTP client
+ZAKYA_POOL_CONNECTIONS = int(os.getenv("ZAKYA_POOL_CONNECTIONS", 4))
+ZAKYA_POOL_MAXSIZE = int(os.getenv("ZAKYA_POOL_MAXSIZE", 20))
+ZAKYA_HTTP_TIMEOUT = float(os.getenv("ZAKYA_HTTP_TIMEOUT", 60))
+
+# Number of list pages kept in flight by fetch_records_from_zakya
+ZAKYA_PAGE_PREFETCH = int(os.getenv("ZAKYA_PAGE_PREFETCH", 4))
+
+
+class ZakyaClient:
+    """
+    Shared keep-alive HTTP client for the Zakya / Zoho APIs.
+
+    Wraps a single requests.Session so TCP + TLS connections to api.zakya.in
+    are reused across calls instead of being re-negotiated on every request.
+    The session is safe to share across the asyncio.to_thread workers used by
+    the sync jobs; pool_maxsize should be at least their concurrency.
+    """
+
+    def __init__(self, pool_connections=ZAKYA_POOL_CONNECTIONS, pool_maxsize=ZAKYA_POOL_MAXSIZE, timeout=ZAKYA_HTTP_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.session = self._create_session()
+
+    def _create_session(self):
+        """Create a session with a pooled adapter mounted for http and https."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session."""
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.request(method, url, **kwargs)
+        record_http_call(len(response.content))
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+zakya_client = ZakyaClient()
+
 def get_authorization_url():
     """
     Generate the authorization URL for Zakya login.
@@ -56,7 +119,7 @@ def get_access_token(auth_code=None, refresh_token=None):
         raise ValueError("Either auth_code or refresh_token must be provided.")
 
     
-    response = requests.post(TOKEN_URL, data=payload)
+    response = zakya_client.post(TOKEN_URL, data=payload)
     print(f'error is  : {response.json()}')
     response.raise_for_status()
     return response.json()
@@ -79,7 +142,7 @@ def fetch_contacts(base_url,access_token,organization_id):
         
     headers = {"Authorization": f"Zoho-oauthtoken {access_token}",}
     print(f"headers is {headers}")
-    response = requests.get(
+    response = zakya_client.get(
         url=url,
         headers=headers,
         params=params
@@ -89,39 +152,114 @@ def fetch_contacts(base_url,access_token,organization_id):
     return response.json()
 
 
-def fetch_records_from_zakya(base_url,access_token,organization_id,endpoint):
+def fetch_zakya_page(url, headers, organization_id, page, per_page=200, extra_params=None):
     """
-    Fetch inventory items from Zakya API.
+    Fetch a single page of a Zakya list endpoint.
     """
-    url = f"{base_url}inventory/v1{endpoint}"  
-    headers = {
-        'Authorization': f"Zoho-oauthtoken {access_token}",
-        'Content-Type': 'application/json'
-    }  
-    params = {
+    params = dict(extra_params or {})
+    params.update({
         'organization_id': organization_id,
-        'page' : 1,
-        'per_page' : 200
-    }
+        'page' : page,
+        'per_page' : per_page
+    })
+    response = zakya_client.get(
+        url=url,
+        headers=headers,
+        params=params
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def known_page_count(page_context, per_page=200):
+    """Number of pages a list has, when page_context reports it (Zoho only does for some endpoints)."""
+    if page_context.get('total_pages'):
+        return int(page_context['total_pages'])
+    if page_context.get('total'):
+        return -(-int(page_context['total']) // int(page_context.get('per_page') or per_page))
+    return None
+
+
+def iter_zakya_pages(base_url,access_token,organization_id,endpoint,prefetch_pages=ZAKYA_PAGE_PREFETCH,params=None):
+    """
+    Yield the pages of a Zakya list endpoint in page order as they arrive.
+
+    Starts with a single request and only prefetches once a page reports
+    has_more_page=True, doubling the window up to prefetch_pages requests in
+    flight, and never past the page count when Zakya reports it. A one-page
+    list costs one call, and a longer walk requests at most a few pages past
+    the last one (discarded) against the quota. prefetch_pages=1 walks the
+    pages strictly one at a time. params are extra query filters (e.g.
+    sort_column) sent with every page.
+    """
+    url = f"{base_url}inventory/v1{endpoint}"  
     headers = {"Authorization": f"Zoho-oauthtoken {access_token}",}
-    all_data=[]
-    while True:
-        response = requests.get(
-            url=url,
-            headers=headers,
-            params=params
-        )
-        response.raise_for_status()
-        data = response.json()                      
-        page_context = data.get('page_context',{})
-        all_data.append(data)
+    prefetch_pages = max(1, prefetch_pages)
+
+    with ThreadPoolExecutor(max_workers=prefetch_pages) as executor:
+        in_flight = {}
+        next_page = 1
+        current_page = 1
+        window = 1
+        last_page = None
+        try:
+            while True:
+                # Top the window up to the pages we expect to exist
+                while len(in_flight) < window and (last_page is None or next_page <= last_page):
+                    # Run in a copy of our context so the page is counted against the caller's pipeline stage
+                    in_flight[next_page] = executor.submit(
+                        contextvars.copy_context().run,
+                        fetch_zakya_page, url, headers, organization_id, next_page, 200, params
+                    )
+                    next_page += 1
+
+                data = in_flight.pop(current_page).result()
+                yield data
+
+                page_context = data.get('page_context',{})
+                if not page_context.get('has_more_page'):
+                    return
+
+                last_page = known_page_count(page_context) or last_page
+                window = min(prefetch_pages, window * 2)
+                current_page += 1
+        finally:
+            for future in in_flight.values():
+                future.cancel()
+
+
+def fetch_records_from_zakya(base_url,access_token,organization_id,endpoint,prefetch_pages=ZAKYA_PAGE_PREFETCH):
+    """
+    Fetch inventory items from Zakya API.
+
+    Returns the list of page dicts; see iter_zakya_pages for prefetching.
+    """
+    return list(iter_zakya_pages(base_url, access_token, organization_id, endpoint, prefetch_pages))
+
+
+def iter_zakya_records(base_url,access_token,organization_id,endpoint,key,chunk_size=None,prefetch_pages=ZAKYA_PAGE_PREFETCH,params=None):
+    """
+    Stream the records of a Zakya list endpoint without collecting every page.
+
+    Yields one record dict at a time, or DataFrames of chunk_size rows when
+    chunk_size is given (the last chunk may be shorter). Only the pages in
+    the prefetch window and one partial chunk are held in memory.
+    """
+    buffer = []
+    for page in iter_zakya_pages(base_url, access_token, organization_id, endpoint, prefetch_pages, params):
+        records = page.get(key, [])
+        if chunk_size is None:
+            yield from records
+            continue
+
+        buffer.extend(records)
+        while len(buffer) >= chunk_size:
+            yield pd.DataFrame.from_records(buffer[:chunk_size])
+            buffer = buffer[chunk_size:]
 
-        if not page_context['has_more_page']:
-            return all_data
-            
-        params['page'] = page_context['page'] + 1
+    if chunk_size is not None and buffer:
+        yield pd.DataFrame.from_records(buffer)
 
-    return []
     
 def retrieve_record_from_zakya(base_url,access_token,organization_id,endpoint):
     """
@@ -136,7 +274,7 @@ def retrieve_record_from_zakya(base_url,access_token,organization_id,endpoint):
         'organization_id': organization_id
     }
     headers = {"Authorization": f"Zoho-oauthtoken {access_token}",}
-    response = requests.get(
+    response = zakya_client.get(
             url=url,
             headers=headers,
             params=params
@@ -166,7 +304,7 @@ def fetch_organizations(access_token):
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = zakya_client.get(url, headers=headers)
         response.raise_for_status()  # Raise an error for HTTP codes 4xx/5xx
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -190,7 +328,7 @@ def fetch_object_for_each_id(base_url,access_token,organization_id,endpoint):
     }    
     
     try:
-        response = requests.get(url, headers=headers,params=params)
+        response = zakya_client.get(url, headers=headers,params=params)
         response.raise_for_status()  # Raise an error for HTTP codes 4xx/5xx
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -230,7 +368,7 @@ def post_record_to_zakya(base_url, access_token, organization_id, endpoint, payl
     elif "shipmentorders" in endpoint and 'salesorder_id' in extra_args:
         params['salesorder_id'] = extra_args['salesorder_id']
 
-    response = requests.post(
+    response = zakya_client.post(
         url=url,
         headers=headers,
         params=params,
@@ -257,7 +395,7 @@ def attach_zakya(base_url, access_token, organization_id, endpoint, pdf_path):
     params = {
         'organization_id': organization_id,
     }
-    response = requests.post(
+    response = zakya_client.post(
         url=url,
         headers=headers,
         params=params,
@@ -279,7 +417,7 @@ def put_record_to_zakya(base_url, access_token, organization_id, endpoint, txn_i
         'organization_id': organization_id,
     }
 
-    response = requests.put(
+    response = zakya_client.put(
         url=url,
         headers=headers,
         params=params,
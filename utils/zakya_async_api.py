@@ -0,0 +1,235 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import asynccontextmanager
+import aiohttp
+from dotenv import load_dotenv
+from config.logger import logger
+from utils.pipeline_metrics import record_http_call
+
+# Load environment variables from .env
+load_dotenv()
+
+# Zakya (Zoho Inventory) allows 100 API calls per minute per organization
+ZAKYA_RATE_LIMIT_PER_MINUTE = int(os.getenv("ZAKYA_RATE_LIMIT_PER_MINUTE", 100))
+ZAKYA_RATE_LIMIT_BURST = int(os.getenv("ZAKYA_RATE_LIMIT_BURST", 10))
+ZAKYA_ASYNC_MAX_CONNECTIONS = int(os.getenv("ZAKYA_ASYNC_MAX_CONNECTIONS", 20))
+ZAKYA_ASYNC_MAX_RETRIES = int(os.getenv("ZAKYA_ASYNC_MAX_RETRIES", 5))
+ZAKYA_HTTP_TIMEOUT = float(os.getenv("ZAKYA_HTTP_TIMEOUT", 60))
+
+
+class TokenBucket:
+    """
+    Async token-bucket limiter.
+
+    Tokens refill continuously at rate_per_minute / 60 per second up to
+    capacity; each request takes one token and waits when the bucket is empty.
+    """
+
+    def __init__(self, rate_per_minute=ZAKYA_RATE_LIMIT_PER_MINUTE, capacity=ZAKYA_RATE_LIMIT_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        # Created lazily so the lock binds to the loop that is actually running
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server has told us to back off."""
+        self._refill()
+        self.tokens = 0
+
+
+class AsyncZakyaClient:
+    """
+    Native asyncio client for the Zakya inventory API.
+
+    All requests share one aiohttp connection pool and one token bucket, so
+    concurrency is bounded by the API quota rather than by a thread pool.
+    429 responses are retried after the server's Retry-After delay.
+
+    Usage:
+        async with AsyncZakyaClient(base_url, access_token, organization_id) as client:
+            details = await client.get(f'salesorders/{salesorder_id}')
+    """
+
+    def __init__(self, base_url, access_token, organization_id,
+                 rate_per_minute=ZAKYA_RATE_LIMIT_PER_MINUTE,
+                 burst=ZAKYA_RATE_LIMIT_BURST,
+                 max_connections=ZAKYA_ASYNC_MAX_CONNECTIONS,
+                 max_retries=ZAKYA_ASYNC_MAX_RETRIES,
+                 timeout=ZAKYA_HTTP_TIMEOUT):
+        self.base_url = base_url
+        self.access_token = access_token
+        self.organization_id = organization_id
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate_per_minute, burst)
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Create the pooled session if it does not exist yet."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Zoho-oauthtoken {self.access_token}"}
+            )
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    def build_url(self, endpoint):
+        return f"{self.base_url}inventory/v1/{endpoint.lstrip('/')}"
+
+    @staticmethod
+    def retry_after_seconds(response, attempt):
+        """Seconds to wait before retrying, from Retry-After or exponential backoff."""
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return min(2 ** attempt, 60)
+
+    async def request(self, method, endpoint, params=None, payload=None):
+        """
+        Send a rate-limited request and return the decoded JSON body.
+
+        Raises aiohttp.ClientResponseError for non-2xx responses once retries
+        are exhausted.
+        """
+        await self.open()
+        url = self.build_url(endpoint)
+        request_params = {'organization_id': self.organization_id}
+        if params:
+            request_params.update(params)
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            async with self.session.request(method, url, params=request_params, json=payload) as response:
+                record_http_call(len(await response.read()))
+                if response.status == 429 and attempt < self.max_retries:
+                    delay = self.retry_after_seconds(response, attempt)
+                    logger.warning(f"Zakya rate limit hit on {endpoint}, retrying in {delay}s")
+                    self.limiter.drain()
+                    await asyncio.sleep(delay)
+                    continue
+
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def get(self, endpoint, params=None):
+        return await self.request("GET", endpoint, params=params)
+
+    async def post(self, endpoint, payload, params=None):
+        return await self.request("POST", endpoint, params=params, payload=payload)
+
+    async def put(self, endpoint, txn_id, payload, params=None):
+        return await self.request("PUT", f"{endpoint.strip('/')}/{txn_id}", params=params, payload=payload)
+
+    async def list(self, endpoint, params=None, per_page=200):
+        """
+        Fetch every page of a list endpoint.
+
+        Returns a list of page dicts, the same shape as fetch_records_from_zakya.
+        """
+        page_params = dict(params or {})
+        page_params.update({'page': 1, 'per_page': per_page})
+        all_data = []
+        while True:
+            data = await self.get(endpoint, params=page_params)
+            all_data.append(data)
+
+            page_context = data.get('page_context', {})
+            if not page_context.get('has_more_page'):
+                return all_data
+
+            page_params['page'] = page_context['page'] + 1
+
+    async def get_many(self, endpoints):
+        """
+        Fetch many detail endpoints concurrently.
+
+        Returns a list aligned with endpoints; failed requests are logged and
+        returned as None so one bad record does not abort the whole batch.
+        """
+        async def fetch(endpoint):
+            try:
+                return await self.get(endpoint)
+            except Exception as e:
+                logger.error(f"Error fetching {endpoint}: {e}")
+                return None
+
+        return await asyncio.gather(*[fetch(endpoint) for endpoint in endpoints])
+
+
+# Clients handed out by zakya_client inside shared_zakya_clients, keyed by
+# (base_url, access_token, organization_id). Child tasks inherit the context,
+# so every stage of one run sees the same dict.
+_shared_clients = contextvars.ContextVar("zakya_shared_clients", default=None)
+
+
+@asynccontextmanager
+async def shared_zakya_clients():
+    """
+    Share one AsyncZakyaClient per organization for everything awaited in this block.
+
+    Wrap a whole invoice run in it so all stages reuse one connection pool
+    and one token bucket; the clients are closed when the block exits.
+    """
+    clients = {}
+    token = _shared_clients.set(clients)
+    try:
+        yield clients
+    finally:
+        _shared_clients.reset(token)
+        for client in clients.values():
+            await client.close()
+
+
+@asynccontextmanager
+async def zakya_client(base_url, access_token, organization_id):
+    """
+    An AsyncZakyaClient for the duration of the block.
+
+    Inside shared_zakya_clients this is the run's shared client (left open
+    for the next stage); outside it a fresh client is opened and closed.
+    """
+    clients = _shared_clients.get()
+    if clients is None:
+        async with AsyncZakyaClient(base_url, access_token, organization_id) as client:
+            yield client
+        return
+
+    key = (base_url, access_token, organization_id)
+    if key not in clients:
+        clients[key] = AsyncZakyaClient(base_url, access_token, organization_id)
+    yield clients[key]